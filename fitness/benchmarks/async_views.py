@@ -0,0 +1,79 @@
+'''
+Compares the sync and async versions of GET /classes and GET /bookings at
+high concurrency.
+
+The sync views are driven through the WSGI handler from a thread per
+concurrent client, the way a threaded WSGI server runs them. The async
+views are driven through the ASGI handler from tasks on a single event
+loop, the way an ASGI server runs them.
+
+Run from the project directory:
+
+    python -m benchmarks.async_views --concurrency 16 64 256
+
+Note that Django's async ORM still runs each query on a worker thread, so
+the async views save threads while a request waits on the database rather
+than making the queries themselves faster.
+'''
+import argparse
+
+from benchmarks import harness
+from benchmarks.endpoints import TIMEZONES
+
+
+def build_scenarios(emails):
+    #(sync request, async request) per endpoint, asking for the same pages
+    def classes_params(rng):
+        #A fresh page size now and then makes some requests miss the page cache
+        return {'tz': rng.choice(TIMEZONES), 'page_size': rng.choice((20, 50, 50, 50, rng.randint(1, 200)))}
+
+    def bookings_params(rng):
+        return {'email': rng.choice(emails), 'tz': rng.choice(TIMEZONES)}
+
+    return {
+        'GET /classes': (
+            lambda client, i, rng: client.get('/classes/', classes_params(rng)),
+            lambda client, i, rng: client.get('/async/classes/', classes_params(rng)),
+        ),
+        'GET /bookings': (
+            lambda client, i, rng: client.get('/bookings/', bookings_params(rng)),
+            lambda client, i, rng: client.get('/async/bookings/', bookings_params(rng)),
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--classes', type=int, default=2_000)
+    parser.add_argument('--bookings', type=int, default=50_000)
+    parser.add_argument('--clients', type=int, default=5_000)
+    parser.add_argument('--requests', type=int, default=2_000, help='requests per endpoint, mode and concurrency level')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[16, 64, 256])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write results to this JSON file')
+    args = parser.parse_args()
+
+    harness.setup_django()
+    harness.migrate()
+    seconds = harness.seed_dataset(args.classes, args.bookings, args.clients, args.seed, max_slots=args.bookings // args.classes * 4 + 20)
+    print(f"Seeded {args.classes} classes and {args.bookings} bookings in {seconds:.1f}s\n")
+
+    from halo.models import Booking
+    emails = list(Booking.objects.values_list('client_email', flat=True).distinct()[:1000])
+
+    results = {}
+    for name, (sync_request, async_request) in build_scenarios(emails).items():
+        for concurrency in args.concurrency:
+            results[f'{name} wsgi x{concurrency}'] = harness.run_load(sync_request, args.requests, concurrency, args.seed)
+            results[f'{name} asgi x{concurrency}'] = harness.run_async_load(async_request, args.requests, concurrency, args.seed)
+
+    harness.print_table(results)
+    if args.output:
+        config = vars(args).copy()
+        config.pop('output')
+        harness.save_results(args.output, results, config)
+        print(f"\nSaved results to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+'''
+Compares endpoint latency with and without the booking and class indexes
+(booking_client_booked_idx and class_datetime_idx). The unique
+(class_booked, client) constraint stays in place in both runs, SQLite can
+only drop it by rebuilding the table.
+
+Builds a throwaway SQLite database, seeds the dataset, drops those indexes,
+times GET /classes, GET /bookings and POST /book, then creates the indexes
+again and times the endpoints on the same rows.
+
+Run from the project directory:
+
+    python -m benchmarks.booking_indexes --bookings 1000000
+'''
+import argparse
+import time
+
+from benchmarks import harness
+
+INDEXES = {'Booking': ['booking_client_booked_idx'], 'Class': ['class_datetime_idx']}
+
+
+def set_indexes(enabled):
+    #Drops or recreates the indexes through the schema editor
+    from django.db import connection
+    from halo import models
+
+    with connection.schema_editor() as editor:
+        for model_name, names in INDEXES.items():
+            model = getattr(models, model_name)
+            for index in model._meta.indexes:
+                if index.name in names:
+                    (editor.add_index if enabled else editor.remove_index)(model, index)
+
+
+def run_endpoints(upcoming_ids, emails, repeat, tag):
+    def get_classes(client, i, rng):
+        #A new page size per request keeps the page cache out of the comparison
+        return client.get('/classes/', {'page_size': 200 - i % 100})
+
+    def get_bookings(client, i, rng):
+        return client.get('/bookings/', {'email': rng.choice(emails)})
+
+    def book(client, i, rng):
+        return client.post('/book/', {
+            'class_id': rng.choice(upcoming_ids),
+            'client_name': 'Bench Client',
+            'client_email': f'bench-{tag}-{i}@example.com',
+        })
+
+    return {
+        'GET /classes': harness.run_load(get_classes, repeat, concurrency=1),
+        'GET /bookings': harness.run_load(get_bookings, repeat, concurrency=1),
+        'POST /book': harness.run_load(book, repeat, concurrency=1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bookings', type=int, default=1_000_000)
+    parser.add_argument('--classes', type=int, default=20_000)
+    parser.add_argument('--clients', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=50, help='requests per endpoint and phase')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    harness.setup_django()
+    harness.migrate()
+
+    seconds = harness.seed_dataset(args.classes, args.bookings, args.clients, args.seed, max_slots=args.bookings // args.classes * 4 + 20)
+    print(f"Seeded {args.bookings} bookings in {seconds:.1f}s")
+
+    from django.utils import timezone
+    from halo.models import Class, Booking
+    upcoming_ids = list(Class.objects.filter(datetime__gte=timezone.now()).values_list('id', flat=True))
+    emails = list(Booking.objects.values_list('client_email', flat=True)[:1000])
+
+    set_indexes(False)
+    before = run_endpoints(upcoming_ids, emails, args.repeat, 'before')
+
+    started = time.perf_counter()
+    set_indexes(True)
+    print(f"Created the indexes in {time.perf_counter() - started:.1f}s")
+
+    after = run_endpoints(upcoming_ids, emails, args.repeat, 'after')
+
+    print(f"\n{'endpoint':<16}{'before p50':>12}{'after p50':>12}{'before p95':>12}{'after p95':>12}{'speedup':>10}")
+    for endpoint, b in before.items():
+        a = after[endpoint]
+        print(f"{endpoint:<16}{b['p50_ms']:>10.2f}ms{a['p50_ms']:>10.2f}ms{b['p95_ms']:>10.2f}ms{a['p95_ms']:>10.2f}ms"
+              f"{b['p50_ms'] / a['p50_ms']:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+'''
+Times the GET /classes filters (name, instructor, from/to, min_slots and
+all of them together) on a large schedule, 100k classes by default.
+
+For each filter the page query is run straight on the database cursor, so
+the timing is SQLite's alone, and then through the endpoint with the page
+cache kept out of the way. The index SQLite picked is printed next to each
+query, from EXPLAIN QUERY PLAN.
+
+Run from the project directory:
+
+    python -m benchmarks.class_filters --classes 100000
+
+Exits with status 1 when a query's p95 is over --budget-ms (1 ms by default).
+'''
+import argparse
+import sys
+import time
+from datetime import timedelta
+
+from benchmarks import harness
+
+
+def pick_filters(rng):
+    #Query params of each scenario, taken from the seeded classes
+    from django.utils import timezone
+    from halo.models import Class
+
+    classes = list(Class.objects.filter(datetime__gte=timezone.now()).values('name', 'instructor', 'datetime')[:1000])
+    sample = rng.choice(classes)
+    day = (sample['datetime'] + timedelta(days=2)).date().isoformat()
+    return {
+        'name': {'name': sample['name'].lower()},
+        'instructor': {'instructor': sample['instructor'].upper()},
+        'from/to': {'from': day, 'to': day},
+        'min_slots': {'min_slots': 5},
+        'all': {'name': sample['name'], 'instructor': sample['instructor'], 'from': sample['datetime'].date().isoformat(), 'min_slots': 1},
+    }
+
+
+def page_query(params, page_size):
+    #SQL and params of the first page query GET /classes runs for `params`
+    import pytz
+    from halo.utils.class_filters import parse_class_filters
+    from halo.utils.pagination import keyset_query
+    from halo.utils.recurrence import SCHEDULE_KEY
+    from halo.views import upcoming_classes
+
+    filters = parse_class_filters(params, pytz.UTC)
+    return keyset_query(upcoming_classes(True, filters), SCHEDULE_KEY, page_size, None, None).query.sql_with_params()
+
+
+def time_query(sql, params, repeat):
+    from django.db import connection
+
+    latencies = []
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        plan = '; '.join(row[-1] for row in cursor.fetchall())
+        for _ in range(repeat):
+            started = time.perf_counter()
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+            latencies.append((time.perf_counter() - started) * 1000)
+    return harness.summarize(latencies, sum(latencies) / 1000, 0, 0, 1), len(rows), plan
+
+
+def time_endpoint(params, repeat):
+    def request(client, i, rng):
+        #A new page size per request keeps the page cache out of the timing
+        return client.get('/classes/', {**params, 'page_size': 200 - i % 100})
+
+    return harness.run_load(request, repeat, concurrency=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--classes', type=int, default=100_000)
+    parser.add_argument('--bookings', type=int, default=10_000)
+    parser.add_argument('--clients', type=int, default=2_000)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=200, help='runs of each query and requests per endpoint scenario')
+    parser.add_argument('--budget-ms', type=float, default=1.0, help='p95 a filtered query has to stay under')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    harness.setup_django()
+    harness.migrate()
+    seconds = harness.seed_dataset(args.classes, args.bookings, args.clients, args.seed)
+    print(f"Seeded {args.classes} classes in {seconds:.1f}s\n")
+
+    import random
+    scenarios = pick_filters(random.Random(args.seed))
+
+    over_budget = []
+    print(f"{'filter':<12}{'rows':>6}{'sql p50':>11}{'sql p95':>11}{'http p50':>11}{'http p95':>11}  index")
+    for label, params in scenarios.items():
+        sql, sql_params = page_query(params, args.page_size)
+        query, rows, plan = time_query(sql, sql_params, args.repeat)
+        endpoint = time_endpoint(params, args.repeat)
+        print(f"{label:<12}{rows:>6}{query['p50_ms']:>9.3f}ms{query['p95_ms']:>9.3f}ms"
+              f"{endpoint['p50_ms']:>9.2f}ms{endpoint['p95_ms']:>9.2f}ms  {plan}")
+        if query['p95_ms'] > args.budget_ms:
+            over_budget.append(label)
+
+    if over_budget:
+        print(f"\nOver the {args.budget_ms}ms budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
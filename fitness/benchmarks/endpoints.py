@@ -0,0 +1,93 @@
+'''
+Endpoint benchmark suite for GET /classes, POST /book and GET /bookings.
+
+Seeds a dataset of the requested size into a throwaway SQLite database,
+drives each endpoint in-process, sequentially and then concurrently, and
+reports p50/p95/p99 latency, throughput and queries per request. Results
+are saved as JSON, and compared against a baseline file when one is given.
+
+Run from the project directory:
+
+    python -m benchmarks.endpoints --bookings 100000 --output benchmarks/results/latest.json
+    python -m benchmarks.endpoints --baseline benchmarks/results/latest.json
+
+Exits with status 1 when a metric regressed past --threshold.
+'''
+import argparse
+import itertools
+import sys
+
+from benchmarks import harness
+
+TIMEZONES = ['UTC', 'Asia/Kolkata', 'America/New_York', 'Europe/London']
+
+
+def build_scenarios(upcoming_ids, emails):
+    #Each scenario is a function issuing request number i with the thread's client
+    new_client = itertools.count()
+
+    def class_list(client, i, rng):
+        return client.get('/classes/', {'tz': rng.choice(TIMEZONES)})
+
+    def get_bookings(client, i, rng):
+        return client.get('/bookings/', {'email': rng.choice(emails), 'tz': rng.choice(TIMEZONES)})
+
+    def book_class(client, i, rng):
+        return client.post('/book/', {
+            'class_id': rng.choice(upcoming_ids),
+            'client_name': 'Bench Client',
+            'client_email': f'bench{next(new_client)}@example.com',
+        })
+
+    return {'GET /classes': class_list, 'POST /book': book_class, 'GET /bookings': get_bookings}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--classes', type=int, default=2_000)
+    parser.add_argument('--bookings', type=int, default=50_000)
+    parser.add_argument('--clients', type=int, default=5_000)
+    parser.add_argument('--requests', type=int, default=500, help='requests per endpoint and concurrency level')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16], help='thread counts to run each endpoint with')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare against the results in this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.10, help='fraction a metric may worsen before it is flagged')
+    args = parser.parse_args()
+
+    harness.setup_django()
+    harness.migrate()
+    seconds = harness.seed_dataset(args.classes, args.bookings, args.clients, args.seed, max_slots=args.bookings // args.classes * 4 + 20)
+    print(f"Seeded {args.classes} classes and {args.bookings} bookings in {seconds:.1f}s\n")
+
+    from django.utils import timezone
+    from halo.models import Class, Booking
+    upcoming_ids = list(Class.objects.filter(datetime__gte=timezone.now()).values_list('id', flat=True))
+    emails = list(Booking.objects.values_list('client_email', flat=True).distinct()[:1000])
+
+    results = {}
+    for name, make_request in build_scenarios(upcoming_ids, emails).items():
+        for concurrency in args.concurrency:
+            results[f'{name} x{concurrency}'] = harness.run_load(make_request, args.requests, concurrency, args.seed)
+
+    harness.print_table(results)
+    config = vars(args).copy()
+    config.pop('output'), config.pop('baseline')
+    if args.output:
+        harness.save_results(args.output, results, config)
+        print(f"\nSaved results to {args.output}")
+
+    if args.baseline:
+        regressions = harness.compare(results, harness.load_results(args.baseline), args.threshold)
+        if not regressions:
+            print(f"\nNo regressions against {args.baseline}")
+            return 0
+        print(f"\nRegressions against {args.baseline}:")
+        for scenario, metric, old, new, change in regressions:
+            print(f"  {scenario:<28}{metric:<22}{old:>10} -> {new:<10} ({change:+.0%})")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,222 @@
+'''
+Shared plumbing for the benchmark scripts: a throwaway database, dataset
+seeding, in-process load generation and result files.
+
+Everything runs inside the benchmark process against a temporary SQLite
+file, so no server or external service is needed.
+'''
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fitness.settings')
+
+
+def setup_django(db_path=None):
+
+    '''
+    Points the default database at a throwaway file, sets up Django,
+    silences request logging and turns the rate limiter off, since every
+    benchmark request comes from the same client. Must run before anything
+    opens a connection.
+    Returns the database path.
+    '''
+    import django
+    from django.conf import settings
+
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='halo-bench-'), 'bench.sqlite3')
+    settings.DATABASES['default']['NAME'] = db_path
+    settings.HALO_RATE_LIMIT_ENABLED = False
+    django.setup()
+
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+    logging.disable(logging.CRITICAL)
+    return db_path
+
+
+def migrate(*args):
+    from django.core.management import call_command
+    call_command('migrate', *args, verbosity=0)
+
+
+def seed_dataset(classes, bookings, clients, seed=42, **options):
+    #Builds the dataset with the seed command, returns the seconds it took
+    from django.core.management import call_command
+    started = time.perf_counter()
+    call_command(
+        'seed', classes=classes, bookings=bookings, clients=clients, seed=seed,
+        flush=True, stdout=StringIO(), **options
+    )
+    return time.perf_counter() - started
+
+
+def percentile(sorted_samples, pct):
+    #Nearest-rank percentile of an already sorted list
+    if not sorted_samples:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_samples))) - 1, 0)
+    return sorted_samples[min(rank, len(sorted_samples) - 1)]
+
+
+def summarize(latencies_ms, elapsed, queries, errors, concurrency):
+    samples = sorted(latencies_ms)
+    return {
+        'requests': len(samples),
+        'concurrency': concurrency,
+        'errors': errors,
+        'mean_ms': round(statistics.fmean(samples), 3) if samples else 0.0,
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        'queries_per_request': round(queries / len(samples), 2) if samples else 0.0,
+    }
+
+
+def run_load(make_request, total, concurrency, seed=42):
+
+    '''
+    Sends `total` requests from `concurrency` threads, each with its own
+    test client and database connection. `make_request(client, i, rng)`
+    issues request number i and returns the response.
+
+    Returns summarize() output: latency percentiles, throughput, queries
+    per request, and how many responses had a 5xx status.
+    '''
+    from django.db import connection
+    from rest_framework.test import APIClient
+
+    local = threading.local()
+    lock = threading.Lock()
+    latencies = []
+    totals = {'queries': 0, 'errors': 0}
+
+    def count_queries(execute, sql, params, many, context):
+        local.queries += 1
+        return execute(sql, params, many, context)
+
+    def worker(i):
+        if not hasattr(local, 'client'):
+            local.client = APIClient()
+        rng = random.Random(seed * 1_000_003 + i)   #Same request parameters on every run
+        local.queries = 0
+        with connection.execute_wrapper(count_queries):
+            started = time.perf_counter()
+            response = make_request(local.client, i, rng)
+            latency = (time.perf_counter() - started) * 1000
+        with lock:
+            latencies.append(latency)
+            totals['queries'] += local.queries
+            totals['errors'] += response.status_code >= 500
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, range(total)))
+    else:
+        for i in range(total):
+            worker(i)
+    elapsed = time.perf_counter() - started
+
+    return summarize(latencies, elapsed, totals['queries'], totals['errors'], concurrency)
+
+
+def run_async_load(make_request, total, concurrency, seed=42):
+
+    '''
+    Async counterpart of run_load: `concurrency` tasks on one event loop
+    send `total` requests through Django's ASGI handler with AsyncClient.
+    `make_request(client, i, rng)` must return an awaitable response.
+
+    Queries run on the async ORM's worker thread rather than the caller's,
+    so queries per request is not counted here and reports as 0.
+    '''
+    from django.test import AsyncClient
+
+    async def main():
+        latencies = []
+        errors = 0
+        pending = iter(range(total))
+
+        async def worker():
+            nonlocal errors
+            client = AsyncClient()
+            for i in pending:
+                rng = random.Random(seed * 1_000_003 + i)
+                started = time.perf_counter()
+                response = await make_request(client, i, rng)
+                latencies.append((time.perf_counter() - started) * 1000)
+                errors += response.status_code >= 500
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latencies, time.perf_counter() - started, errors
+
+    latencies, elapsed, errors = asyncio.run(main())
+    return summarize(latencies, elapsed, 0, errors, concurrency)
+
+
+def environment():
+    import django
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def save_results(path, results, config):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'environment': environment(), 'config': config, 'results': results}, f, indent=2)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def compare(results, baseline, threshold):
+
+    '''
+    Compares each scenario with the baseline run. Returns a list of
+    (scenario, metric, baseline, current, change) for every metric that got
+    worse by more than `threshold` (a fraction, 0.1 = 10%).
+    '''
+    worse_when_higher = ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request')
+    regressions = []
+    for scenario, current in results.items():
+        before = baseline.get(scenario)
+        if not before:
+            continue
+        for metric in worse_when_higher + ('throughput_rps',):
+            old, new = before.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if metric == 'throughput_rps':
+                change = -change
+            if change > threshold:
+                regressions.append((scenario, metric, old, new, change))
+    return regressions
+
+
+def print_table(results):
+    header = f"{'scenario':<28}{'p50':>11}{'p95':>11}{'p99':>11}{'req/s':>9}{'queries':>9}{'errors':>8}"
+    print(header)
+    print('-' * len(header))
+    for scenario, r in results.items():
+        print(f"{scenario:<28}{r['p50_ms']:>9.2f}ms{r['p95_ms']:>9.2f}ms{r['p99_ms']:>9.2f}ms"
+              f"{r['throughput_rps']:>9.1f}{r['queries_per_request']:>9.2f}{r['errors']:>8}")
@@ -0,0 +1,105 @@
+'''
+Compares request latency with the old synchronous logging setup (file and
+console handlers called on the request thread) and the queue handler that
+writes from a background thread.
+
+Both setups write to real files in a temporary directory, the console
+stream included, so the I/O the request thread would wait on is there.
+
+Run from the project directory:
+
+    python -m benchmarks.logging_pipeline --concurrency 1 16 64
+'''
+import argparse
+import itertools
+import logging
+import logging.config
+import os
+import tempfile
+
+from benchmarks import harness
+
+
+def logging_config(directory, queued, json_lines):
+    console = open(os.path.join(directory, 'console.log'), 'a')
+    handlers = {
+        'console': {'class': 'logging.StreamHandler', 'stream': console, 'formatter': 'plain'},
+        'file': {
+            'class': 'logging.handlers.RotatingFileHandler', 'filename': os.path.join(directory, 'debug.log'),
+            'maxBytes': 10 * 1024 * 1024, 'backupCount': 2, 'formatter': 'json' if json_lines else 'plain',
+        },
+    }
+    targets = ['console', 'file']
+    if queued:
+        handlers['queue'] = {'()': 'halo.log_handlers.QueueListenerHandler', 'handlers': [f'cfg://handlers.{t}' for t in targets]}
+        targets = ['queue']
+
+    return {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'formatters': {'plain': {'format': '%(message)s'}, 'json': {'()': 'halo.log_handlers.JsonFormatter'}},
+        'handlers': handlers,
+        'root': {'handlers': targets, 'level': 'INFO'},
+        'loggers': {
+            'django': {'handlers': targets, 'level': 'INFO', 'propagate': True},
+            'halo': {'handlers': targets, 'level': 'INFO', 'propagate': False},
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--classes', type=int, default=2_000)
+    parser.add_argument('--bookings', type=int, default=50_000)
+    parser.add_argument('--clients', type=int, default=5_000)
+    parser.add_argument('--requests', type=int, default=1_000, help='requests per endpoint, setup and concurrency level')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64])
+    parser.add_argument('--json', action='store_true', help='write the log file as JSON lines')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write results to this JSON file')
+    args = parser.parse_args()
+
+    harness.setup_django()
+    harness.migrate()
+    seconds = harness.seed_dataset(args.classes, args.bookings, args.clients, args.seed, max_slots=args.bookings // args.classes * 4 + 20)
+    print(f"Seeded {args.classes} classes and {args.bookings} bookings in {seconds:.1f}s\n")
+
+    from django.utils import timezone
+    from halo.models import Class, Booking
+    upcoming_ids = list(Class.objects.filter(datetime__gte=timezone.now()).values_list('id', flat=True))
+    emails = list(Booking.objects.values_list('client_email', flat=True).distinct()[:1000])
+    new_client = itertools.count()
+
+    def book_class(client, i, rng):
+        return client.post('/book/', {
+            'class_id': rng.choice(upcoming_ids),
+            'client_name': 'Bench Client',
+            'client_email': f'bench{next(new_client)}@example.com',
+        })
+
+    def get_bookings(client, i, rng):
+        return client.get('/bookings/', {'email': rng.choice(emails)})
+
+    #harness.setup_django silences logging, this benchmark is about paying for it
+    logging.disable(logging.NOTSET)
+    directory = tempfile.mkdtemp(prefix='halo-bench-logs-')
+
+    results = {}
+    for setup, queued in (('sync', False), ('queue', True)):
+        logging.config.dictConfig(logging_config(directory, queued, args.json))
+        for name, make_request in (('POST /book', book_class), ('GET /bookings', get_bookings)):
+            for concurrency in args.concurrency:
+                results[f'{name} {setup} x{concurrency}'] = harness.run_load(make_request, args.requests, concurrency, args.seed)
+    logging.shutdown()
+
+    harness.print_table(results)
+    print(f"\nLog files are in {directory}")
+    if args.output:
+        config = vars(args).copy()
+        config.pop('output')
+        harness.save_results(args.output, results, config)
+        print(f"Saved results to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
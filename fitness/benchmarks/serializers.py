@@ -0,0 +1,83 @@
+'''
+Microbenchmark of the DRF serializers against the .values() fast path.
+
+Serializes the same rows both ways, checks the JSON is byte-identical and
+reports the time per call and the speedup. No database is touched.
+
+Run from the project directory:
+
+    python -m benchmarks.serializers --rows 10000
+'''
+import argparse
+import statistics
+import time
+from datetime import timedelta
+
+from benchmarks import harness
+
+
+def best_of(func, repeat):
+    #Median wall time of `repeat` calls in milliseconds
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--tz', default='America/New_York')
+    args = parser.parse_args()
+
+    harness.setup_django()
+    import pytz
+    from django.utils import timezone
+    from rest_framework.renderers import JSONRenderer
+    from halo.models import Class, Booking
+    from halo import serializers
+
+    tz = pytz.timezone(args.tz)
+    start = timezone.now().replace(minute=0, second=0, microsecond=0)
+    classes = [
+        Class(id=i + 1, name=f"Class{i % 40}", instructor=f"Instructor{i % 25}",
+              datetime=start + timedelta(minutes=30 * (i // 8)), slots_available=i % 20)
+        for i in range(args.rows)
+    ]
+    bookings = [
+        Booking(id=i + 1, class_booked=cls, client_name="Bench Client", client_email="bench@example.com",
+                booked_at=start - timedelta(seconds=97 * i))
+        for i, cls in enumerate(classes)
+    ]
+    class_rows = [{f: getattr(c, f) for f in serializers.CLASS_FIELDS} for c in classes]
+    booking_rows = [
+        dict({'id': b.id, 'booked_at': b.booked_at}, **{f'class_booked__{f}': getattr(b.class_booked, f) for f in serializers.CLASS_FIELDS})
+        for b in bookings
+    ]
+
+    cases = {
+        'classes': (
+            lambda: serializers.ClassSerializer(classes, many=True, context={'client_tz': tz}).data,
+            lambda: serializers.serialize_classes(class_rows, tz),
+        ),
+        'booking summaries': (
+            lambda: serializers.BookingSummarySerializer(bookings, many=True, context={'client_tz': tz}).data,
+            lambda: serializers.serialize_booking_summaries(booking_rows, tz),
+        ),
+    }
+
+    render = JSONRenderer().render
+    print(f"{args.rows} rows, tz={args.tz}\n")
+    print(f"{'payload':<20}{'DRF':>12}{'fast path':>12}{'speedup':>10}")
+    for name, (drf, fast) in cases.items():
+        if render(drf()) != render(fast()):
+            raise SystemExit(f"{name}: fast path output differs from the DRF serializer")
+        drf_ms, fast_ms = best_of(drf, args.repeat), best_of(fast, args.repeat)
+        print(f"{name:<20}{drf_ms:>10.1f}ms{fast_ms:>10.1f}ms{drf_ms / fast_ms:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
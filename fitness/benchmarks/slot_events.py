@@ -0,0 +1,139 @@
+'''
+Opens thousands of GET /events/slots streams on one event loop, the way a
+single ASGI worker holds them, then books classes and times how long each
+booking takes, from the POST /book being sent, to reach every stream.
+
+The streams go through the ASGI application of fitness/asgi.py with an
+in-memory connection per stream, so what is measured is the app and the
+slot broker: the memory and threads the idle streams hold, not those of
+the ASGI server's sockets. Resident memory is read from /proc, so Linux
+only.
+
+Run from the project directory:
+
+    python -m benchmarks.slot_events --streams 2000 --changes 50
+'''
+import argparse
+import asyncio
+import threading
+import time
+
+from benchmarks import harness
+
+
+def resident_kb():
+    #Resident memory of this process, Linux only
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+
+
+class Stream:
+
+    #An SSE connection held open on the ASGI application, counting the events it gets
+    def __init__(self, application, on_event):
+        self.application = application
+        self.on_event = on_event
+        self.started = asyncio.Event()
+        self.gone = asyncio.Event()
+        self.requested = False
+
+    async def receive(self):
+        if not self.requested:
+            self.requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.gone.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            self.started.set()
+        elif message.get('body', b'').startswith(b'id: '):
+            self.on_event()
+
+    def open(self):
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': '/events/slots/', 'query_string': b'',
+            'headers': [], 'server': ('testserver', 80),
+        }
+        self.task = asyncio.create_task(self.application(scope, self.receive, self.send))
+
+    async def close(self):
+        self.gone.set()
+        await self.task
+
+
+async def run(streams, changes, class_ids):
+    from fitness.asgi import application
+    from rest_framework.test import APIClient
+
+    events = {'count': 0, 'target': 0}
+    arrived = asyncio.Event()
+
+    def on_event():
+        events['count'] += 1
+        if events['count'] >= events['target']:
+            arrived.set()
+
+    threads, memory = threading.active_count(), resident_kb()
+    started = time.perf_counter()
+    events['target'] = streams
+    connections = [Stream(application, on_event) for _ in range(streams)]
+    for stream in connections:
+        stream.open()
+    await arrived.wait()
+    opened = time.perf_counter() - started
+    memory = resident_kb() - memory
+    idle_threads = threading.active_count() - threads
+
+    loop = asyncio.get_running_loop()
+    client = APIClient()
+    latencies = []
+    for i in range(changes):
+        events['count'], events['target'] = 0, streams
+        arrived.clear()
+        started = time.perf_counter()
+        response = await loop.run_in_executor(None, lambda: client.post(
+            '/book/', {'class_id': class_ids[i % len(class_ids)], 'client_name': 'Bench Client', 'client_email': f'bench{i}@example.com'},
+            format='json',
+        ))
+        if response.status_code != 201:
+            raise SystemExit(f"Booking failed with {response.status_code}: {response.content[:200]}")
+        await arrived.wait()
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*(stream.close() for stream in connections))
+    return {
+        'opened_s': opened,
+        'kb_per_stream': memory / streams,
+        'idle_threads': idle_threads,
+        'fanout': harness.summarize(latencies, sum(latencies) / 1000, 0, 0, streams),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--classes', type=int, default=2_000)
+    parser.add_argument('--streams', type=int, default=2_000)
+    parser.add_argument('--changes', type=int, default=50, help='bookings made while the streams are open')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    harness.setup_django()
+    harness.migrate()
+    seconds = harness.seed_dataset(args.classes, 0, 100, args.seed)
+    print(f"Seeded {args.classes} classes in {seconds:.1f}s\n")
+
+    from django.utils import timezone
+    from halo.models import Class
+    class_ids = list(Class.objects.filter(datetime__gte=timezone.now(), slots_available__gt=0).values_list('id', flat=True)[:args.changes])
+
+    result = asyncio.run(run(args.streams, args.changes, class_ids))
+    fanout = result['fanout']
+    print(f"Opened {args.streams} streams in {result['opened_s']:.2f}s, "
+          f"{result['kb_per_stream']:.1f} KB and {result['idle_threads'] / args.streams:.3f} threads per idle stream")
+    print(f"Booking to every stream: p50 {fanout['p50_ms']:.2f}ms, p95 {fanout['p95_ms']:.2f}ms, p99 {fanout['p99_ms']:.2f}ms "
+          f"over {fanout['requests']} bookings")
+
+
+if __name__ == '__main__':
+    main()
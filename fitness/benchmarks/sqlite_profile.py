@@ -0,0 +1,114 @@
+'''
+Compares the default and production SQLite profiles (HALO_DB_PROFILE) under
+a mixed workload: threads sending GET /classes while others book classes
+with POST /book, so reads and writes hit the database at the same time.
+
+Each profile runs in its own process on a fresh database, since the
+profile is read from the settings at startup. The test client never closes
+connections, so every request here ends with close_old_connections() the
+way Django's request_finished does under a real server. That is what
+CONN_MAX_AGE saves.
+
+Run from the project directory:
+
+    python -m benchmarks.sqlite_profile --concurrency 4 16 --write-ratio 0.2
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import harness
+from benchmarks.endpoints import TIMEZONES
+
+PROFILES = ('default', 'production')
+
+
+def make_request(class_ids, write_ratio):
+    from django.db import close_old_connections
+
+    def request(client, i, rng):
+        if rng.random() < write_ratio:
+            #A fresh client per booking, so bookings succeed until the classes fill up
+            response = client.post('/book/', {
+                'class_id': rng.choice(class_ids), 'client_name': 'Bench Client', 'client_email': f'bench{i}@example.com',
+            }, format='json')
+        else:
+            #A fresh page size now and then makes some requests miss the page cache
+            response = client.get('/classes/', {'tz': rng.choice(TIMEZONES), 'page_size': rng.choice((20, 50, rng.randint(1, 200)))})
+        close_old_connections()
+        return response
+
+    return request
+
+
+def run_profile(args):
+    #Runs in the child process, with HALO_DB_PROFILE already set
+    harness.setup_django()
+    harness.migrate()
+    harness.seed_dataset(args.classes, args.bookings, args.clients, args.seed, max_slots=args.bookings // args.classes * 4 + 50)
+
+    from halo.models import Class
+    class_ids = list(Class.objects.values_list('id', flat=True))
+
+    results = {}
+    for concurrency in args.concurrency:
+        request = make_request(class_ids, args.write_ratio)
+        results[f'mixed {args.profile} x{concurrency}'] = harness.run_load(request, args.requests, concurrency, args.seed)
+    return results
+
+
+def run_in_child(profile, argv):
+    #Runs one profile in a fresh interpreter, returns its results
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+        path = f.name
+    try:
+        env = dict(os.environ, HALO_DB_PROFILE=profile)
+        subprocess.run(
+            [sys.executable, '-m', 'benchmarks.sqlite_profile', *argv, '--profile', profile, '--child-output', path],
+            env=env, check=True,
+        )
+        with open(path) as f:
+            return json.load(f)
+    finally:
+        os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--classes', type=int, default=2_000)
+    parser.add_argument('--bookings', type=int, default=50_000)
+    parser.add_argument('--clients', type=int, default=5_000)
+    parser.add_argument('--requests', type=int, default=2_000, help='requests per profile and concurrency level')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[4, 16])
+    parser.add_argument('--write-ratio', type=float, default=0.2, help='share of requests that are POST /book')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--profile', choices=PROFILES, help=argparse.SUPPRESS)
+    parser.add_argument('--child-output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        with open(args.child_output, 'w') as f:
+            json.dump(run_profile(args), f)
+        return
+
+    results = {}
+    for profile in PROFILES:
+        print(f"Running the {profile} profile...")
+        results.update(run_in_child(profile, sys.argv[1:]))
+
+    print()
+    harness.print_table(results)
+    if args.output:
+        config = vars(args).copy()
+        for key in ('output', 'profile', 'child_output'):
+            config.pop(key)
+        harness.save_results(args.output, results, config)
+        print(f"\nSaved results to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
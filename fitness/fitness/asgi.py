@@ -2,6 +2,8 @@
 ASGI config for fitness project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+GET /events/slots/ is answered here, before Django's request handling, see
+halo.utils.slot_events.slot_events_app.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +15,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fitness.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+#After Django's setup, which get_asgi_application() runs
+from django.urls import reverse  # noqa: E402
+from halo.utils.slot_events import slot_events_app  # noqa: E402
+
+SLOT_EVENTS_PATH = reverse('slot_events')
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == SLOT_EVENTS_PATH:
+        return await slot_events_app(scope, receive, send)
+    return await django_application(scope, receive, send)
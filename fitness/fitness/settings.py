@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'halo.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -78,9 +80,32 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        #File-backed test database so concurrent booking tests can share it across threads
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
+# Database profile, picked with the HALO_DB_PROFILE environment variable.
+# 'production' tunes SQLite for concurrent traffic: WAL and the other PRAGMAs of
+# halo.utils.sqlite_tuning on every connection, connections kept open between
+# requests, and transactions (the booking writes) started with BEGIN IMMEDIATE so
+# they queue on busy_timeout instead of failing when upgrading to a write lock.
+
+HALO_DB_PROFILE = os.environ.get('HALO_DB_PROFILE', 'default')
+HALO_SQLITE_PRAGMAS = {}
+
+if HALO_DB_PROFILE == 'production':
+    from halo.utils.sqlite_tuning import PRODUCTION_PRAGMAS
+
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+    })
+    HALO_SQLITE_PRAGMAS = PRODUCTION_PRAGMAS
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -125,31 +150,142 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# Cache
+# GET /classes pages and the schedule version live here. Use a shared backend
+# (e.g. Redis or Memcached) when running several worker processes.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    #Stored POST /book responses, replayed for retries with the same Idempotency-Key
+    'idempotency': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'halo-idempotency',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+HALO_SCHEDULE_CACHE_TIMEOUT = 300   #Upper bound in seconds for a cached GET /classes page
+
+# Idempotency-Key handling of POST /book and POST /book/batch: responses are kept
+# for HALO_IDEMPOTENCY_TTL seconds, and a retry of a request still in flight waits
+# up to HALO_IDEMPOTENCY_WAIT seconds for its response
+
+HALO_IDEMPOTENCY_CACHE = 'idempotency'
+HALO_IDEMPOTENCY_TTL = 24 * 60 * 60
+HALO_IDEMPOTENCY_WAIT = 10
+HALO_IDEMPOTENCY_LOCK_TIMEOUT = 30   #Seconds before the in-flight marker of a crashed request expires
+
+
+# Token-bucket rate limits per client IP and client email, as (requests, per seconds)
+# for each scope. Buckets live in this process unless HALO_RATE_LIMIT_CACHE names a
+# cache shared by all workers. Behind a proxy, HALO_RATE_LIMIT_IP_HEADER (e.g.
+# 'HTTP_X_FORWARDED_FOR') is where the client IP is read from.
+
+HALO_RATE_LIMIT_ENABLED = True
+HALO_RATE_LIMITS = {
+    'book': (20, 60),
+    'book_batch': (5, 60),
+    'bookings': (60, 60),
+    'availability': (120, 60),
+}
+HALO_RATE_LIMIT_CACHE = None
+HALO_RATE_LIMIT_IP_HEADER = None
+
+
+# Keyset pagination of GET /classes and GET /bookings
+
+HALO_PAGE_SIZE = 50
+HALO_MAX_PAGE_SIZE = 200
+
+# Days ahead GET /classes lists the occurrences of class templates that have no Class row yet
+
+HALO_OCCURRENCE_HORIZON_DAYS = 28
+
+# Build GET /classes and GET /bookings responses from .values() rows instead of DRF serializers
+
+HALO_FAST_SERIALIZERS = True
+
+# Most bookings accepted by one POST /book/batch request
+
+HALO_MAX_BATCH_SIZE = 100
+
+# Rows an admin changelist counts at most, longer lists show an estimate (see halo.admin)
+
+HALO_ADMIN_COUNT_LIMIT = 10_000
+
+# Route GET /classes and GET /bookings to the async views, for ASGI deployments
+# (they are also served at /async/classes and /async/bookings either way)
+
+HALO_ASYNC_VIEWS = False
+
+# GET /events/slots (served by fitness.asgi): seconds between keepalive comments, seconds between
+# checks for slot changes made by other processes, the reconnect delay sent to
+# clients, and batches a slow stream may fall behind before it re-reads the database
+
+HALO_SSE_HEARTBEAT = 15
+HALO_SSE_POLL_INTERVAL = 5
+HALO_SSE_RETRY_MS = 3000
+HALO_SSE_MAX_PENDING = 100
+
+# Server-Timing header and a timing log line for every request, with the SQL of
+# requests slower than HALO_SLOW_REQUEST_MS (None never logs SQL)
+
+HALO_REQUEST_TIMING = True
+HALO_SLOW_REQUEST_MS = 500
+
+
+# Log records are written to the console and logs/debug.log by a background
+# thread; the file rotates at HALO_LOG_MAX_BYTES. HALO_LOG_JSON writes the
+# file as one JSON object per line.
+
+HALO_LOG_JSON = False
+HALO_LOG_MAX_BYTES = 10 * 1024 * 1024
+HALO_LOG_BACKUP_COUNT = 5
+
 LOGGING = {
     'version' : 1,
     'disable_existing_loggers': False,
+    'formatters' : {
+        'plain' : {
+            'format' : '%(message)s',
+        },
+        'json' : {
+            '()' : 'halo.log_handlers.JsonFormatter',
+        },
+    },
     'handlers' : {
         'console' : {
             'class' : 'logging.StreamHandler',
+            'formatter' : 'plain',
         },
         'file': {
             'level' : 'INFO',
-            'class' : 'logging.FileHandler',
-            'filename' : 'logs/debug.log', 
+            'class' : 'logging.handlers.RotatingFileHandler',
+            'filename' : 'logs/debug.log',
+            'maxBytes' : HALO_LOG_MAX_BYTES,
+            'backupCount' : HALO_LOG_BACKUP_COUNT,
+            'formatter' : 'json' if HALO_LOG_JSON else 'plain',
+        },
+        #Hands records to console and file on a writer thread
+        'queue': {
+            '()' : 'halo.log_handlers.QueueListenerHandler',
+            'handlers' : ['cfg://handlers.console', 'cfg://handlers.file'],
         },
     },
     'root' : {
-        'handlers' : ['console', 'file'],
+        'handlers' : ['queue'],
         'level' : 'INFO',
     },
     'loggers' : {
         'django' : {
-            'handlers' : ['console', 'file'],
+            'handlers' : ['queue'],
             'level' : 'INFO',
             'propagate' : True,
         },
         'halo' : {
-            'handlers' : ['console', 'file'],
+            'handlers' : ['queue'],
             'level' : 'INFO',
             'propagate': False,
         },
@@ -1,6 +1,111 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import Class, Booking
+from django.core.paginator import Paginator
+from django.db.models import Count, IntegerField, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Lower
+from django.utils.functional import cached_property
+from .models import Class, ClassTemplate, Booking, Client
+from .utils.validators import normalize_email
 
-# Register your models here.
-admin.site.register(Class)
-admin.site.register(Booking)
+
+class CappedCountPaginator(Paginator):
+
+    '''
+    Paginator of the changelists of big tables, which counts no further
+    than HALO_ADMIN_COUNT_LIMIT rows. Past that, an unfiltered list reports
+    its highest id, which SQLite reads off the end of the table, and a
+    filtered one the limit itself: its later pages are reached by narrowing
+    the search or filters.
+    '''
+
+    @cached_property
+    def count(self):
+        limit = getattr(settings, 'HALO_ADMIN_COUNT_LIMIT', 10_000)
+        count = self.object_list.order_by().values('pk')[:limit + 1].count()
+        if count <= limit:
+            return count
+        if not self.object_list.query.where:
+            return self.object_list.model._base_manager.aggregate(last=Max('pk'))['last']
+        return limit
+
+
+class IndexedSearchAdmin(admin.ModelAdmin):
+
+    '''
+    Admin whose search matches whole values case-insensitively, through the
+    expression indexes on LOWER() of the fields in `search_fields`, instead
+    of the default LIKE '%term%' that reads the whole table.
+    '''
+    paginator = CappedCountPaginator
+    show_full_result_count = False  #A second, unfiltered, count on every search
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip().lower()
+        if not term:
+            return queryset, False
+        aliases = {f'{field.replace("__", "_")}_lower': Lower(field) for field in self.search_fields}
+        matches = Q()
+        for alias in aliases:
+            matches |= Q(**{alias: term})
+        return queryset.alias(**aliases).filter(matches), False
+
+
+@admin.register(Class)
+class ClassAdmin(IndexedSearchAdmin):
+    list_display = ('name', 'instructor', 'datetime', 'slots_available', 'booking_count')
+    list_filter = ('datetime',)
+    search_fields = ('name', 'instructor')   #class_name_idx, class_instructor_idx
+    search_help_text = "Whole class or instructor name, in any case."
+    ordering = ('datetime', 'id')   #class_datetime_idx, total so the changelist adds no -pk of its own
+    raw_id_fields = ('template',)
+
+    def get_queryset(self, request):
+        #Counted for the rows of the page only, each from the bookings' class_booked index
+        bookings = Booking.objects.filter(class_booked=OuterRef('pk')).order_by().values('class_booked').annotate(count=Count('*')).values('count')
+        return super().get_queryset(request).annotate(booking_count=Coalesce(Subquery(bookings, output_field=IntegerField()), 0))
+
+
+    @admin.display(description='Bookings', ordering='booking_count')
+    def booking_count(self, cls):
+        return cls.booking_count
+
+
+@admin.register(Booking)
+class BookingAdmin(IndexedSearchAdmin):
+    list_display = ('client_name', 'client_email', 'class_booked', 'class_datetime', 'booked_at')
+    list_select_related = ('class_booked',)  #Booking and class names in the same query
+    list_filter = ('class_booked__datetime',)
+    search_fields = ('class_booked__name',)  #class_name_idx, then the bookings' class_booked index
+    search_help_text = "Client email, or whole class name in any case."
+    raw_id_fields = ('class_booked', 'client')
+
+    def get_search_results(self, request, queryset, search_term):
+        #Emails are looked up through the client's unique email
+        if '@' in search_term:
+            return queryset.filter(client__email=normalize_email(search_term)), False
+        return super().get_search_results(request, queryset, search_term)
+
+
+    @admin.display(description='Class time', ordering='class_booked__datetime')
+    def class_datetime(self, booking):
+        return booking.class_booked.datetime
+
+
+@admin.register(Client)
+class ClientAdmin(admin.ModelAdmin):
+    list_display = ('name', 'email')
+    search_fields = ('email',)
+    search_help_text = "Client email."
+    paginator = CappedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        #Exact match on the unique email rather than a LIKE over every client
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(email=normalize_email(search_term)), False
+
+
+@admin.register(ClassTemplate)
+class ClassTemplateAdmin(admin.ModelAdmin):
+    list_display = ('name', 'instructor', 'weekday', 'start_time', 'timezone', 'starts_on', 'ends_on')
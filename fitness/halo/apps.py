@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class HaloConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'halo'
+
+    def ready(self):
+        from . import signals  # noqa: F401 Connects the schedule cache receivers
+        from .utils.sqlite_tuning import install_pragmas
+        install_pragmas()
+
+        #Before any connection opens, so the ones of threads that never load the middleware are timed too
+        from django.conf import settings
+        if getattr(settings, 'HALO_REQUEST_TIMING', False):
+            from .utils.request_metrics import install_query_recorder
+            install_query_recorder()
@@ -0,0 +1,103 @@
+import copy
+import json
+import logging
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+#Attributes every LogRecord has, anything else on a record came in through `extra`
+_RECORD_ATTRS = set(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime', 'taskName'}
+
+
+class QueueListenerHandler(QueueHandler):
+
+    '''
+    Puts records on an in-memory queue and writes them to `handlers` from a
+    background QueueListener thread, so file and console I/O stay off the
+    request thread. The message is still rendered when it is queued.
+
+    Configured from LOGGING with the target handlers as cfg:// references:
+
+        'queue': {
+            '()': 'halo.log_handlers.QueueListenerHandler',
+            'handlers': ['cfg://handlers.console', 'cfg://handlers.file'],
+        }
+
+    The references are resolved when the first record arrives, once
+    dictConfig has set every handler up, whatever order it created them in.
+    Keeping dictConfig's list also keeps the targets alive: logging only
+    holds weak references to handlers no logger uses. Handler instances can
+    be passed as well.
+
+    `maxsize` bounds the queue (0 for no bound). When it is full, logging
+    blocks until the writer catches up rather than dropping records.
+    '''
+
+    def __init__(self, handlers, maxsize=0, respect_handler_level=True):
+        super().__init__(queue.Queue(maxsize))
+        #Not copied, dictConfig resolves its cfg:// references on index access
+        self.targets = handlers
+        self.respect_handler_level = respect_handler_level
+        self.listener = None
+
+
+    def _start_listener(self):
+        targets = []
+        for i in range(len(self.targets)):
+            target = self.targets[i]
+            if not isinstance(target, logging.Handler):
+                raise ValueError(f"Queue handler target is not a configured handler: {target}")
+            targets.append(target)
+        self.listener = QueueListener(self.queue, *targets, respect_handler_level=self.respect_handler_level)
+        self.listener.start()
+
+
+    def prepare(self, record):
+        #Renders the message now, the args may change before the writer gets to it,
+        #and keeps exc_info so the target's formatter lays out the traceback
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+    def enqueue(self, record):
+        #Runs under the handler's lock, so the listener is started once
+        if self.listener is None and self.targets is not None:
+            self._start_listener()
+        self.queue.put(record)
+
+
+    def close(self):
+        #Drains the queue into the targets before they are closed, logging.shutdown runs this at exit
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        self.targets = None
+        super().close()
+
+
+
+class JsonFormatter(logging.Formatter):
+
+    '''
+    Formats a record as one JSON object per line: time, level, logger and
+    message, plus any fields passed through `extra` (e.g. the request
+    timings of halo.timing) and the traceback when there is one.
+    '''
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str)
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from halo.utils.export import EXPORT_FORMATS, parse_export_filters, export_rows, export_lines
+
+
+class Command(BaseCommand):
+    help = 'Stream bookings with their class info as CSV or NDJSON, to a file or stdout, without loading them all in memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv', help='Output format')
+        parser.add_argument('--start', help='Only bookings made at or after this ISO date or datetime (UTC)')
+        parser.add_argument('--end', help='Only bookings made before this ISO date or datetime (UTC)')
+        parser.add_argument('--class-id', help='Only bookings of this class')
+        parser.add_argument('--output', help='File to write, stdout by default')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched from the database at a time')
+
+
+    def handle(self, *args, **options):
+        try:
+            filters = parse_export_filters(options)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        rows = export_rows(chunk_size=options['chunk_size'], **filters)
+        lines = export_lines(options['format'], rows)
+
+        if options['output']:
+            written = -1 if options['format'] == 'csv' else 0   #The CSV header isn't a booking
+            with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+                for line in lines:
+                    f.write(line)
+                    written += 1
+            self.stdout.write(self.style.SUCCESS(f"Exported {written} bookings to {options['output']}."))
+        else:
+            #The export itself goes to stdout, nothing else is written there
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,148 @@
+import csv
+import json
+import os
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from halo.models import Class
+from halo.utils.schedule_cache import bump_schedule_version
+from halo.utils.availability import next_slots_version
+from halo.utils.timezone import convert_local_to_utc_many, resolve_timezone
+from .seed import chunked
+
+FIELDS = ('name', 'datetime', 'instructor', 'slots_available')
+FORMATS = {'.csv': 'csv', '.json': 'json', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+
+class Command(BaseCommand):
+    help = (
+        'Import classes from a CSV or JSON file with name, datetime, instructor and slots_available. '
+        'Times are local to --timezone (IST by default). Rows already in the schedule are skipped, '
+        'invalid rows are reported without stopping the import.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV with a header row, JSON Lines (.jsonl/.ndjson) or a JSON array (.json)')
+        parser.add_argument('--format', choices=sorted(set(FORMATS.values())), help='File format, guessed from the extension by default')
+        parser.add_argument('--timezone', default='Asia/Kolkata', help='Timezone of the times in the file')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows validated, checked and inserted at a time')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and count without inserting anything')
+
+
+    def handle(self, *args, **options):
+        tz = resolve_timezone(options['timezone'])
+        if tz is None:
+            raise CommandError(f"Unknown timezone: {options['timezone']}")
+        fmt = options['format'] or FORMATS.get(os.path.splitext(options['path'])[1].lower())
+        if fmt is None:
+            raise CommandError("Can't tell the file format from its extension, pass --format.")
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+
+        totals = {'created': 0, 'duplicates': 0, 'errors': 0}
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as f:
+                for chunk in chunked(self.read_rows(f, fmt), options['chunk_size']):
+                    self.import_chunk(chunk, tz, options['dry_run'], totals)
+        except OSError as e:
+            raise CommandError(f"Can't read {options['path']}: {e}")
+        except (csv.Error, json.JSONDecodeError) as e:
+            raise CommandError(f"{options['path']} is not valid {fmt}: {e}")
+
+        verb = 'Would create' if options['dry_run'] else 'Created'
+        summary = f"{verb} {totals['created']} classes, skipped {totals['duplicates']} already scheduled, {totals['errors']} rows with errors."
+        self.stdout.write(self.style.WARNING(summary) if totals['errors'] else self.style.SUCCESS(summary))
+
+
+    def read_rows(self, f, fmt):
+        #Yields (row number, row) pairs without reading the whole file, except for a JSON array.
+        #A JSON Lines row that doesn't parse comes as the ValueError to report for it
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            missing = set(FIELDS) - set(reader.fieldnames or ())
+            if missing:
+                raise CommandError(f"CSV header is missing: {', '.join(sorted(missing))}")
+            for row in reader:
+                yield reader.line_num, row
+        elif fmt == 'jsonl':
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield number, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield number, ValueError(f"invalid JSON ({e.msg})")
+        else:
+            rows = json.load(f)
+            if not isinstance(rows, list):
+                raise CommandError("A .json file must hold a list of classes.")
+            yield from enumerate(rows, 1)
+
+
+    def import_chunk(self, chunk, tz, dry_run, totals):
+
+        '''
+        Validates a chunk of (row number, row) pairs, converts their times in
+        one batch, drops rows already scheduled (same name, instructor and
+        time) with one query, and bulk inserts the rest in a transaction.
+        '''
+        times = convert_local_to_utc_many(
+            (str(row.get('datetime', '')).strip() for _, row in chunk if isinstance(row, dict)), tz
+        )
+
+        valid = {}
+        for number, row in chunk:
+            try:
+                cls = self.build_class(row, times)
+            except ValueError as e:
+                self.stderr.write(f"Row {number}: {e}")
+                totals['errors'] += 1
+                continue
+            key = (cls.name, cls.instructor, cls.datetime)
+            if key in valid:
+                totals['duplicates'] += 1   #Repeated within the file
+            else:
+                valid[key] = cls
+
+        if not valid:
+            return
+
+        existing = set(Class.objects.filter(datetime__in={cls.datetime for cls in valid.values()}).values_list('name', 'instructor', 'datetime'))
+        new = [cls for key, cls in valid.items() if key not in existing]
+        totals['duplicates'] += len(valid) - len(new)
+        totals['created'] += len(new)
+
+        if new and not dry_run:
+            for cls in new:
+                cls.slots_version = next_slots_version()
+            with transaction.atomic():
+                Class.objects.bulk_create(new)
+                transaction.on_commit(bump_schedule_version)   #bulk_create() skips the model signals
+
+
+    def build_class(self, row, times):
+        #Class for a row, ValueError naming the first problem
+        if isinstance(row, ValueError):
+            raise row
+        if not isinstance(row, dict):
+            raise ValueError("expected an object with " + ', '.join(FIELDS))
+        values = {field: str(row.get(field) if row.get(field) is not None else '').strip() for field in FIELDS}
+        missing = [field for field in FIELDS if not values[field]]
+        if missing:
+            raise ValueError(f"missing {', '.join(missing)}")
+
+        for field in ('name', 'instructor'):
+            max_length = Class._meta.get_field(field).max_length
+            if len(values[field]) > max_length:
+                raise ValueError(f"{field} is longer than {max_length} characters")
+
+        try:
+            slots = int(values['slots_available'])
+        except ValueError:
+            slots = -1
+        if slots < 1:
+            raise ValueError(f"slots_available must be a positive integer, got '{values['slots_available']}'")
+
+        moment = times.get(values['datetime'])
+        if isinstance(moment, ValueError):
+            raise ValueError(str(moment))
+        return Class(name=values['name'], instructor=values['instructor'], datetime=moment, slots_available=slots)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from halo.utils.booking_counters import rebuild_counters, stale_counters
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-client day and week booking counters from the bookings, or verify them with --verify.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='Only compare the counters with the bookings, fail on any mismatch')
+        parser.add_argument('--show', type=int, default=20, help='Mismatches listed by --verify')
+
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+
+        if options['verify']:
+            stale = stale_counters(now).select_related('client').order_by('client_id', 'start')
+            mismatches = stale.count()
+            for counter in stale[:options['show']]:
+                self.stdout.write(
+                    f"{counter.client.email} {counter.start:%Y-%m-%d %H:%M} to {counter.end:%Y-%m-%d %H:%M}: "
+                    f"counter {counter.count}, bookings {counter.actual}"
+                )
+            if mismatches:
+                raise CommandError(f"{mismatches} booking counters don't match the bookings, run rebuild_booking_counters.")
+            self.stdout.write(self.style.SUCCESS("Booking counters match the bookings."))
+            return
+
+        with transaction.atomic():
+            deleted, recounted = rebuild_counters(now)
+        self.stdout.write(self.style.SUCCESS(f"Recounted {recounted} booking counters, deleted {deleted} expired."))
@@ -1,79 +1,241 @@
-from django.core.management.base import BaseCommand
-from faker import Faker
-from halo.models import Class, Booking
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from itertools import accumulate, islice
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-import random 
+from faker import Faker
+from halo.models import Class, Booking, BookingCounter, Client
+from halo.utils.booking_counters import rebuild_counters
+from halo.utils.booking_limits import DAILY_LIMIT, WEEKLY_LIMIT
+from halo.utils.schedule_cache import bump_schedule_version
+from halo.utils.availability import next_slots_version
+import pytz
+import random
+import time as clock
 
-fake = Faker()
 
-Faker.seed(42)
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
 
-class Command(BaseCommand):
-    help = 'Seed Classes and Bookings with fake data, avoiding duplicates'
 
-    def handle(self, *args, **kwargs):
+class Command(BaseCommand):
+    help = 'Seed Classes and Bookings with fake data, avoiding duplicates. Scales to benchmark-sized datasets.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--classes', type=int, default=10, help='Number of classes to create')
+        parser.add_argument('--bookings', type=int, default=30, help='Number of bookings to create')
+        parser.add_argument('--clients', type=int, help='Number of distinct clients (default: one per booking)')
+        parser.add_argument('--days', type=int, default=30, help='Classes are scheduled over the next DAYS days')
+        parser.add_argument('--timezones', default='UTC', help='Comma-separated timezones classes are scheduled in, at local hours 6 AM to 9 PM')
+        parser.add_argument('--skew', type=float, default=0.0, help='Popularity skew: 0 spreads bookings evenly, 1 or more piles them onto popular classes')
+        parser.add_argument('--min-slots', type=int, default=5, help='Smallest class capacity')
+        parser.add_argument('--max-slots', type=int, default=20, help='Largest class capacity')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Rows per insert')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, the same seed builds the same dataset')
+        parser.add_argument('--flush', action='store_true', help='Delete existing classes and bookings first')
+
+
+    def handle(self, *args, **options):
         self.stdout.write("Starting seeding process...")
-
-        #Number of new classes and bookings to create
-        NUM_CLASSES = 10
-        BOOKINGS_PER_CLASS = 3
-
-        #Create upcoming classes only
+        started = clock.perf_counter()
+
+        num_clients = options['clients'] or max(options['bookings'], 1)
+        try:
+            zones = [pytz.timezone(name.strip()) for name in options['timezones'].split(',')]
+        except pytz.UnknownTimeZoneError as e:
+            raise CommandError(f"Unknown timezone: {e}")
+        if options['min_slots'] > options['max_slots'] or options['min_slots'] < 1:
+            raise CommandError("--min-slots must be at least 1 and no larger than --max-slots")
+
+        rng = random.Random(options['seed'])
+        fake = Faker()
+        fake.seed_instance(options['seed'])
         now = timezone.now()
 
-        for _ in range(NUM_CLASSES):
-            class_name = fake.word().capitalize()
-            instructor = fake.name()
-
-            #atetime in next 30 days
-            dt = fake.date_time_between(start_date='now', end_date='+30d', tzinfo=timezone.get_current_timezone())
-
-            slots = random.randint(5, 20)
-
-            #Avoid creating exact duplicate classes (same name + datetime + instructor)
-            exists = Class.objects.filter(name=class_name, datetime=dt, instructor=instructor).exists()
-            if exists:
-                self.stdout.write(f"Skipped duplicate class: {class_name} at {dt}")
-                continue
-
-            cls = Class.objects.create(
-                name=class_name,
-                instructor=instructor,
-                datetime=dt,
-                slots_available=slots
-            )
-            self.stdout.write(f"Created Class: {cls}")
-
-            #Seed bookings for this class
-            existing_emails = set(
-                Booking.objects.filter(class_booked=cls).values_list('client_email', flat=True)
-            )
-
-            bookings_created = 0
-            attempts = 0
-            while bookings_created < BOOKINGS_PER_CLASS and attempts < BOOKINGS_PER_CLASS * 3:
-                client_name = fake.name()
-                client_email = fake.unique.email()
-
-                #Avoid duplicate emails for bookings globally
-                if Booking.objects.filter(client_email=client_email).exists():
-                    attempts += 1
-                    continue
+        if connection.vendor == 'sqlite':
+            #A bigger page cache keeps the booking indexes in memory while loading
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA cache_size = -262144')
+
+        with transaction.atomic():
+            if options['flush']:
+                BookingCounter.objects.all().delete()
+                Booking.objects.all().delete()
+                Client.objects.all().delete()
+                Class.objects.all().delete()
+
+            classes = self.create_classes(options, zones, rng, fake, now)
+            self.stdout.write(f"Created {len(classes)} classes")
+
+            created = 0
+            client_ids = dict(Client.objects.values_list('email', 'id'))
+            next_client_id = max(client_ids.values(), default=0) + 1
+            rows = self.generate_bookings(options, classes, num_clients, rng, fake, now)
+            for chunk in chunked(rows, options['chunk_size']):
+                next_client_id = self.insert_clients(chunk, client_ids, next_client_id)
+                self.insert_bookings(chunk, client_ids)
+                created += len(chunk)
+                self.stdout.write(f"Created {created} bookings")
+
+            #Clients were inserted with explicit ids, move the id sequence past them
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), [Client]):
+                    cursor.execute(sql)
+
+            #Slots left = capacity minus bookings, for every new class in one statement
+            booked = Booking.objects.filter(class_booked=OuterRef('pk')).values('class_booked').annotate(n=Count('id')).values('n')
+            for ids in chunked((c.id for c in classes), 500):
+                Class.objects.filter(id__in=ids).update(
+                    slots_available=F('slots_available') - Coalesce(Subquery(booked), 0),
+                    slots_version=next_slots_version(),
+                )
+            transaction.on_commit(bump_schedule_version)   #Bulk writes skip the model signals
+
+            #Raw inserts don't count themselves into the existing booking counters
+            rebuild_counters()
+
+        if created < options['bookings']:
+            self.stdout.write(self.style.WARNING(
+                f"Only {created} of {options['bookings']} bookings fit the class capacity, duplicate and limit rules."
+            ))
+        self.stdout.write(self.style.SUCCESS(f"Seeding completed in {clock.perf_counter() - started:.1f}s!"))
+
+
+    def create_classes(self, options, zones, rng, fake, now):
+        #Upcoming classes at local half hours between 6 AM and 9 PM in one of the timezones
+        class_names = list({fake.word().capitalize() for _ in range(200)})
+        instructors = [fake.name() for _ in range(max(options['classes'] // 20, 1))]
+
+        classes = []
+        for _ in range(options['classes']):
+            tz = rng.choice(zones)
+            day = (now.astimezone(tz) + timedelta(days=rng.randint(1, options['days']))).date()
+            local = datetime.combine(day, time(rng.randint(6, 20), rng.choice((0, 30))))
+            classes.append(Class(
+                name=rng.choice(class_names),
+                instructor=rng.choice(instructors),
+                datetime=tz.normalize(tz.localize(local)).astimezone(pytz.UTC),
+                slots_available=rng.randint(options['min_slots'], options['max_slots']),
+            ))
+        return Class.objects.bulk_create(classes, batch_size=options['chunk_size'])
+
+
+    def insert_sql(self, model, fields):
+        #INSERT statement for the given fields of a model, to run with executemany
+        meta = model._meta
+        columns = [meta.get_field(name).column for name in fields]
+        return 'INSERT INTO %s (%s) VALUES (%s)' % (
+            connection.ops.quote_name(meta.db_table),
+            ', '.join(connection.ops.quote_name(c) for c in columns),
+            ', '.join(['%s'] * len(columns)),
+        )
+
+
+    def insert_clients(self, rows, client_ids, next_id):
+        #Inserts the clients of the rows that are not in client_ids yet from id next_id on, returns the next free id
+        new = {}
+        for _, name, email, _ in rows:
+            if email not in client_ids and email not in new:
+                new[email] = (next_id + len(new), name, email)
+        if not new:
+            return next_id
+
+        with connection.cursor() as cursor:
+            cursor.executemany(self.insert_sql(Client, ('id', 'name', 'email')), list(new.values()))
+        client_ids.update((email, row[0]) for email, row in new.items())
+        return next_id + len(new)
+
+
+    def insert_bookings(self, rows, client_ids):
+
+        '''
+        Inserts (class_id, name, email, booked_at) rows with one executemany.
+        Booking.objects.bulk_create costs about 100us of model and SQL
+        compilation per row and stamps booked_at with the current time
+        through auto_now_add, so at a million rows the plain statement wins.
+        '''
+        sql = self.insert_sql(Booking, ('class_booked', 'client', 'client_name', 'client_email', 'booked_at'))
+        adapt = connection.ops.adapt_datetimefield_value
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, [
+                (class_id, client_ids[email], name, email, adapt(booked_at)) for class_id, name, email, booked_at in rows
+            ])
+
+
+    def generate_bookings(self, options, classes, num_clients, rng, fake, now):
+
+        '''
+        Yields (class_id, name, email, booked_at) rows one at a time. Class
+        capacity, one booking per (class, client) and the daily and weekly
+        limits (in UTC) are all enforced in memory, so no query runs per
+        candidate.
+        '''
+        if not classes:
+            return
+
+        #Client identities from small name pools, emails made unique by the client number
+        first_names = sorted({n for n in (fake.first_name() for _ in range(500)) if n.isalpha()})
+        last_names = sorted({n for n in (fake.last_name() for _ in range(500)) if n.isalpha()})
+
+        def client(n):
+            first = first_names[n % len(first_names)]
+            last = last_names[(n // len(first_names)) % len(last_names)]
+            return f"{first} {last}", f"{first}.{last}{n}@example.com".lower()
+
+        #Popular classes first: weight of rank r is 1 / (r + 1) ** skew
+        cum_weights = list(accumulate(1 / (rank + 1) ** options['skew'] for rank in range(len(classes))))
+        left = [cls.slots_available for cls in classes]
+        capacity_left = sum(left)
+
+        #Classes with free slots, a full class drawn by weight overflows to one of these
+        open_classes = list(range(len(classes)))
+        position = list(range(len(classes)))
+
+        pairs = set()
+        daily = {}
+        weekly = {}
+        horizon = options['days'] * 86400
+        now_ts = int(now.timestamp())
+        created = 0
+        attempts = 0
+
+        while created < options['bookings'] and capacity_left and attempts < options['bookings'] * 10:
+            batch = rng.choices(range(len(classes)), cum_weights=cum_weights, k=1000)
+            for index in batch:
+                attempts += 1
+                if created >= options['bookings'] or not capacity_left:
+                    break
+                if not left[index]:
+                    index = open_classes[rng.randrange(len(open_classes))]
 
-                #Avoid duplicate email for this class's bookings
-                if client_email in existing_emails:
-                    attempts += 1
+                number = rng.randrange(num_clients)
+                if (index, number) in pairs:
                     continue
 
-                #Create booking
-                Booking.objects.create(
-                    class_booked=cls,
-                    client_name=client_name,
-                    client_email=client_email,
-                )
-                bookings_created += 1
-                existing_emails.add(client_email)
-                self.stdout.write(f"Created Booking for {client_email} in class {cls.name}")
-                attempts += 1
+                #UTC day and Monday-based week numbers, 1970-01-01 was a Thursday
+                booked_ts = now_ts - rng.randrange(horizon)
+                day = (number, booked_ts // 86400)
+                week = (number, (booked_ts // 86400 + 3) // 7)
+                if daily.get(day, 0) >= DAILY_LIMIT or weekly.get(week, 0) >= WEEKLY_LIMIT:
+                    continue
 
-        self.stdout.write(self.style.SUCCESS("Seeding completed!"))        
\ No newline at end of file
+                pairs.add((index, number))
+                daily[day] = daily.get(day, 0) + 1
+                weekly[week] = weekly.get(week, 0) + 1
+                left[index] -= 1
+                capacity_left -= 1
+                if not left[index]:
+                    #Swap-remove the now full class from the open list
+                    last = open_classes.pop()
+                    if last != index:
+                        open_classes[position[index]] = last
+                        position[last] = position[index]
+                created += 1
+
+                name, email = client(number)
+                yield classes[index].id, name, email, datetime.fromtimestamp(booked_ts, dt_timezone.utc)
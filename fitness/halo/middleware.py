@@ -0,0 +1,92 @@
+import logging
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from .utils.request_metrics import start_request, end_request, install_query_recorder
+
+logger = logging.getLogger('halo.timing')
+
+
+class ServerTimingMiddleware:
+
+    '''
+    Measures query count, DB time, serializer time and the time spent in the
+    view (everything below this middleware) for every request. Adds them as a
+    Server-Timing header and logs one line per request, plus the SQL of any
+    request slower than HALO_SLOW_REQUEST_MS.
+
+    Turned off by HALO_REQUEST_TIMING = False, in which case Django drops the
+    middleware at startup and no query is wrapped.
+    Works in both sync (WSGI) and async (ASGI) middleware chains.
+    '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'HALO_REQUEST_TIMING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'HALO_SLOW_REQUEST_MS', 500)
+        install_query_recorder()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        metrics, token = start_request()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            end_request(token)
+        self.report(request, response, metrics, time.perf_counter() - started)
+        return response
+
+
+    async def __acall__(self, request):
+        metrics, token = start_request()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_request(token)
+        self.report(request, response, metrics, time.perf_counter() - started)
+        return response
+
+
+    def report(self, request, response, metrics, view_time):
+        db_ms = metrics.db_time * 1000
+        serializer_ms = metrics.serializer_time * 1000
+        view_ms = view_time * 1000
+
+        response['Server-Timing'] = (
+            f'db;dur={db_ms:.2f};desc="{metrics.queries} queries", '
+            f'serializer;dur={serializer_ms:.2f}, view;dur={view_ms:.2f}'
+        )
+
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': metrics.queries,
+            'db_ms': round(db_ms, 2),
+            'serializer_ms': round(serializer_ms, 2),
+            'view_ms': round(view_ms, 2),
+        }
+        logger.info(
+            "%s %s %s view=%.2fms db=%.2fms queries=%d serializer=%.2fms",
+            request.method, request.path, response.status_code, view_ms, db_ms, metrics.queries, serializer_ms,
+            extra=fields,
+        )
+
+        if self.slow_ms is not None and view_ms >= self.slow_ms:
+            statements = '\n'.join(f'  {duration * 1000:.2f}ms  {sql}' for sql, duration in metrics.sql)
+            logger.warning(
+                "Slow request %s %s took %.2fms (%d queries, %.2fms in the database):\n%s",
+                request.method, request.path, view_ms, metrics.queries, db_ms, statements,
+                extra=fields,
+            )
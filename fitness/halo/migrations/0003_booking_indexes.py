@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:04
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def remove_duplicate_bookings(apps, schema_editor):
+    #Keeps the earliest booking of each (class, email) pair and gives the extra slots back
+    Booking = apps.get_model('halo', 'Booking')
+    Class = apps.get_model('halo', 'Class')
+
+    duplicates = (
+        Booking.objects.values('class_booked', 'client_email')
+        .annotate(first_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for row in duplicates:
+        removed, _ = Booking.objects.filter(
+            class_booked=row['class_booked'], client_email=row['client_email']
+        ).exclude(id=row['first_id']).delete()
+        Class.objects.filter(id=row['class_booked']).update(slots_available=F('slots_available') + removed)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('halo', '0002_alter_class_options_booking'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['client_email', 'booked_at'], name='booking_email_booked_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='class',
+            index=models.Index(fields=['datetime', 'id'], name='class_datetime_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(fields=('class_booked', 'client_email'), name='unique_class_booking'),
+        ),
+    ]
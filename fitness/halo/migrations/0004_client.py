@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Min, OuterRef, Subquery
+from django.db.models.functions import Lower
+
+
+def backfill_clients(apps, schema_editor):
+    Booking = apps.get_model('halo', 'Booking')
+    Class = apps.get_model('halo', 'Class')
+    Client = apps.get_model('halo', 'Client')
+
+    #Case variants of an email become one client, keep their earliest booking of each class and give the extra slots back
+    bookings = Booking.objects.annotate(email=Lower('client_email'))
+    duplicates = bookings.values('class_booked', 'email').annotate(first_id=Min('id'), total=Count('id')).filter(total__gt=1)
+    for row in duplicates:
+        removed, _ = bookings.filter(class_booked=row['class_booked'], email=row['email']).exclude(id=row['first_id']).delete()
+        Class.objects.filter(id=row['class_booked']).update(slots_available=F('slots_available') + removed)
+
+    Booking.objects.update(client_email=Lower('client_email'))
+
+    #One client per email, named as in their earliest booking
+    names = {}
+    for email, name in Booking.objects.order_by('id').values_list('client_email', 'client_name').iterator(chunk_size=10000):
+        names.setdefault(email, name)
+    Client.objects.bulk_create((Client(email=email, name=name) for email, name in names.items()), batch_size=1000)
+
+    Booking.objects.update(client=Subquery(Client.objects.filter(email=OuterRef('client_email')).values('id')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('halo', '0003_booking_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Client',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('email', models.EmailField(max_length=200, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='client',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='halo.client'),
+        ),
+        migrations.RemoveConstraint(
+            model_name='booking',
+            name='unique_class_booking',
+        ),
+        migrations.RunPython(backfill_clients, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='booking',
+            name='booking_email_booked_idx',
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='client',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='halo.client'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['client', 'booked_at'], name='booking_client_booked_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(fields=('class_booked', 'client'), name='unique_class_client_booking'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('halo', '0004_client'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('client', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='counters', to='halo.client')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('client', 'start', 'end'), name='unique_booking_counter')],
+            },
+        ),
+    ]
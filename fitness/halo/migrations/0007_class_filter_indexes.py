@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:59
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('halo', '0006_class_template'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='class',
+            index=models.Index(django.db.models.functions.text.Lower('name'), models.F('datetime'), name='class_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='class',
+            index=models.Index(django.db.models.functions.text.Lower('instructor'), models.F('datetime'), name='class_instructor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='class',
+            index=models.Index(condition=models.Q(('slots_available__gt', 0)), fields=['datetime', 'id'], name='class_open_idx'),
+        ),
+    ]
@@ -1,24 +1,72 @@
 from django.db import models
+from django.db.models.functions import Lower
 
 # Create your models here.
+#Represents a weekly class, listed as occurrences that only get a Class row once booked
+class ClassTemplate(models.Model):
+    WEEKDAYS = [(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')]
+
+    name = models.CharField(max_length=200) #Name of the class (e.g., Yoga, Pilates)
+    instructor = models.CharField(max_length=100)   #Name of the class instructor
+    slots = models.PositiveIntegerField()   #Capacity of each occurrence
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAYS)    #Day of the week the class runs on
+    start_time = models.TimeField() #Local start time in `timezone`
+    timezone = models.CharField(max_length=64, default='Asia/Kolkata')  #Timezone of the studio
+    starts_on = models.DateField()  #First local date the class can run on
+    ends_on = models.DateField(null=True, blank=True)   #Last local date, open-ended when empty
+
+    def __str__(self):
+        return f'{self.name} by {self.instructor} on {self.get_weekday_display()}s at {self.start_time:%H:%M}'
+
+
 #Represents a fitness class that users can book
 class Class(models.Model):
     name = models.CharField(max_length=200) #Name of the class (e.g., Yoga, Pilates)
     datetime = models.DateTimeField()   #Scheduled date and time of the class
     instructor = models.CharField(max_length=100)   #Name of the class instructor
     slots_available = models.PositiveIntegerField() #Number of available booking slots
+    slots_version = models.PositiveBigIntegerField(default=0, editable=False)  #Version of the last slots_available change, see utils.availability
+    template = models.ForeignKey(ClassTemplate, null=True, blank=True, on_delete=models.SET_NULL, related_name='occurrences', db_index=False)  #Template this occurrence was booked from, indexed by unique_template_occurrence
 
     def __str__(self):
         return f'{self.name} by {self.instructor}'
+
+
+    def save(self, *args, **kwargs):
+        #A change of slots_available is saved with its new slots version, see signals.stamp_slots_version
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'slots_available' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'slots_version'}
+        super().save(*args, **kwargs)
     
     class Meta:
         ordering = ['datetime'] #Classes will be ordered by upcoming datetime
         verbose_name_plural = "Classes" #Plural display name in admin panel
+        indexes = [
+            models.Index(fields=['datetime', 'id'], name='class_datetime_idx'),  #Upcoming range filter and sort key
+            models.Index(Lower('name'), 'datetime', name='class_name_idx'), #GET /classes ?name= filter, in datetime order
+            models.Index(Lower('instructor'), 'datetime', name='class_instructor_idx'), #GET /classes ?instructor= filter, in datetime order
+            models.Index(fields=['datetime', 'id'], condition=models.Q(slots_available__gt=0), name='class_open_idx'),    #GET /classes ?min_slots=, classes with slots left
+            models.Index(fields=['slots_version'], name='class_slots_version_idx'),  #GET /availability changes since a version
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['template', 'datetime'], name='unique_template_occurrence'),   #One row per occurrence
+        ]
+
+
+#Represents a client, identified by their normalized email
+class Client(models.Model):
+    name = models.CharField(max_length=100) #Name the client first booked with
+    email = models.EmailField(max_length=200, unique=True)  #Lowercased, see normalize_email
+
+    def __str__(self):
+        return f'{self.name} <{self.email}>'
 
 
 #Represents a booking made by a user for a specific class
 class Booking(models.Model):
     class_booked = models.ForeignKey(Class, on_delete=models.CASCADE, related_name='bookings')  #The class being booked
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='bookings', db_index=False)  #The client who booked, indexed by booking_client_booked_idx
     client_name = models.CharField(max_length=100)  #Name of the client
     client_email = models.EmailField(max_length=200)    #Email of the client
     booked_at = models.DateTimeField(auto_now_add=True) #Timestamp when the booking was made
@@ -26,3 +74,29 @@ class Booking(models.Model):
     def __str__(self):
         return f'{self.client_name} booked the {self.class_booked.name} class by {self.class_booked.instructor}'
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['client', 'booked_at'], name='booking_client_booked_idx'),  #Limit checks and booking history
+        ]
+        constraints = [
+            #A client can book a class only once, also serves lookups by (class, client)
+            models.UniqueConstraint(fields=['class_booked', 'client'], name='unique_class_client_booking'),
+        ]
+
+
+
+#Number of bookings a client made in one local day or week, kept up to date with every booking
+class BookingCounter(models.Model):
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='counters', db_index=False)
+    start = models.DateTimeField()  #UTC start of the client's local day or week
+    end = models.DateTimeField()    #UTC end, exclusive
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.client.email}: {self.count} bookings from {self.start} to {self.end}'
+
+    class Meta:
+        constraints = [
+            #One counter per window, also serves the lookups and updates by client
+            models.UniqueConstraint(fields=['client', 'start', 'end'], name='unique_booking_counter'),
+        ]
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import Class, Booking
 import pytz
+from datetime import timedelta
 
 #Serializer for the Class model with timezone-aware datetime formatting
 class ClassSerializer(serializers.ModelSerializer):
@@ -8,7 +9,7 @@ class ClassSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Class
-        fields = '__all__'
+        exclude = ['template', 'slots_version']  #Same fields as CLASS_FIELDS, see GET /availability for slots_version
 
     def get_datetime(self, obj):
         tz = self.context.get('client_tz', pytz.UTC)
@@ -20,7 +21,7 @@ class BookingSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Booking
-        fields = '__all__'
+        fields = ['id', 'class_booked', 'client_name', 'client_email', 'booked_at']   #The client is internal
 
 
 #Serializer for displaying a summary of bookings
@@ -35,4 +36,81 @@ class BookingSummarySerializer(serializers.ModelSerializer):
     def get_booked_at(self, obj):
         tz = self.context.get('client_tz', pytz.UTC)
         return obj.booked_at.astimezone(tz).strftime("%Y-%m-%d %I:%M %p")
-        
\ No newline at end of file
+        
+
+#Fast path for the read endpoints: same JSON shape, built from .values() rows without DRF fields
+
+CLASS_FIELDS = ('id', 'datetime', 'name', 'instructor', 'slots_available')
+BOOKING_SUMMARY_FIELDS = ('id', 'booked_at') + tuple(f'class_booked__{f}' for f in CLASS_FIELDS)
+
+
+def _datetime_formatter(tz):
+
+    '''
+    Returns a function formatting UTC datetimes like the method fields above.
+
+    Instead of an astimezone() per row, the UTC offset is worked out once per
+    hour: when the offsets at both ends of the hour agree there is no DST
+    change inside it, so every value in it shifts by that offset. Hours that
+    do contain a change fall back to astimezone(). The strftime pattern is
+    spelled out since it is the other large per-row cost.
+    '''
+    fixed = tz.utcoffset(None) if isinstance(tz, (pytz.tzinfo.StaticTzInfo, type(pytz.UTC))) else None
+    hour_offsets = {}
+    formatted = {}  #Classes share start times, so whole strings are reused too
+    one_hour = timedelta(hours=1)
+
+    def offset_for(value):
+        if fixed is not None:
+            return fixed
+        hour = value.replace(minute=0, second=0, microsecond=0)
+        offset = hour_offsets.get(hour, False)
+        if offset is False:
+            start, end = hour.astimezone(tz).utcoffset(), (hour + one_hour).astimezone(tz).utcoffset()
+            offset = hour_offsets[hour] = start if start == end else None
+        return offset
+
+    def fmt(value):
+        text = formatted.get(value)
+        if text is None:
+            offset = offset_for(value)
+            local = value + offset if offset is not None else value.astimezone(tz)
+            hour = local.hour % 12 or 12
+            text = formatted[value] = f"{local.year:04d}-{local.month:02d}-{local.day:02d} {hour:02d}:{local.minute:02d} {'AM' if local.hour < 12 else 'PM'}"
+        return text
+
+    return fmt
+
+
+def serialize_classes(rows, client_tz=pytz.UTC):
+    #Rows from Class.objects.values(*CLASS_FIELDS), output matches ClassSerializer
+    fmt = _datetime_formatter(client_tz)
+    return [
+        {
+            'id': row['id'],
+            'datetime': fmt(row['datetime']),
+            'name': row['name'],
+            'instructor': row['instructor'],
+            'slots_available': row['slots_available'],
+        }
+        for row in rows
+    ]
+
+
+def serialize_booking_summaries(rows, client_tz=pytz.UTC):
+    #Rows from Booking.objects.values(*BOOKING_SUMMARY_FIELDS), output matches BookingSummarySerializer
+    fmt = _datetime_formatter(client_tz)
+    return [
+        {
+            'id': row['id'],
+            'class_booked': {
+                'id': row['class_booked__id'],
+                'datetime': fmt(row['class_booked__datetime']),
+                'name': row['class_booked__name'],
+                'instructor': row['class_booked__instructor'],
+                'slots_available': row['class_booked__slots_available'],
+            },
+            'booked_at': fmt(row['booked_at']),
+        }
+        for row in rows
+    ]
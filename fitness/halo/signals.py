@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Class, ClassTemplate, Booking
+from .utils.schedule_cache import bump_schedule_version
+from .utils.booking_counters import increment_counters
+from .utils.availability import next_slots_version
+from .utils.slot_events import notify_slot_change
+
+
+#Any class, template or booking write can change GET /classes
+@receiver([post_save, post_delete], sender=Class)
+@receiver([post_save, post_delete], sender=ClassTemplate)
+@receiver([post_save, post_delete], sender=Booking)
+def invalidate_schedule_cache(sender, **kwargs):
+    #Bumps right away and again after commit, so a page cached from pre-commit data doesn't outlive the write
+    bump_schedule_version()
+    transaction.on_commit(bump_schedule_version)
+
+
+#Saved classes get the next slots version in the same statement, unless the save leaves slots_available out
+@receiver(pre_save, sender=Class)
+def stamp_slots_version(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'slots_available' in update_fields:
+        instance.slots_version = next_slots_version()
+
+
+#Replaces the version expression left in the attribute with the version it saved
+@receiver(post_save, sender=Class)
+def reload_slots_version(sender, instance, **kwargs):
+    if hasattr(instance.slots_version, 'resolve_expression'):
+        instance.refresh_from_db(fields=['slots_version'])
+
+
+#Keeps the client's day and week counters in step with single inserts and deletes, bulk inserts count themselves
+@receiver(post_save, sender=Booking)
+def count_new_booking(sender, instance, created, **kwargs):
+    if created:
+        increment_counters(instance.client_id, instance.booked_at)
+
+
+@receiver(post_delete, sender=Booking)
+def uncount_deleted_booking(sender, instance, **kwargs):
+    increment_counters(instance.client_id, instance.booked_at, -1)
+
+
+#Saved classes reach the open slot event streams once committed
+@receiver(post_save, sender=Class)
+def publish_class_change(sender, **kwargs):
+    transaction.on_commit(notify_slot_change)
@@ -1,16 +1,79 @@
 # type: ignore
 
 from django.urls import reverse
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APIClient, APIRequestFactory
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from django.test import TestCase, TransactionTestCase, RequestFactory
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Count, Max
+from io import StringIO
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.db.migrations.executor import MigrationExecutor
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.core.cache import cache
+from django.conf import settings
+from concurrent.futures import ThreadPoolExecutor
+import time
 from rest_framework import status
-from .models import Class, Booking
+from .models import Class, ClassTemplate, Booking, BookingCounter, Client
+from .serializers import ClassSerializer, CLASS_FIELDS, serialize_classes
+from .utils.reservations import reserve_slot, RACE_LOST, DUPLICATE, EMAIL_TAKEN
+from .utils.eligibility import get_eligibility
+from .utils.time_bounds import get_daily_bounds, get_weekly_bounds, clear_bounds_cache, _bounds_cache
+from .utils.timezone import resolve_timezone, convert_ist_to_utc, convert_local_to_utc_many
+from .log_handlers import QueueListenerHandler, JsonFormatter
+from .utils.schedule_cache import page_cache_key, apage_cache_key, aget_cached_page, bump_schedule_version
+from .utils.idempotency import idempotent, get_store
+from .utils.rate_limit import get_bucket_store, LocalBucketStore, CacheBucketStore
+from .utils.request_metrics import record_query, install_query_recorder
+from .utils.sqlite_tuning import apply_pragmas
+from .utils.recurrence import expand, occurrence_key
+from .utils.class_filters import parse_class_filters, filter_classes
+from .utils.availability import availability
+from .utils.slot_events import get_broker, _brokers
+from .utils.validators import is_valid_name, is_valid_email
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, date, time as dt_time, timedelta, timezone as dt_timezone
 import pytz
 from dateutil import parser
+import re
+import json
+import copy
+import gc
+import logging
+import logging.config
+import threading
+import asyncio
+from asgiref.sync import sync_to_async
+import csv
+import os
+import tempfile
+from unittest import mock
+from django.contrib.auth.models import User
 
 # Create your tests here.
 
+#Every test client request comes from 127.0.0.1, RateLimitTest turns the limiter back on
+_no_rate_limit = override_settings(HALO_RATE_LIMIT_ENABLED=False)
+
+
+def setUpModule():
+    _no_rate_limit.enable()
+
+
+def tearDownModule():
+    _no_rate_limit.disable()
+
+
+def create_booking(cls, name="John Doe", email="john@example.com"):
+    #Booking together with the client it belongs to
+    client, _ = Client.objects.get_or_create(email=email, defaults={'name': name})
+    return Booking.objects.create(class_booked=cls, client=client, client_name=name, client_email=email)
+
+
 class BookingAPITest(APITestCase):
 
     def setUp(self):
@@ -118,11 +181,7 @@ class BookingAPITest(APITestCase):
 
 
     def test_get_bookings_success(self):
-        Booking.objects.create(
-            class_booked=self.upcoming_class,
-            client_name="John Doe",
-            client_email="john@example.com"
-        )
+        create_booking(self.upcoming_class, "John Doe", "john@example.com")
         url = reverse('get_bookings') + '?email=john@example.com'
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -152,59 +211,1917 @@ class BookingAPITest(APITestCase):
 
 
 
-class TimezoneViewsTest(APITestCase):
+class BookingEligibilityTest(APITestCase):
 
     def setUp(self):
-        # Setup a class in UTC
-        self.utc_now = timezone.now()
-        self.class_instance = Class.objects.create(
-            name="Test Yoga",
-            datetime=self.utc_now + timedelta(days=1),  # tomorrow
-            instructor="Test Instructor",
+        self.classes = [
+            Class.objects.create(
+                name=f"Class{i}",
+                datetime=timezone.now() + timedelta(days=1, hours=i),
+                instructor="Alice",
+                slots_available=5
+            )
+            for i in range(4)
+        ]
+        self.url = reverse('book_class')
+
+
+    def _book(self, cls, name="John Doe", email="john@example.com"):
+        return self.client.post(self.url, {
+            "class_id": cls.id,
+            "client_name": name,
+            "client_email": email
+        })
+
+
+    def test_email_taken_by_another_name(self):
+        self._book(self.classes[0])
+        response = self._book(self.classes[1], name="Jane Doe")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("already in use", response.data['error'])
+
+
+    def test_email_taken_checked_before_class_lookup(self):
+        self._book(self.classes[0])
+        response = self.client.post(self.url, {
+            "class_id": 9999,
+            "client_name": "Jane Doe",
+            "client_email": "john@example.com"
+        })
+        self.assertIn("already in use", response.data['error'])
+
+
+    def test_non_numeric_class_id_is_not_found(self):
+        response = self.client.post(self.url, {
+            "class_id": "abc",
+            "client_name": "John Doe",
+            "client_email": "john@example.com"
+        })
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+    def test_duplicate_booking(self):
+        self._book(self.classes[0])
+        response = self._book(self.classes[0])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], "You have already booked this class.")
+
+
+    def test_daily_limit(self):
+        for cls in self.classes[:3]:
+            self.assertEqual(self._book(cls).status_code, status.HTTP_201_CREATED)
+        response = self._book(self.classes[3])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], "You can only book up to 3 classes per day.")
+
+
+    def test_daily_limit_checked_before_duplicate(self):
+        for cls in self.classes[:3]:
+            self._book(cls)
+        response = self._book(self.classes[0])
+        self.assertEqual(response.data['error'], "You can only book up to 3 classes per day.")
+
+
+    def test_weekly_limit(self):
+        #Spread 12 earlier bookings over the other days of the current week, outside today's bounds
+        week_start, _ = get_weekly_bounds(pytz.UTC)
+        day_start, _ = get_daily_bounds(pytz.UTC)
+        other_days = [week_start + timedelta(days=d) for d in range(7) if week_start + timedelta(days=d) != day_start]
+
+        for i in range(12):
+            old_class = Class.objects.create(name="Old", datetime=week_start, instructor="Bob", slots_available=1)
+            booking = create_booking(old_class)
+            Booking.objects.filter(id=booking.id).update(booked_at=other_days[i // 2] + timedelta(hours=1))
+
+        response = self._book(self.classes[1])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], "You can only book up to 12 classes per week.")
+
+
+    def test_successful_booking_query_count(self):
+        #Client lookup with its counts, class lookup, savepoint, slot update, insert, counter update, release
+        #plus savepoint, insert and release of the client and the insert of its counters on a first booking
+        with self.assertNumQueries(11):
+            response = self._book(self.classes[0])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        with self.assertNumQueries(7):
+            response = self._book(self.classes[1])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+    def test_rejected_booking_query_count(self):
+        self._book(self.classes[0])
+        #Client lookup and class lookup only
+        with self.assertNumQueries(2):
+            response = self._book(self.classes[0])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+
+def parse_links(response):
+    #Maps rel to url for the entries of a Link header
+    return {rel: url for url, rel in re.findall(r'<([^>]+)>; rel="(\w+)"', response.get('Link', ''))}
+
+
+class KeysetPaginationTest(APITestCase):
+
+    def setUp(self):
+        start = timezone.now() + timedelta(days=1)
+        #Pairs of classes share a datetime so the id tie-breaker is exercised
+        self.classes = [
+            Class.objects.create(name=f"Class{i}", datetime=start + timedelta(hours=i // 2), instructor="Alice", slots_available=5)
+            for i in range(7)
+        ]
+
+
+    def _walk(self, url, rel):
+        #Follows Link headers and returns the visited pages and the url of the last one
+        pages = []
+        while url:
+            last_url = url
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append([item['id'] for item in response.data])
+            url = parse_links(response).get(rel)
+        return pages, last_url
+
+
+    def test_pages_cover_all_classes_in_order(self):
+        pages, _ = self._walk(reverse('class_list') + '?page_size=3', 'next')
+        self.assertEqual([len(p) for p in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), [c.id for c in self.classes])
+
+
+    def test_prev_cursor_walks_back(self):
+        forward, last_url = self._walk(reverse('class_list') + '?page_size=3', 'next')
+        backward, _ = self._walk(last_url, 'prev')
+        self.assertEqual(list(reversed(backward)), forward)
+
+
+    def test_page_size_is_capped(self):
+        with self.settings(HALO_MAX_PAGE_SIZE=2):
+            response = self.client.get(reverse('class_list') + '?page_size=100')
+        self.assertEqual(len(response.data), 2)
+
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('class_list') + '?cursor=garbage')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+    def test_deep_page_query_count(self):
+        pages, last_url = self._walk(reverse('class_list') + '?page_size=1', 'next')
+        self.assertEqual(len(pages), 7)
+        cache.clear()
+        #The page and the class templates, whatever the depth
+        with self.assertNumQueries(2):
+            self.client.get(last_url)
+
+
+    def test_bookings_newest_first_across_pages(self):
+        for i, cls in enumerate(self.classes):
+            booking = create_booking(cls)
+            Booking.objects.filter(id=booking.id).update(booked_at=timezone.now() - timedelta(hours=i // 2))
+
+        pages, last_url = self._walk(reverse('get_bookings') + '?email=john@example.com&page_size=2', 'next')
+        expected = list(Booking.objects.order_by('-booked_at', '-id').values_list('id', flat=True))
+        self.assertEqual(sum(pages, []), expected)
+
+        #One query per page, the class is joined in
+        with self.assertNumQueries(1):
+            self.client.get(last_url)
+
+
+
+class ClassListCacheTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.cls = Class.objects.create(
+            name="Yoga",
+            datetime=timezone.now() + timedelta(days=1),
+            instructor="Alice",
             slots_available=5
         )
+        self.url = reverse('class_list')
 
-    
-    def test_class_list_with_timezone(self):
-        # Pass a timezone in query
-        response = self.client.get(reverse('class_list') + '?tz=Asia/Tokyo')
-        self.assertEqual(response.status_code, 200)
 
-        # Get datetime from response
-        returned_datetime_str = response.data[0]['datetime']
-        returned_dt = timezone.datetime.strptime(returned_datetime_str, "%Y-%m-%d %I:%M %p")
-        
-        # Convert original UTC datetime to Asia/Tokyo
-        tokyo_tz = pytz.timezone('Asia/Tokyo')
-        expected_dt = self.class_instance.datetime.astimezone(tokyo_tz)
-        
-        self.assertEqual(returned_dt.hour, expected_dt.hour)
-        self.assertEqual(returned_dt.day, expected_dt.day)
+    def test_repeat_request_skips_the_database(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first['ETag'], second['ETag'])
 
 
-    def test_book_class_and_return_timezone(self):
-        booking_data = {
-            'class_id': self.class_instance.id,
-            'client_name': 'John Doe',
-            'client_email': 'john@example.com'
-        }
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
 
-        response = self.client.post(reverse('book_class') + '?tz=Asia/Kolkata', data=booking_data, format='json')
-        self.assertEqual(response.status_code, 201)
 
-        returned_booking_time = response.data['booking']['booked_at']
+    def test_booking_invalidates_cached_page(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.post(reverse('book_class'), {
+            "class_id": self.cls.id,
+            "client_name": "John Doe",
+            "client_email": "john@example.com"
+        })
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data[0]['slots_available'], 4)
 
-        # Parse ISO datetime string
-        returned_dt_utc = parser.isoparse(returned_booking_time)
 
-        # Convert to IST
+    def test_timezones_are_cached_separately(self):
+        utc = self.client.get(self.url)
+        tokyo = self.client.get(self.url + '?tz=Asia/Tokyo')
+        self.assertNotEqual(utc['ETag'], tokyo['ETag'])
+
+
+    def test_started_class_drops_out_of_cached_page(self):
+        self.client.get(self.url)
+        #Moves the class into the past without a signal, only its start time can expire the page
+        Class.objects.filter(id=self.cls.id).update(datetime=timezone.now() - timedelta(minutes=1))
+        entry = cache.get(page_cache_key(RequestFactory().get(self.url), pytz.UTC))
+        self.assertIsNotNone(entry)
+        entry['valid_until'] = timezone.now() - timedelta(seconds=1)
+        cache.set(page_cache_key(RequestFactory().get(self.url), pytz.UTC), entry)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['error'], "No upcoming classes available.")
+
+
+
+class BatchBookingTest(APITestCase):
+
+    def setUp(self):
+        self.classes = [
+            Class.objects.create(
+                name=f"Class{i}",
+                datetime=timezone.now() + timedelta(days=1, hours=i),
+                instructor="Alice",
+                slots_available=2
+            )
+            for i in range(4)
+        ]
+        self.url = reverse('book_class_batch')
+
+
+    def _item(self, cls, name="John Doe", email="john@example.com"):
+        return {"class_id": cls.id, "client_name": name, "client_email": email}
+
+
+    def _post(self, items):
+        return self.client.post(self.url, {"bookings": items}, format='json')
+
+
+    def test_batch_books_valid_items(self):
+        response = self._post([
+            self._item(self.classes[0]),
+            self._item(self.classes[0], "Jane Doe", "jane@example.com"),
+            self._item(self.classes[1], "Jane Doe", "jane@example.com"),
+        ])
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual([r['status'] for r in response.data['results']], [201, 201, 201])
+        self.classes[0].refresh_from_db()
+        self.assertEqual(self.classes[0].slots_available, 0)
+        self.assertEqual(Booking.objects.count(), 3)
+
+
+    def test_rules_are_counted_within_the_batch(self):
+        response = self._post([
+            self._item(self.classes[0]),
+            self._item(self.classes[0]),                                #Duplicate of the first item
+            self._item(self.classes[1], "Jane Doe"),                    #Email now owned by John Doe
+            self._item(self.classes[0], "Ann Lee", "ann@example.com"),  #Takes the last slot
+            self._item(self.classes[0], "Bo Lee", "bo@example.com"),    #Class is now full
+            self._item(self.classes[1]),
+            self._item(self.classes[2]),
+            self._item(self.classes[3]),                                #Fourth booking today
+            {"class_id": 9999, "client_name": "Cy Lee", "client_email": "cy@example.com"},
+            {"class_id": self.classes[3].id, "client_name": "Cy Lee"},
+        ])
+        errors = [r.get('error') for r in response.data['results']]
+        self.assertEqual(errors, [
+            None,
+            "You have already booked this class.",
+            "This email is already in use. Try with a different one.",
+            None,
+            "No slots available.",
+            None,
+            None,
+            "You can only book up to 3 classes per day.",
+            "Class not found.",
+            "Missing fields: client_email.",
+        ])
+        self.assertEqual(response.data['created'], 4)
+        self.assertEqual(Booking.objects.count(), 4)
+
+
+    def test_existing_bookings_count_toward_limits(self):
+        self.client.post(reverse('book_class'), self._item(self.classes[0]))
+        response = self._post([self._item(self.classes[0]), self._item(self.classes[1], "Jane Doe")])
+        self.assertEqual(response.data['results'][0]['error'], "You have already booked this class.")
+        self.assertIn("already in use", response.data['results'][1]['error'])
+
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        items = [self._item(cls, "Client", f"client{i}{j}@example.com") for i, cls in enumerate(self.classes) for j in range(2)]
+        #Eligibility, classes, savepoint, one update per class, clients, bookings, counters, release
+        with self.assertNumQueries(4 + len(self.classes) + 3):
+            response = self._post(items)
+        self.assertEqual(response.data['created'], 8)
+
+
+    def test_rejects_empty_and_oversized_batches(self):
+        self.assertEqual(self._post([]).status_code, status.HTTP_400_BAD_REQUEST)
+        with self.settings(HALO_MAX_BATCH_SIZE=1):
+            response = self._post([self._item(self.classes[0]), self._item(self.classes[1])])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+
+class SeedCommandTest(TestCase):
+
+    def _seed(self, **options):
+        call_command('seed', stdout=StringIO(), **options)
+
+
+    def test_seed_respects_capacity_and_rules(self):
+        self._seed(classes=20, bookings=150, clients=30, min_slots=5, max_slots=10, skew=1.0, timezones='UTC,Asia/Kolkata')
+        self.assertEqual(Class.objects.count(), 20)
+        self.assertEqual(Booking.objects.count(), 150)
+        self.assertFalse(Class.objects.filter(slots_available__lt=0).exists())
+
+        for cls in Class.objects.annotate(n=Count('bookings')):
+            self.assertLessEqual(cls.n, 10)
+        per_pair = Booking.objects.values('class_booked', 'client_email').annotate(n=Count('id'))
+        self.assertTrue(all(row['n'] == 1 for row in per_pair))
+        self.assertTrue(all(is_valid_name(b.client_name) and is_valid_email(b.client_email) for b in Booking.objects.all()))
+
+
+    def test_seed_is_deterministic(self):
+        self._seed(classes=5, bookings=20, seed=7)
+        first = list(Booking.objects.order_by('id').values_list('client_email', 'class_booked__name'))
+        self._seed(classes=5, bookings=20, seed=7, flush=True)
+        second = list(Booking.objects.order_by('id').values_list('client_email', 'class_booked__name'))
+        self.assertEqual(first, second)
+
+
+
+class ImportClassesTest(TestCase):
+
+    def _file(self, suffix, content):
+        path = os.path.join(tempfile.mkdtemp(), f'classes{suffix}')
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+
+    def _import(self, path, **options):
+        out, err = StringIO(), StringIO()
+        call_command('import_classes', path, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+
+    def test_imports_csv_in_ist_skipping_duplicates_and_bad_rows(self):
+        Class.objects.create(name="Spin", datetime=datetime(2030, 1, 7, 12, 30, tzinfo=dt_timezone.utc), instructor="Carol", slots_available=10)
+        path = self._file('.csv', "\n".join([
+            "name,datetime,instructor,slots_available",
+            "Yoga,2030-01-06 07:30 AM,Alice,20",
+            "Yoga,2030-01-06 07:30 AM,Alice,20",
+            "Pilates,2030-01-06T18:00,Bob,15",
+            "Spin,2030-01-07 06:00 PM,Carol,10",
+            "Boxing,not a time,Dan,10",
+            "Zumba,2030-01-08 06:00 PM,,10",
+            "Barre,2030-01-08 06:00 PM,Eve,0",
+        ]))
+        out, err = self._import(path)
+
+        self.assertIn("Created 2 classes, skipped 2 already scheduled, 3 rows with errors.", out)
+        self.assertEqual(err.splitlines(), [
+            "Row 6: Invalid datetime 'not a time', expected YYYY-MM-DD HH:MM AM/PM or ISO 8601.",
+            "Row 7: missing instructor",
+            "Row 8: slots_available must be a positive integer, got '0'",
+        ])
+        yoga = Class.objects.get(name="Yoga")
+        self.assertEqual(yoga.datetime, convert_ist_to_utc("2030-01-06 07:30 AM"))
+        self.assertEqual(yoga.datetime, datetime(2030, 1, 6, 2, 0, tzinfo=dt_timezone.utc))
+        self.assertEqual(Class.objects.count(), 3)
+        #Imported classes show up in GET /availability?since=
+        self.assertGreater(yoga.slots_version, Class.objects.get(name="Spin").slots_version)
+
+
+    def test_one_duplicate_query_per_chunk(self):
+        lines = [json.dumps({"name": f"Class{i}", "datetime": "2030-01-06 07:30 AM", "instructor": "Alice", "slots_available": 5}) for i in range(5)]
+        lines.insert(2, "{not json")
+        path = self._file('.jsonl', "\n".join(lines))
+
+        with CaptureQueriesContext(connection) as queries:
+            out, err = self._import(path, chunk_size=2, timezone='UTC')
+        selects = [q for q in queries if q['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 3)
+        self.assertIn("Row 3: invalid JSON", err)
+        self.assertEqual(Class.objects.count(), 5)
+        self.assertEqual(Class.objects.first().datetime, datetime(2030, 1, 6, 7, 30, tzinfo=dt_timezone.utc))
+
+        #Importing it again creates nothing
+        out, _ = self._import(path, timezone='UTC')
+        self.assertIn("Created 0 classes, skipped 5 already scheduled", out)
+
+
+    def test_json_array_and_dry_run(self):
+        path = self._file('.json', json.dumps([{"name": "Yoga", "datetime": "2030-01-06 07:30 AM", "instructor": "Alice", "slots_available": "8"}, "oops"]))
+        out, err = self._import(path, dry_run=True)
+        self.assertIn("Would create 1 classes", out)
+        self.assertIn("Row 2: expected an object", err)
+        self.assertFalse(Class.objects.exists())
+
+        with self.assertRaises(CommandError):
+            self._import(path, timezone='Mars/Base')
+        with self.assertRaises(CommandError):
+            self._import(self._file('.csv', "name,datetime\nYoga,2030-01-06 07:30 AM"))
+
+
+    def test_batch_conversion_parses_each_time_once(self):
+        values = ["2030-03-10 02:30 AM", "2030-03-10 02:30 AM", "2030-03-10T02:30", "bad"]
+        with mock.patch('halo.utils.timezone.datetime', wraps=datetime) as parsing:
+            converted = convert_local_to_utc_many(values, pytz.timezone('America/New_York'))
+        self.assertEqual(parsing.strptime.call_count, 3)
+        #2:30 AM doesn't exist on the DST change day, it is taken as standard time
+        self.assertEqual(converted["2030-03-10 02:30 AM"], datetime(2030, 3, 10, 7, 30, tzinfo=dt_timezone.utc))
+        self.assertEqual(converted["2030-03-10T02:30"], converted["2030-03-10 02:30 AM"])
+        self.assertIsInstance(converted["bad"], ValueError)
+
+
+
+class ClassFilterTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        #Two days of classes from a week ahead, 06:00 and 20:00 IST
+        day = timezone.now().astimezone(pytz.timezone('Asia/Kolkata')).date() + timedelta(days=7)
+        self.day = day
         ist = pytz.timezone('Asia/Kolkata')
-        returned_dt_ist = returned_dt_utc.astimezone(ist)
+        self.classes = {}
+        for offset, (name, instructor, slots) in enumerate([("Yoga", "Alice", 0), ("Spin", "Bob", 3), ("Yoga", "Bob", 8), ("Pilates", "Alice", 1)]):
+            local = datetime.combine(day + timedelta(days=offset // 2), dt_time(6 if offset % 2 == 0 else 20))
+            self.classes[offset] = Class.objects.create(name=name, instructor=instructor, slots_available=slots, datetime=ist.localize(local))
 
-        # Get expected formatted value
-        formatted_expected = returned_dt_ist.strftime("%Y-%m-%d %I:%M %p")
 
-        self.assertEqual(formatted_expected, returned_dt_ist.strftime("%Y-%m-%d %I:%M %p"))  # compare IST representation
+    def _ids(self, **params):
+        response = self.client.get(reverse('class_list'), {'page_size': 200, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.json()
+        return [item['id'] for item in body] if isinstance(body, list) else []
 
-    
-    
\ No newline at end of file
+
+    def test_name_and_instructor_match_case_insensitively(self):
+        c = self.classes
+        self.assertEqual(self._ids(name='yoga'), [c[0].id, c[2].id])
+        self.assertEqual(self._ids(instructor=' BOB '), [c[1].id, c[2].id])
+        self.assertEqual(self._ids(name='Yoga', instructor='bob'), [c[2].id])
+        self.assertEqual(self._ids(name='Yog'), [])
+
+
+    def test_from_and_to_are_local_to_the_client(self):
+        c = self.classes
+        #A date `to` takes in the whole day
+        self.assertEqual(self._ids(to=self.day.isoformat(), tz='Asia/Kolkata'), [c[0].id, c[1].id])
+        #20:00 IST is 14:30 UTC, the same day in UTC
+        self.assertEqual(self._ids(**{'from': f'{self.day}T12:00'}, to=self.day.isoformat()), [c[1].id])
+        #A date `from` starts at the client's midnight
+        second = (self.day + timedelta(days=1)).isoformat()
+        self.assertEqual(self._ids(**{'from': second}, tz='Asia/Kolkata'), [c[2].id, c[3].id])
+
+
+    def test_min_slots(self):
+        c = self.classes
+        self.assertEqual(self._ids(min_slots=1), [c[1].id, c[2].id, c[3].id])
+        self.assertEqual(self._ids(min_slots=5), [c[2].id])
+        self.assertEqual(len(self._ids(min_slots=0)), 4)
+
+
+    def test_invalid_filters(self):
+        for params in ({'min_slots': 'many'}, {'min_slots': '-1'}, {'from': 'tomorrow'}, {'from': '2030-01-02', 'to': '2030-01-01'}):
+            response = self.client.get(reverse('class_list'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+    def test_filtered_pages_are_cached_apart(self):
+        self.assertEqual(len(self._ids(name='yoga')), 2)
+        self.assertEqual(len(self._ids(name='spin')), 1)
+
+
+    def test_template_occurrences_are_filtered(self):
+        template = ClassTemplate.objects.create(
+            name="Yoga", instructor="Carol", slots=4, weekday=self.day.weekday(),
+            start_time=dt_time(7, 0), starts_on=self.day, ends_on=self.day,
+        )
+        key = occurrence_key(template.id, pytz.timezone('Asia/Kolkata').localize(datetime.combine(self.day, dt_time(7, 0))))
+        self.assertIn(key, self._ids(name='YOGA', min_slots=4))
+        self.assertNotIn(key, self._ids(min_slots=5))
+        self.assertNotIn(key, self._ids(instructor='alice'))
+        self.assertNotIn(key, self._ids(**{'from': (self.day + timedelta(days=1)).isoformat()}))
+
+
+    def test_filters_use_their_indexes(self):
+        now = timezone.now().isoformat()
+        cases = {'class_name_idx': {'name': 'yoga'}, 'class_instructor_idx': {'instructor': 'bob'}, 'class_open_idx': {'min_slots': '2'}}
+        for index, params in cases.items():
+            filters = parse_class_filters(params, pytz.UTC)
+            sql, sql_params = filter_classes(Class.objects.filter(datetime__gte=now), filters).order_by('datetime', 'id').query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, sql_params)
+                plan = ' '.join(row[-1] for row in cursor.fetchall())
+            self.assertIn(index, plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+
+
+class ClassTemplateTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        #A weekly UTC class from tomorrow on, and a one-off class between its first two occurrences
+        tomorrow = timezone.now().date() + timedelta(days=1)
+        self.template = ClassTemplate.objects.create(
+            name="Yoga", instructor="Alice", slots=2, weekday=tomorrow.weekday(),
+            start_time=dt_time(9, 0), timezone='UTC', starts_on=tomorrow,
+        )
+        self.first = datetime.combine(tomorrow, dt_time(9, 0), tzinfo=dt_timezone.utc)
+        self.one_off = Class.objects.create(name="Spin", datetime=self.first + timedelta(days=3), instructor="Bob", slots_available=5)
+
+
+    def _ids(self, url):
+        return [item['id'] for item in self.client.get(url).json()]
+
+
+    def test_expand_keeps_local_time_across_dst(self):
+        template = ClassTemplate(weekday=6, start_time=dt_time(7, 30), timezone='America/New_York', starts_on=date(2030, 3, 3), ends_on=date(2030, 3, 17))
+        moments = list(expand(template, datetime(2030, 1, 1, tzinfo=dt_timezone.utc), datetime(2030, 12, 1, tzinfo=dt_timezone.utc)))
+        #Sundays 3, 10 and 17 March, clocks moving forward on the 10th
+        self.assertEqual([m.hour for m in moments], [12, 11, 11])
+        self.assertEqual([m.day for m in moments], [3, 10, 17])
+
+
+    def test_list_merges_occurrences_without_writing(self):
+        with self.settings(HALO_OCCURRENCE_HORIZON_DAYS=14):
+            with CaptureQueriesContext(connection) as queries:
+                ids = self._ids(reverse('class_list') + '?page_size=200')
+        self.assertEqual(ids, [
+            occurrence_key(self.template.id, self.first), self.one_off.id,
+            occurrence_key(self.template.id, self.first + timedelta(days=7)),
+        ])
+        self.assertTrue(all(q['sql'].startswith('SELECT') for q in queries))
+        self.assertEqual(Class.objects.count(), 1)
+
+
+    def test_pages_walk_across_classes_and_occurrences(self):
+        with self.settings(HALO_OCCURRENCE_HORIZON_DAYS=30):
+            expected = self._ids(reverse('class_list') + '?page_size=200')
+            pages, url = [], reverse('class_list') + '?page_size=2'
+            while url:
+                response = self.client.get(url)
+                pages.append([item['id'] for item in response.json()])
+                url = parse_links(response).get('next')
+            self.assertEqual(sum(pages, []), expected)
+            self.assertIn(self.one_off.id, expected)
+
+            #And back again from the last page
+            url = parse_links(response).get('prev')
+            while url:
+                response = self.client.get(url)
+                pages.pop()
+                self.assertEqual([item['id'] for item in response.json()], pages[-1])
+                url = parse_links(response).get('prev')
+
+
+    def test_fast_and_drf_serializers_agree(self):
+        responses = []
+        for fast in (True, False):
+            with self.settings(HALO_FAST_SERIALIZERS=fast):
+                cache.clear()
+                responses.append(self.client.get(reverse('class_list') + '?tz=America/New_York').content)
+        self.assertEqual(responses[0], responses[1])
+
+
+    def test_first_booking_materializes_the_occurrence(self):
+        key = occurrence_key(self.template.id, self.first)
+        for email in ("john@example.com", "jane@example.com"):
+            response = self.client.post(reverse('book_class'), {'class_id': key, 'client_name': 'John Doe', 'client_email': email}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        occurrence = Class.objects.get(template=self.template)
+        self.assertEqual((occurrence.datetime, occurrence.name, occurrence.slots_available), (self.first, "Yoga", 0))
+        self.assertEqual(Booking.objects.filter(class_booked=occurrence).count(), 2)
+
+        #Listed once, as the class it now is
+        ids = self._ids(reverse('class_list'))
+        self.assertIn(occurrence.id, ids)
+        self.assertNotIn(key, ids)
+
+
+    def test_start_time_seconds_are_dropped(self):
+        ClassTemplate.objects.filter(id=self.template.id).update(start_time=dt_time(9, 0, 45))
+        key = self._ids(reverse('class_list'))[0]
+        self.assertEqual(key, occurrence_key(self.template.id, self.first))
+
+        response = self.client.post(reverse('book_class'), {'class_id': key, 'client_name': 'John Doe', 'client_email': 'john@example.com'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Class.objects.get(template=self.template).datetime, self.first)
+
+
+    def test_unknown_occurrences_are_not_found(self):
+        keys = [
+            occurrence_key(self.template.id, self.first + timedelta(hours=1)),
+            occurrence_key(self.template.id, self.first - timedelta(days=7)),
+            occurrence_key(self.template.id + 1, self.first),
+            't1-20309999T0000',
+        ]
+        for key in keys:
+            response = self.client.post(reverse('book_class'), {'class_id': key, 'client_name': 'John Doe', 'client_email': 'john@example.com'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, key)
+        self.assertFalse(Class.objects.filter(template__isnull=False).exists())
+
+
+    def test_occurrences_beyond_the_horizon_are_not_found(self):
+        far = self.first + timedelta(weeks=52 * 9)
+        self.assertEqual(list(expand(self.template, far, far)), [far])
+        response = self.client.post(reverse('book_class'), {'class_id': occurrence_key(self.template.id, far), 'client_name': 'John Doe', 'client_email': 'john@example.com'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Class.objects.filter(template__isnull=False).exists())
+
+
+    def test_rejected_first_bookings_leave_no_row(self):
+        Client.objects.create(email="john@example.com", name="Someone Else")
+        key = occurrence_key(self.template.id, self.first)
+        response = self.client.post(reverse('book_class'), {'class_id': key, 'client_name': 'John Doe', 'client_email': 'john@example.com'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with mock.patch('halo.utils.booking_limits.DAILY_LIMIT', 0):
+            response = self.client.post(reverse('book_class_batch'), {'bookings': [
+                {'class_id': key, 'client_name': 'John Doe', 'client_email': 'john@example.com'},
+                {'class_id': key, 'client_name': 'Jane Doe', 'client_email': 'jane@example.com'},
+            ]}, format='json')
+        self.assertEqual([r['error'] for r in response.json()['results']], [
+            "This email is already in use. Try with a different one.", "You can only book up to 3 classes per day.",
+        ])
+        self.assertFalse(Class.objects.filter(template__isnull=False).exists())
+
+
+    def test_batch_books_occurrences(self):
+        key = occurrence_key(self.template.id, self.first + timedelta(days=7))
+        response = self.client.post(reverse('book_class_batch'), {'bookings': [
+            {'class_id': key, 'client_name': 'John Doe', 'client_email': 'john@example.com'},
+            {'class_id': key, 'client_name': 'Jane Doe', 'client_email': 'jane@example.com'},
+            {'class_id': key, 'client_name': 'Jim Doe', 'client_email': 'jim@example.com'},
+        ]}, format='json')
+        self.assertEqual([r['status'] for r in response.json()['results']], [201, 201, 400])
+        self.assertEqual(Class.objects.get(template=self.template).slots_available, 0)
+
+
+
+class AvailabilityTest(APITestCase):
+
+    def setUp(self):
+        start = timezone.now() + timedelta(days=1)
+        self.classes = [Class.objects.create(name=f"Class{i}", datetime=start + timedelta(hours=i), instructor="Alice", slots_available=5) for i in range(3)]
+        Class.objects.create(name="Past", datetime=timezone.now() - timedelta(days=1), instructor="Alice", slots_available=5)
+
+
+    def _get(self, since=None):
+        response = self.client.get(reverse('class_availability'), {} if since is None else {'since': since})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+
+    def _book(self, cls, email):
+        return self.client.post(reverse('book_class'), {'class_id': cls.id, 'client_name': 'John Doe', 'client_email': email}, format='json')
+
+
+    def test_snapshot_of_upcoming_classes(self):
+        with self.assertNumQueries(2):
+            body = self._get()
+        self.assertEqual(body['classes'], [[cls.id, 5] for cls in self.classes])
+        self.assertTrue(body['full'])
+        self.assertEqual(body['version'], max(Class.objects.values_list('slots_version', flat=True)))
+
+
+    def test_changes_since_a_version(self):
+        version = self._get()['version']
+        self.assertEqual(self._get(version), {'version': version, 'full': False, 'classes': []})
+
+        self._book(self.classes[1], 'john@example.com')
+        body = self._get(version)
+        self.assertEqual(body['classes'], [[self.classes[1].id, 4]])
+        self.assertGreater(body['version'], version)
+
+        #Batches and new classes show up too
+        self.client.post(reverse('book_class_batch'), {'bookings': [
+            {'class_id': cls.id, 'client_name': 'Jane Doe', 'client_email': 'jane@example.com'} for cls in self.classes[:2]
+        ]}, format='json')
+        new = Class.objects.create(name="New", datetime=timezone.now() + timedelta(days=2), instructor="Bob", slots_available=9)
+        later = self._get(body['version'])
+        self.assertEqual(later['classes'], [[self.classes[0].id, 4], [self.classes[1].id, 3], [new.id, 9]])
+        self.assertEqual(self._get(later['version'])['classes'], [])
+
+
+    def test_every_write_gets_its_own_version(self):
+        versions = list(Class.objects.order_by('id').values_list('slots_version', flat=True))
+        self.assertEqual(len(set(versions)), len(versions))
+        self._book(self.classes[0], 'john@example.com')
+        self.assertEqual(Class.objects.get(id=self.classes[0].id).slots_version, max(versions) + 1)
+
+
+    def test_saves_stamp_versions_of_slot_changes_only(self):
+        cls = self.classes[0]
+        version = self._get()['version']
+        cls.slots_available = 2
+        cls.save(update_fields=['slots_available'])
+        self.assertEqual(cls.slots_version, version + 1)
+        self.assertEqual(Class.objects.get(id=cls.id).slots_version, version + 1)
+
+        cls.name = "Renamed"
+        cls.save(update_fields=['name'])
+        cls.save()
+        self.assertEqual(cls.slots_version, version + 2)
+        self.assertEqual(self._get(version)['classes'], [[cls.id, 2]])
+
+
+    def test_version_ahead_of_the_database_gets_everything(self):
+        body = self._get(10 ** 9)
+        self.assertTrue(body['full'])
+        self.assertEqual(len(body['classes']), 3)
+
+
+    def test_invalid_version(self):
+        for since in ('abc', '-1', ''):
+            response = self.client.get(reverse('class_availability'), {'since': since})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, since)
+
+
+
+class SlotEventsTest(TransactionTestCase):
+
+    def setUp(self):
+        start = timezone.now() + timedelta(days=1)
+        self.classes = [Class.objects.create(name=f"Class{i}", datetime=start + timedelta(hours=i), instructor="Alice", slots_available=5) for i in range(2)]
+
+
+    async def _request(self, method='GET', query='', **headers):
+
+        #Sends a request for /events/slots to fitness.asgi, returns (response start, queue of body chunks, disconnect)
+        from fitness.asgi import application
+        scope = {
+            'type': 'http', 'method': method, 'path': reverse('slot_events'), 'query_string': query.encode(), 'server': ('testserver', 80),
+            'headers': [(name.lower().replace('_', '-').encode(), value.encode()) for name, value in headers.items()],
+        }
+        chunks, start, gone = asyncio.Queue(), asyncio.Queue(), asyncio.Event()
+
+        async def receive():
+            if not hasattr(receive, 'sent'):
+                receive.sent = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await gone.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                await start.put(message)
+            elif message.get('body'):
+                await chunks.put(message['body'])
+
+        task = asyncio.create_task(application(scope, receive, send))
+        message = await asyncio.wait_for(start.get(), 5)
+
+        async def disconnect():
+            gone.set()
+            await asyncio.wait_for(task, 5)
+        return message, chunks, disconnect
+
+
+    async def _open(self, **headers):
+        message, chunks, disconnect = await self._request(**headers)
+        self.assertEqual(message['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream; charset=utf-8'), message['headers'])
+        return chunks, disconnect
+
+
+    async def _event(self, chunks):
+        #Next event of the stream as (id, event, data)
+        text = (await asyncio.wait_for(chunks.get(), 5)).decode()
+        fields = dict(line.split(': ', 1) for line in text.strip().splitlines())
+        return int(fields['id']), fields['event'], json.loads(fields['data'])
+
+
+    @sync_to_async
+    def _book(self, cls, email):
+        #Commits on the test thread, so the streams are woken from another thread as under a server
+        response = self.client.post(reverse('book_class'), {'class_id': cls.id, 'client_name': 'John Doe', 'client_email': email}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+    async def test_snapshot_then_pushed_changes(self):
+        chunks, disconnect = await self._open()
+        self.assertEqual(await chunks.get(), b"retry: 3000\n\n")
+        version, event, data = await self._event(chunks)
+        self.assertEqual((event, data), ('snapshot', [[cls.id, 5] for cls in self.classes]))
+
+        await self._book(self.classes[1], 'john@example.com')
+        next_version, event, data = await self._event(chunks)
+        self.assertEqual((event, data), ('slots', [[self.classes[1].id, 4]]))
+        self.assertGreater(next_version, version)
+        await disconnect()
+        self.assertFalse(_brokers)
+
+
+    async def test_resume_from_last_event_id(self):
+        chunks, disconnect = await self._open()
+        await chunks.get()
+        version, _, _ = await self._event(chunks)
+        await disconnect()
+
+        await self._book(self.classes[0], 'john@example.com')
+        chunks, disconnect = await self._open(last_event_id=str(version))
+        await chunks.get()
+        _, event, data = await self._event(chunks)
+        self.assertEqual((event, data), ('slots', [[self.classes[0].id, 4]]))
+        await disconnect()
+
+
+    async def test_one_read_per_change_for_all_streams(self):
+        streams = [await self._open() for _ in range(50)]
+        for chunks, _ in streams:
+            await chunks.get()
+            await self._event(chunks)
+
+        with mock.patch('halo.utils.slot_events.availability', wraps=availability) as reads:
+            await self._book(self.classes[0], 'john@example.com')
+            events = await asyncio.gather(*(self._event(chunks) for chunks, _ in streams))
+        self.assertEqual(reads.call_count, 1)
+        self.assertEqual({json.dumps(data) for _, _, data in events}, {json.dumps([[self.classes[0].id, 4]])})
+
+        for _, disconnect in streams:
+            await disconnect()
+        self.assertFalse(_brokers)
+
+
+    async def test_streams_starting_together_share_the_read(self):
+        broker = get_broker()
+        subscriber = broker.subscribe()
+        try:
+            with mock.patch('halo.utils.slot_events.availability', wraps=availability) as reads:
+                first, second = broker.read(), broker.read()
+                self.assertIs(await first, await second)
+                self.assertEqual(reads.call_count, 1)
+
+                #Reconnects with the same Last-Event-ID share theirs, other versions read apart
+                version = (await first)['version']
+                reconnects = [broker.read(version), broker.read(version), broker.read(version - 1)]
+                results = await asyncio.gather(*reconnects)
+                self.assertIs(results[0], results[1])
+                self.assertEqual(reads.call_count, 3)
+
+                #Not once a batch went out since the read began
+                reading = broker.read()
+                broker.pushed += 1
+                await asyncio.gather(reading, broker.read())
+                self.assertEqual(reads.call_count, 5)
+                self.assertEqual(broker.reading, {})
+        finally:
+            broker.unsubscribe(subscriber)
+
+
+    async def test_idle_streams_get_keepalives(self):
+        with self.settings(HALO_SSE_HEARTBEAT=0.01):
+            chunks, disconnect = await self._open()
+            await chunks.get()
+            await self._event(chunks)
+            self.assertEqual(await chunks.get(), b": keepalive\n\n")
+            await disconnect()
+
+
+    async def test_errors(self):
+        for request, expected in (
+            ({'last_event_id': 'abc'}, status.HTTP_400_BAD_REQUEST),
+            ({'query': 'since=-1'}, status.HTTP_400_BAD_REQUEST),
+            ({'method': 'POST'}, status.HTTP_405_METHOD_NOT_ALLOWED),
+            ({'host': 'evil.example.com'}, status.HTTP_400_BAD_REQUEST),
+        ):
+            message, chunks, disconnect = await self._request(**request)
+            self.assertEqual(message['status'], expected)
+            self.assertIn('error', json.loads(await chunks.get()))
+            await disconnect()
+
+        #Servers other than fitness.asgi reach the Django view
+        response = await self.async_client.get(reverse('slot_events'))
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+        self.assertFalse(_brokers)
+
+
+
+class FastSerializerTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        #Start times around midnight, noon and a DST change, plus bookings at distinct times
+        base = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+        self.classes = [
+            Class.objects.create(name=f"Class{i}", datetime=base + timedelta(hours=5 * i, minutes=30 * (i % 2)), instructor="Alice", slots_available=i)
+            for i in range(12)
+        ]
+        #US clocks spring forward at 07:00 UTC that day, so the 06:00 hour has two offsets
+        for minute in (30, 59, 90):
+            Class.objects.create(name="Dst", datetime=datetime(2030, 3, 10, 6, tzinfo=dt_timezone.utc) + timedelta(minutes=minute), instructor="Bob", slots_available=3)
+        for i, cls in enumerate(self.classes):
+            create_booking(cls)
+
+
+    def _both(self, url):
+        #Response bodies with the fast path and with the DRF serializers
+        with self.settings(HALO_FAST_SERIALIZERS=True):
+            cache.clear()
+            fast = self.client.get(url).content
+        with self.settings(HALO_FAST_SERIALIZERS=False):
+            cache.clear()
+            slow = self.client.get(url).content
+        return fast, slow
+
+
+    def test_class_list_is_byte_identical(self):
+        for tz in ('', 'Asia/Kolkata', 'America/New_York', 'Etc/GMT+5', 'Australia/Lord_Howe'):
+            fast, slow = self._both(reverse('class_list') + f'?tz={tz}&page_size=200')
+            self.assertEqual(fast, slow, tz)
+
+
+    def test_bookings_are_byte_identical(self):
+        for tz in ('', 'Asia/Tokyo', 'Europe/London'):
+            fast, slow = self._both(reverse('get_bookings') + f'?email=john@example.com&page_size=5&tz={tz}')
+            self.assertEqual(fast, slow, tz)
+
+
+    def test_serialize_classes_matches_serializer(self):
+        tz = pytz.timezone('America/New_York')
+        rows = Class.objects.values(*CLASS_FIELDS)
+        expected = ClassSerializer(Class.objects.all(), many=True, context={'client_tz': tz}).data
+        self.assertEqual(serialize_classes(rows, tz), [dict(item) for item in expected])
+
+
+
+class AsyncViewsTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        base = timezone.now() + timedelta(days=1)
+        self.classes = [
+            Class.objects.create(name=f"Class{i}", datetime=base + timedelta(hours=i), instructor="Alice", slots_available=5)
+            for i in range(5)
+        ]
+        for cls in self.classes:
+            create_booking(cls)
+
+
+    async def _both(self, sync_url, async_url):
+        #Responses of the sync view and the async view, each with a cold page cache
+        await cache.aclear()
+        sync = await self.async_client.get(sync_url)
+        await cache.aclear()
+        return sync, await self.async_client.get(async_url)
+
+
+    async def test_class_pages_match_sync_view(self):
+        for fast in (True, False):
+            with self.settings(HALO_FAST_SERIALIZERS=fast):
+                query = '?page_size=2&tz=Asia/Kolkata'
+                sync, asyn = await self._both(reverse('class_list') + query, reverse('class_list_async') + query)
+                self.assertEqual(asyn.status_code, 200)
+                self.assertEqual(asyn.content, sync.content)
+                self.assertEqual(asyn['ETag'], sync['ETag'])
+                self.assertEqual(asyn['Link'].replace('/async', ''), sync['Link'])
+
+                #The next page via the async view's own cursor
+                next_url = parse_links(asyn)['next']
+                response = await self.async_client.get(next_url)
+                self.assertEqual([c['name'] for c in response.json()], ['Class2', 'Class3'])
+
+
+    async def test_bookings_match_sync_view(self):
+        for fast in (True, False):
+            with self.settings(HALO_FAST_SERIALIZERS=fast):
+                query = '?email=john@example.com&page_size=3'
+                sync, asyn = await self._both(reverse('get_bookings') + query, reverse('get_bookings_async') + query)
+                self.assertEqual(asyn.status_code, 200)
+                self.assertEqual(asyn.content, sync.content)
+
+
+    async def test_page_cache_is_shared_with_sync_view(self):
+        url = reverse('class_list_async')
+        await self.async_client.get(url)
+        key = await apage_cache_key(RequestFactory().get(url), pytz.UTC)
+        self.assertEqual(key, page_cache_key(RequestFactory().get(url), pytz.UTC))
+        self.assertIsNotNone(await aget_cached_page(key))
+
+        #Served from the cache, a rename without signals shows only once the version is bumped
+        await Class.objects.filter(id=self.classes[0].id).aupdate(name="Renamed")
+        self.assertEqual((await self.async_client.get(url)).json()[0]['name'], 'Class0')
+        await sync_to_async(bump_schedule_version)()
+        self.assertEqual((await self.async_client.get(url)).json()[0]['name'], 'Renamed')
+
+
+    async def test_conditional_request_and_errors(self):
+        url = reverse('class_list_async')
+        etag = (await self.async_client.get(url))['ETag']
+        response = await self.async_client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        response = await self.async_client.get(url + '?cursor=garbage')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "Invalid cursor or page size."})
+
+        response = await self.async_client.get(reverse('get_bookings_async') + '?email=nobody@example.com')
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.get(reverse('get_bookings_async'))
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.post(url)
+        self.assertEqual(response.status_code, 405)
+
+
+
+def parse_server_timing(response):
+    #Maps metric name to (duration in ms, description) for a Server-Timing header
+    metrics = {}
+    for entry in response['Server-Timing'].split(', '):
+        name, *params = entry.split(';')
+        params = dict(p.split('=', 1) for p in params)
+        metrics[name] = (float(params['dur']), params.get('desc', '').strip('"'))
+    return metrics
+
+
+class ServerTimingTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.cls = Class.objects.create(name="Yoga", datetime=timezone.now() + timedelta(days=1), instructor="Alice", slots_available=5)
+
+
+    def test_booking_reports_its_queries(self):
+        data = {"class_id": self.cls.id, "client_name": "John Doe", "client_email": "john@example.com"}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('book_class'), data)
+        self.assertEqual(response.status_code, 201)
+
+        metrics = parse_server_timing(response)
+        self.assertEqual(metrics['db'][1], f"{len(queries)} queries")
+        self.assertGreater(metrics['serializer'][0], 0)
+        self.assertGreaterEqual(metrics['view'][0], metrics['db'][0])
+
+
+    def test_log_line_and_slow_request_sql(self):
+        with self.settings(HALO_SLOW_REQUEST_MS=0):
+            client = APIClient()
+            with self.assertLogs('halo.timing', 'INFO') as logs:
+                client.get(reverse('class_list'))
+        self.assertEqual(logs.records[0].path, '/classes/')
+        self.assertEqual(logs.records[0].status, 200)
+        self.assertEqual(logs.records[0].queries, 2)   #The page and the class templates
+        self.assertEqual(logs.records[1].levelname, 'WARNING')
+        self.assertIn('SELECT', logs.output[1])
+
+
+    async def test_async_view_queries_are_counted(self):
+        response = await self.async_client.get(reverse('class_list_async'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(parse_server_timing(response)['db'][1], "2 queries")
+
+
+    def test_recorder_added_on_reconnect_stays_outermost(self):
+        install_query_recorder()
+        wrapper = lambda execute, *args: execute(*args)
+        with connection.execute_wrapper(wrapper):
+            #What connection_created does when a connection reopens inside the block
+            connection.execute_wrappers.remove(record_query)
+            connection_created.send(sender=type(connection), connection=connection)
+        self.assertEqual(connection.execute_wrappers, [record_query])
+
+
+    def test_disabled_middleware_is_dropped(self):
+        with self.settings(HALO_REQUEST_TIMING=False):
+            response = APIClient().get(reverse('class_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response)
+
+
+
+class LogPipelineTest(TestCase):
+
+    class ThreadRecorder(logging.Handler):
+        #Keeps the records it gets and the thread that handed them over
+        def __init__(self):
+            super().__init__()
+            self.records = []
+            self.threads = set()
+
+        def emit(self, record):
+            self.records.append(self.format(record))
+            self.threads.add(threading.current_thread())
+
+
+    def test_records_are_written_by_the_listener_thread(self):
+        target = self.ThreadRecorder()
+        handler = QueueListenerHandler([target])
+        logger = logging.getLogger('halo.tests.queue')
+        logger.addHandler(handler)
+        logger.propagate = False
+        try:
+            logger.warning("Booking denied for %s.", "john@example.com")
+        finally:
+            logger.removeHandler(handler)
+            handler.close()   #Drains the queue
+
+        self.assertEqual(target.records, ["Booking denied for john@example.com."])
+        self.assertNotIn(threading.current_thread(), target.threads)
+
+
+    def test_json_lines_carry_extra_fields(self):
+        record = logging.makeLogRecord({
+            'name': 'halo.timing', 'levelname': 'INFO', 'msg': "%s took %.1fms", 'args': ('/book/', 12.34),
+            'queries': 6,
+        })
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual(entry['message'], "/book/ took 12.3ms")
+        self.assertEqual((entry['logger'], entry['level'], entry['queries']), ('halo.timing', 'INFO', 6))
+        self.assertNotIn('args', entry)
+
+
+    def test_project_logging_reaches_targets_after_gc(self):
+        #The project's LOGGING, writing its file to a temporary directory, with a target sorting after 'queue'
+        config = copy.deepcopy(settings.LOGGING)
+        directory = tempfile.mkdtemp()
+        config['handlers']['file']['filename'] = os.path.join(directory, 'debug.log')
+        config['handlers']['zz_memory'] = {'()': self.ThreadRecorder}
+        config['handlers']['queue']['handlers'].append('cfg://handlers.zz_memory')
+        self.addCleanup(logging.config.dictConfig, settings.LOGGING)
+        configurator = logging.config.DictConfigurator(config)
+        configurator.configure()
+        target = configurator.config['handlers']['zz_memory']
+        del configurator
+        gc.collect()
+
+        logger = logging.getLogger('halo')
+        logger.warning("Invalid class_id: %s.", 42)
+        logger.handlers[0].close()   #Drains the queue
+
+        self.assertEqual(target.records, ["Invalid class_id: 42."])
+        with open(os.path.join(directory, 'debug.log')) as f:
+            self.assertEqual(f.read(), "Invalid class_id: 42.\n")
+
+
+    def test_exceptions_reach_json_lines_through_the_queue(self):
+        target = self.ThreadRecorder()
+        target.setFormatter(JsonFormatter())
+        handler = QueueListenerHandler([target])
+        logger = logging.getLogger('halo.tests.queue')
+        logger.addHandler(handler)
+        logger.propagate = False
+        try:
+            try:
+                1 / 0
+            except ZeroDivisionError:
+                logger.exception("Booking failed for class %s.", 42)
+        finally:
+            logger.removeHandler(handler)
+            handler.close()
+
+        entry = json.loads(target.records[0])
+        self.assertEqual(entry['message'], "Booking failed for class 42.")
+        self.assertIn('ZeroDivisionError', entry['exc_info'])
+
+
+
+class ClientTest(APITestCase):
+
+    def setUp(self):
+        start = timezone.now() + timedelta(days=1)
+        self.classes = [
+            Class.objects.create(name=f"Class{i}", datetime=start + timedelta(hours=i), instructor="Alice", slots_available=5)
+            for i in range(3)
+        ]
+
+
+    def _book(self, cls, name="John Doe", email="john@example.com"):
+        return self.client.post(reverse('book_class'), {"class_id": cls.id, "client_name": name, "client_email": email})
+
+
+    def test_booking_response_leaves_the_client_out(self):
+        response = self._book(self.classes[0])
+        self.assertEqual(list(response.data['booking']), ['id', 'class_booked', 'client_name', 'client_email', 'booked_at'])
+        response = self.client.post(reverse('book_class_batch'), {'bookings': [
+            {'class_id': self.classes[1].id, 'client_name': 'John Doe', 'client_email': 'john@example.com'},
+        ]}, format='json')
+        self.assertNotIn('client', response.json()['results'][0]['booking'])
+
+
+    def test_emails_match_case_insensitively(self):
+        self.assertEqual(self._book(self.classes[0], email="John@Example.COM").status_code, 201)
+        self.assertEqual(self._book(self.classes[1], email="john@example.com").status_code, 201)
+
+        client = Client.objects.get()
+        self.assertEqual((client.name, client.email), ("John Doe", "john@example.com"))
+        self.assertEqual(client.bookings.count(), 2)
+
+        response = self._book(self.classes[0], email="JOHN@example.com")
+        self.assertEqual(response.data['error'], "You have already booked this class.")
+        response = self._book(self.classes[2], name="Jane Doe", email="JOHN@EXAMPLE.COM")
+        self.assertEqual(response.data['error'], "This email is already in use. Try with a different one.")
+
+        response = self.client.get(reverse('get_bookings') + '?email=JoHn@example.com')
+        self.assertEqual(len(response.data), 2)
+
+
+    def test_batch_creates_each_client_once(self):
+        items = [
+            {"class_id": self.classes[0].id, "client_name": "Jane Doe", "client_email": "Jane@example.com"},
+            {"class_id": self.classes[1].id, "client_name": "Jane Doe", "client_email": "jane@EXAMPLE.com"},
+            {"class_id": self.classes[1].id, "client_name": "Jane Doe", "client_email": "jane@example.com"},
+        ]
+        response = self.client.post(reverse('book_class_batch'), {"bookings": items}, format='json')
+        self.assertEqual([r['status'] for r in response.data['results']], [201, 201, 400])
+        self.assertEqual(list(Client.objects.values_list('email', flat=True)), ["jane@example.com"])
+        self.assertEqual(Booking.objects.filter(client__email="jane@example.com").count(), 2)
+
+
+
+class BookingCounterTest(APITestCase):
+
+    def setUp(self):
+        start = timezone.now() + timedelta(days=1)
+        self.classes = [
+            Class.objects.create(name=f"Class{i}", datetime=start + timedelta(hours=i), instructor="Alice", slots_available=5)
+            for i in range(4)
+        ]
+
+
+    def _book(self, cls, tz=None, email="john@example.com"):
+        url = reverse('book_class') + (f'?tz={tz}' if tz else '')
+        return self.client.post(url, {"class_id": cls.id, "client_name": "John Doe", "client_email": email})
+
+
+    def _counts(self):
+        return {(c.start, c.end): c.count for c in BookingCounter.objects.all()}
+
+
+    def test_bookings_keep_counters_in_step(self):
+        self._book(self.classes[0])
+        self._book(self.classes[1])
+        day, week = get_daily_bounds(pytz.UTC), get_weekly_bounds(pytz.UTC)
+        self.assertEqual(self._counts(), {day: 2, week: 2})
+
+        #Counters of another timezone's windows are created by its first booking and counted by later ones
+        self._book(self.classes[2], tz='Asia/Tokyo')
+        tokyo_day, tokyo_week = get_daily_bounds(pytz.timezone('Asia/Tokyo')), get_weekly_bounds(pytz.timezone('Asia/Tokyo'))
+        counts = self._counts()
+        self.assertEqual(counts[tokyo_day], Booking.objects.filter(booked_at__range=(tokyo_day[0], tokyo_day[1])).count())
+        self.assertEqual(counts[day], 3)
+
+        Booking.objects.get(class_booked=self.classes[0]).delete()
+        self.assertEqual(self._counts()[day], 2)
+        self.assertEqual(self._counts()[tokyo_week], Booking.objects.filter(booked_at__gte=tokyo_week[0], booked_at__lt=tokyo_week[1]).count())
+
+
+    def test_limit_checks_read_the_counter(self):
+        self._book(self.classes[0])
+        #A counter at the limit rejects the booking whatever the bookings say
+        BookingCounter.objects.filter(start=get_daily_bounds(pytz.UTC)[0], end=get_daily_bounds(pytz.UTC)[1]).update(count=3)
+        response = self._book(self.classes[1])
+        self.assertEqual(response.data['error'], "You can only book up to 3 classes per day.")
+
+
+    def test_batch_counts_into_existing_counters(self):
+        self._book(self.classes[0])
+        items = [{"class_id": cls.id, "client_name": "John Doe", "client_email": "john@example.com"} for cls in self.classes[1:3]]
+        self.client.post(reverse('book_class_batch'), {"bookings": items}, format='json')
+        self.assertEqual(set(self._counts().values()), {3})
+
+
+    def test_rebuild_and_verify(self):
+        self._book(self.classes[0])
+        self._book(self.classes[1])
+        client = Client.objects.get()
+        now = timezone.now()
+        BookingCounter.objects.create(client=client, start=now - timedelta(days=2), end=now - timedelta(days=1), count=1)
+        BookingCounter.objects.filter(end__gt=now).update(count=7)
+
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('rebuild_booking_counters', verify=True, stdout=out)
+        self.assertIn("counter 7, bookings 2", out.getvalue())
+
+        call_command('rebuild_booking_counters', stdout=StringIO())
+        self.assertEqual(set(self._counts().values()), {2})
+        self.assertFalse(BookingCounter.objects.filter(end__lte=now).exists())
+        call_command('rebuild_booking_counters', verify=True, stdout=StringIO())
+
+
+
+class IdempotencyTest(APITestCase):
+
+    def setUp(self):
+        get_store().clear()
+        self.cls = Class.objects.create(
+            name="Yoga", datetime=timezone.now() + timedelta(days=1), instructor="Alice", slots_available=5
+        )
+
+
+    def _book(self, key, cls=None, email="john@example.com"):
+        data = {"class_id": (cls or self.cls).id, "client_name": "John Doe", "client_email": email}
+        return self.client.post(reverse('book_class'), data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+
+    def test_retry_replays_the_original_response(self):
+        first = self._book("key-1")
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+
+        #No validation, eligibility or booking query runs for the retry
+        with self.assertNumQueries(0):
+            retry = self._book("key-1")
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Booking.objects.count(), 1)
+        self.cls.refresh_from_db()
+        self.assertEqual(self.cls.slots_available, 4)
+
+        #Without the key the same request runs and hits the duplicate check
+        response = self.client.post(reverse('book_class'), {"class_id": self.cls.id, "client_name": "John Doe", "client_email": "john@example.com"})
+        self.assertEqual(response.data['error'], "You have already booked this class.")
+
+
+    def test_key_is_scoped_to_the_request(self):
+        other = Class.objects.create(name="Pilates", datetime=timezone.now() + timedelta(days=2), instructor="Bob", slots_available=5)
+        self._book("key-1")
+        response = self._book("key-1", cls=other)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Booking.objects.count(), 2)
+
+
+    def test_rejects_oversized_keys(self):
+        response = self._book("k" * 256)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Booking.objects.exists())
+
+
+    def test_concurrent_duplicates_run_once(self):
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        @api_view(['POST'])
+        @idempotent
+        def slow_view(request):
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return Response({"n": len(calls)}, status=status.HTTP_201_CREATED)
+
+        factory = APIRequestFactory()
+        post = lambda: slow_view(factory.post('/book/', {"a": 1}, format='json', HTTP_IDEMPOTENCY_KEY='key-1'))
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            first = pool.submit(post)
+            started.wait(5)
+            waiting = [pool.submit(post) for _ in range(3)]
+            time.sleep(0.2)
+            release.set()
+            responses = [first.result()] + [f.result() for f in waiting]
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([r.status_code for r in responses], [201] * 4)
+        self.assertEqual([r.data for r in responses], [{"n": 1}] * 4)
+        self.assertEqual(sum(r.get('Idempotent-Replayed') == 'true' for r in responses), 3)
+
+
+    def test_server_errors_are_not_stored(self):
+        calls = []
+
+        @api_view(['POST'])
+        @idempotent
+        def failing_view(request):
+            calls.append(1)
+            return Response({"error": "boom"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        factory = APIRequestFactory()
+        for _ in range(2):
+            failing_view(factory.post('/book/', {}, format='json', HTTP_IDEMPOTENCY_KEY='key-1'))
+        self.assertEqual(len(calls), 2)
+
+
+
+@override_settings(HALO_RATE_LIMIT_ENABLED=True, HALO_RATE_LIMITS={'book': (3, 60), 'bookings': (2, 60), 'book_batch': (1, 60)})
+class RateLimitTest(APITestCase):
+
+    def setUp(self):
+        get_bucket_store().clear()
+        self.cls = Class.objects.create(
+            name="Yoga", datetime=timezone.now() + timedelta(days=1), instructor="Alice", slots_available=5
+        )
+
+
+    def _book(self, email="john@example.com", ip="10.0.0.1"):
+        data = {"class_id": self.cls.id, "client_name": "John Doe", "client_email": email}
+        return self.client.post(reverse('book_class'), data, REMOTE_ADDR=ip)
+
+
+    def test_rejects_over_budget_before_any_query(self):
+        for _ in range(3):
+            self.assertNotEqual(self._book().status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        with self.assertNumQueries(0):
+            response = self._book()
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response.json()['error'], "Too many requests. Try again in 20 seconds.")
+        self.assertEqual(response['Retry-After'], '20')
+
+
+    def test_buckets_by_ip_and_email(self):
+        for i in range(3):
+            self._book(email=f"client{i}@example.com")
+        #Same IP with a fresh email, and the same email (in another case) from a fresh IP
+        self.assertEqual(self._book(email="other@example.com").status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertNotEqual(self._book(email="client0@example.com", ip="10.0.0.2").status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        for ip in ("10.0.0.3", "10.0.0.4", "10.0.0.5"):
+            self._book(email="John@example.com", ip=ip)
+        self.assertEqual(self._book(email="JOHN@example.com", ip="10.0.0.6").status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+    def test_budgets_are_per_endpoint(self):
+        for _ in range(3):
+            self._book()
+        url = reverse('get_bookings') + '?email=john@example.com'
+        self.assertEqual(self.client.get(url, REMOTE_ADDR="10.0.0.1").status_code, status.HTTP_200_OK)
+        self.client.get(url, REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(self.client.get(url, REMOTE_ADDR="10.0.0.1").status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        async_url = reverse('get_bookings_async') + '?email=jane@example.com'
+        self.assertEqual(self.client.get(async_url, REMOTE_ADDR="10.0.0.9").status_code, status.HTTP_404_NOT_FOUND)
+        self.client.get(async_url, REMOTE_ADDR="10.0.0.9")
+        response = self.client.get(async_url, REMOTE_ADDR="10.0.0.9")
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+
+
+    def test_buckets_refill(self):
+        for store in (LocalBucketStore(), CacheBucketStore(cache)):
+            with mock.patch('halo.utils.rate_limit.time') as clock:
+                clock.monotonic.return_value = clock.time.return_value = 1000.0
+                self.assertEqual([store.take('k', 2, 1 / 30) for _ in range(2)], [0, 0])
+                self.assertAlmostEqual(store.take('k', 2, 1 / 30), 30)
+                clock.monotonic.return_value = clock.time.return_value = 1015.0
+                self.assertAlmostEqual(store.take('k', 2, 1 / 30), 15)
+                clock.monotonic.return_value = clock.time.return_value = 1030.0
+                self.assertEqual(store.take('k', 2, 1 / 30), 0)
+
+
+    def test_local_store_evicts_least_recently_used(self):
+        store = LocalBucketStore(max_keys=2)
+        store.take('a', 1, 1)
+        store.take('b', 1, 1)
+        store.take('a', 1, 1)
+        store.take('c', 1, 1)
+        self.assertEqual(list(store.buckets), ['a', 'c'])
+
+
+
+class BookingExportTest(APITestCase):
+
+    def setUp(self):
+        start = timezone.now() + timedelta(days=1)
+        self.yoga = Class.objects.create(name="Yoga", datetime=start, instructor="Alice", slots_available=5)
+        self.pilates = Class.objects.create(name="Pilates", datetime=start + timedelta(hours=1), instructor="Bob", slots_available=5)
+        self.bookings = [
+            create_booking(self.yoga, "John Doe", "john@example.com"),
+            create_booking(self.yoga, "Jane Doe", "jane@example.com"),
+            create_booking(self.pilates, "John Doe", "john@example.com"),
+        ]
+        Booking.objects.filter(id=self.bookings[0].id).update(booked_at=datetime(2025, 1, 1, 10, tzinfo=dt_timezone.utc))
+        self.staff = User.objects.create_user('staff', is_staff=True)
+
+
+    def _export(self, query=''):
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(reverse('export_bookings') + query)
+        return response, b''.join(response.streaming_content).decode() if response.streaming else None
+
+
+    def test_staff_only(self):
+        self.assertEqual(self.client.get(reverse('export_bookings')).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(User.objects.create_user('client'))
+        self.assertEqual(self.client.get(reverse('export_bookings')).status_code, status.HTTP_403_FORBIDDEN)
+
+
+    def test_streams_csv_with_class_info(self):
+        response, body = self._export()
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(body.splitlines()))
+        self.assertEqual([int(r['booking_id']) for r in rows], [b.id for b in self.bookings])
+        self.assertEqual((rows[2]['class_name'], rows[2]['instructor'], rows[2]['client_email']), ("Pilates", "Bob", "john@example.com"))
+        self.assertEqual(rows[0]['booked_at'], "2025-01-01T10:00:00+00:00")
+
+
+    def test_ndjson_and_filters(self):
+        response, body = self._export(f'?output=ndjson&class_id={self.yoga.id}&start=2025-06-01')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([r['booking_id'] for r in rows], [self.bookings[1].id])
+        self.assertEqual(rows[0]['class_name'], "Yoga")
+
+        _, body = self._export('?output=ndjson&end=2025-01-02')
+        self.assertEqual([json.loads(line)['booking_id'] for line in body.splitlines()], [self.bookings[0].id])
+
+
+    def test_rejects_bad_filters(self):
+        for query in ('?output=xml', '?start=yesterday', '?start=2025-02-30', '?class_id=abc', '?start=2025-02-01&end=2025-01-01'):
+            response, _ = self._export(query)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+
+
+    def test_rows_are_fetched_in_chunks(self):
+        #One SELECT however many rows, read through a server-side iterator rather than a list
+        with self.settings(HALO_EXPORT_CHUNK_SIZE=1):
+            with self.assertNumQueries(1):
+                _, body = self._export('?output=ndjson')
+        self.assertEqual(len(body.splitlines()), 3)
+
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_bookings', class_id=str(self.pilates.id), stdout=out)
+        rows = list(csv.DictReader(out.getvalue().splitlines()))
+        self.assertEqual([r['class_name'] for r in rows], ["Pilates"])
+
+        path = os.path.join(tempfile.mkdtemp(), 'bookings.ndjson')
+        out = StringIO()
+        call_command('export_bookings', format='ndjson', output=path, stdout=out)
+        with open(path) as f:
+            self.assertEqual(len(f.readlines()), 3)
+        self.assertIn("Exported 3 bookings", out.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command('export_bookings', start='soon', stdout=StringIO())
+
+
+
+class AdminChangelistTest(TestCase):
+
+    #Queries of a changelist page: session, user, count and rows, whatever the number of rows
+    MAX_QUERIES = 5
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', None))
+        self.classes = []
+        self._add_classes(3)
+
+
+    def _add_classes(self, count):
+        #Classes with two bookings each
+        start = timezone.now() + timedelta(days=1)
+        for _ in range(count):
+            i = len(self.classes)
+            cls = Class.objects.create(name="Yoga" if i % 2 else "Pilates", datetime=start + timedelta(hours=i), instructor="Alice", slots_available=5)
+            create_booking(cls, "John Doe", f"john{i}@example.com")
+            create_booking(cls, "Jane Doe", f"jane{i}@example.com")
+            self.classes.append(cls)
+
+
+    def _changelist(self, model, query=''):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(f'admin:halo_{model}_changelist') + query)
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl'], len(queries)
+
+
+    def test_queries_per_page_are_capped(self):
+        pages = [('class', ''), ('class', '?q=YOGA'), ('booking', ''), ('booking', '?q=John1@Example.com'), ('booking', '?q=pilates'), ('client', '')]
+        counts = [self._changelist(model, query)[1] for model, query in pages]
+        self._add_classes(20)
+        for (model, query), count in zip(pages, counts):
+            self.assertLessEqual(count, self.MAX_QUERIES, (model, query))
+            self.assertEqual(self._changelist(model, query)[1], count, (model, query))
+
+
+    def test_booking_counts_and_classes_are_read_with_the_page(self):
+        cl, _ = self._changelist('class')
+        self.assertEqual([cls.booking_count for cls in cl.result_list], [2, 2, 2])
+
+        #Listing bookings reads their classes in the same query
+        cl, _ = self._changelist('booking')
+        with self.assertNumQueries(0):
+            self.assertEqual({str(booking) for booking in cl.result_list}, {"John Doe booked the Yoga class by Alice", "Jane Doe booked the Yoga class by Alice", "John Doe booked the Pilates class by Alice", "Jane Doe booked the Pilates class by Alice"})
+
+
+    def test_search_matches_whole_names_and_emails(self):
+        cl, _ = self._changelist('class', '?q=yOGA')
+        self.assertEqual([cls.id for cls in cl.result_list], [self.classes[1].id])
+        cl, _ = self._changelist('class', '?q=yog')
+        self.assertEqual(list(cl.result_list), [])
+        cl, _ = self._changelist('booking', '?q=JANE2@example.com')
+        self.assertEqual([booking.client.email for booking in cl.result_list], ["jane2@example.com"])
+        cl, _ = self._changelist('client', '?q=john0@example.com')
+        self.assertEqual([client.email for client in cl.result_list], ["john0@example.com"])
+
+
+    def test_counts_stop_at_the_limit(self):
+        with self.settings(HALO_ADMIN_COUNT_LIMIT=4):
+            #Unfiltered, the highest id stands in for the count
+            cl, _ = self._changelist('booking')
+            self.assertEqual(cl.result_count, Booking.objects.aggregate(last=Max('pk'))['last'])
+            cl, _ = self._changelist('class', '?q=pilates')
+            self.assertEqual(cl.result_count, 2)
+            cl, _ = self._changelist('booking', '?q=pilates')
+            self.assertEqual(cl.result_count, 4)
+            self._add_classes(4)
+            cl, _ = self._changelist('booking', '?q=pilates')
+            self.assertEqual(cl.result_count, 4)
+            self.assertIsNone(cl.full_result_count)
+
+
+
+class ClientMigrationTest(TransactionTestCase):
+
+    def _migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([('halo', target)])
+        return executor.loader.project_state([('halo', target)]).apps
+
+
+    def tearDown(self):
+        #Back to the latest migration for the tests that follow
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes('halo'))
+
+
+    def test_clients_are_backfilled_from_bookings(self):
+        old = self._migrate('0003_booking_indexes')
+        OldClass, OldBooking = old.get_model('halo', 'Class'), old.get_model('halo', 'Booking')
+        yoga = OldClass.objects.create(name="Yoga", datetime=timezone.now(), instructor="Alice", slots_available=3)
+        pilates = OldClass.objects.create(name="Pilates", datetime=timezone.now(), instructor="Bob", slots_available=3)
+        OldBooking.objects.create(class_booked=yoga, client_name="John Doe", client_email="John@example.com")
+        OldBooking.objects.create(class_booked=yoga, client_name="John Doe", client_email="john@example.com")
+        OldBooking.objects.create(class_booked=pilates, client_name="Johnny", client_email="JOHN@example.com")
+        OldBooking.objects.create(class_booked=pilates, client_name="Jane Doe", client_email="jane@example.com")
+
+        new = self._migrate('0004_client')
+        NewClass, NewClient = new.get_model('halo', 'Class'), new.get_model('halo', 'Client')
+        clients = {c.email: c for c in NewClient.objects.all()}
+        self.assertEqual(sorted(clients), ["jane@example.com", "john@example.com"])
+        self.assertEqual(clients["john@example.com"].name, "John Doe")
+        self.assertEqual(sorted(b.class_booked_id for b in clients["john@example.com"].bookings.all()), sorted([yoga.id, pilates.id]))
+
+        #The case variant duplicate of the yoga booking was removed and its slot given back
+        self.assertEqual(NewClass.objects.get(id=yoga.id).slots_available, 4)
+
+
+
+class SqliteTuningTest(TestCase):
+
+    def _pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+
+    def test_pragmas_applied_to_new_connections(self):
+        default = self._pragma('cache_size')
+        try:
+            with self.settings(HALO_SQLITE_PRAGMAS={'cache_size': -1234}):
+                with self.assertNumQueries(0):
+                    connection_created.send(sender=type(connection), connection=connection)
+            self.assertEqual(self._pragma('cache_size'), -1234)
+        finally:
+            connection.connection.execute(f'PRAGMA cache_size = {default}')
+
+
+    def test_default_profile_leaves_connections_alone(self):
+        default = self._pragma('cache_size')
+        with self.settings(HALO_SQLITE_PRAGMAS={}):
+            apply_pragmas(sender=type(connection), connection=connection)
+        self.assertEqual(self._pragma('cache_size'), default)
+
+
+
+class TimeBoundsTest(TestCase):
+
+    def setUp(self):
+        clear_bounds_cache()
+
+
+    def _at(self, *args):
+        return mock.patch('django.utils.timezone.now', return_value=datetime(*args, tzinfo=dt_timezone.utc))
+
+
+    def _utc(self, *args):
+        return datetime(*args, tzinfo=dt_timezone.utc)
+
+
+    def test_spring_forward_day_is_23_hours(self):
+        ny = pytz.timezone('America/New_York')
+        with self._at(2030, 3, 10, 16):
+            start, end = get_daily_bounds(ny)
+            week_start, week_end = get_weekly_bounds(ny)
+        self.assertEqual((start, end), (self._utc(2030, 3, 10, 5), self._utc(2030, 3, 11, 4)))
+        self.assertEqual((week_start, week_end), (self._utc(2030, 3, 4, 5), self._utc(2030, 3, 11, 4)))
+
+
+    def test_fall_back_day_is_25_hours(self):
+        ny = pytz.timezone('America/New_York')
+        with self._at(2030, 11, 3, 16):
+            start, end = get_daily_bounds(ny)
+        self.assertEqual((start, end), (self._utc(2030, 11, 3, 4), self._utc(2030, 11, 4, 5)))
+
+
+    def test_skipped_and_repeated_midnight(self):
+        #Havana moves its clocks at midnight: 00:00 does not exist on 10 March and happens twice on 3 November
+        havana = pytz.timezone('America/Havana')
+        with self._at(2030, 3, 10, 12):
+            self.assertEqual(get_daily_bounds(havana), (self._utc(2030, 3, 10, 5), self._utc(2030, 3, 11, 4)))
+        with self._at(2030, 11, 3, 4, 30):
+            self.assertEqual(get_daily_bounds(havana), (self._utc(2030, 11, 3, 4), self._utc(2030, 11, 4, 5)))
+
+
+    def test_cached_bounds_expire_at_local_midnight(self):
+        kolkata = pytz.timezone('Asia/Kolkata')
+        with self._at(2030, 1, 1, 18, 29):
+            first = get_daily_bounds(kolkata)
+        with self._at(2030, 1, 1, 18, 30):
+            second = get_daily_bounds(kolkata)
+        self.assertEqual(first, (self._utc(2029, 12, 31, 18, 30), self._utc(2030, 1, 1, 18, 30)))
+        self.assertEqual(second, (self._utc(2030, 1, 1, 18, 30), self._utc(2030, 1, 2, 18, 30)))
+        self.assertEqual(len(_bounds_cache), 1)
+
+
+    def test_timezones_are_memoized_including_unknown_names(self):
+        resolve_timezone.cache_clear()
+        for _ in range(3):
+            self.assertIsNone(resolve_timezone('Mars/Olympus_Mons'))
+            self.assertEqual(resolve_timezone('Asia/Tokyo'), pytz.timezone('Asia/Tokyo'))
+        info = resolve_timezone.cache_info()
+        self.assertEqual((info.misses, info.hits), (2, 4))
+
+        response = self.client.get(reverse('class_list') + '?tz=Mars/Olympus_Mons')
+        self.assertEqual(response.status_code, 200)
+
+
+
+class TimezoneViewsTest(APITestCase):
+
+    def setUp(self):
+        # Setup a class in UTC
+        self.utc_now = timezone.now()
+        self.class_instance = Class.objects.create(
+            name="Test Yoga",
+            datetime=self.utc_now + timedelta(days=1),  # tomorrow
+            instructor="Test Instructor",
+            slots_available=5
+        )
+
+    
+    def test_class_list_with_timezone(self):
+        # Pass a timezone in query
+        response = self.client.get(reverse('class_list') + '?tz=Asia/Tokyo')
+        self.assertEqual(response.status_code, 200)
+
+        # Get datetime from response
+        returned_datetime_str = response.data[0]['datetime']
+        returned_dt = timezone.datetime.strptime(returned_datetime_str, "%Y-%m-%d %I:%M %p")
+        
+        # Convert original UTC datetime to Asia/Tokyo
+        tokyo_tz = pytz.timezone('Asia/Tokyo')
+        expected_dt = self.class_instance.datetime.astimezone(tokyo_tz)
+        
+        self.assertEqual(returned_dt.hour, expected_dt.hour)
+        self.assertEqual(returned_dt.day, expected_dt.day)
+
+
+    def test_book_class_and_return_timezone(self):
+        booking_data = {
+            'class_id': self.class_instance.id,
+            'client_name': 'John Doe',
+            'client_email': 'john@example.com'
+        }
+
+        response = self.client.post(reverse('book_class') + '?tz=Asia/Kolkata', data=booking_data, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        returned_booking_time = response.data['booking']['booked_at']
+
+        # Parse ISO datetime string
+        returned_dt_utc = parser.isoparse(returned_booking_time)
+
+        # Convert to IST
+        ist = pytz.timezone('Asia/Kolkata')
+        returned_dt_ist = returned_dt_utc.astimezone(ist)
+
+        # Get expected formatted value
+        formatted_expected = returned_dt_ist.strftime("%Y-%m-%d %I:%M %p")
+
+        self.assertEqual(formatted_expected, returned_dt_ist.strftime("%Y-%m-%d %I:%M %p"))  # compare IST representation
+
+    
+    
+
+
+class ConcurrentBookingStressTest(TransactionTestCase):
+
+    THREADS = 32
+    REQUESTS = 300
+    SLOTS = 50
+
+    def setUp(self):
+        self.cls = Class.objects.create(
+            name="Spin",
+            datetime=timezone.now() + timedelta(days=1),
+            instructor="Carol",
+            slots_available=self.SLOTS
+        )
+
+
+    def _book(self, i):
+        try:
+            client = APIClient()
+            response = client.post(reverse('book_class'), {
+                "class_id": self.cls.id,
+                "client_name": "Client",
+                "client_email": f"client{i}@example.com"
+            })
+            return response.status_code
+        finally:
+            connection.close()
+
+
+    def test_reserve_slot_reports_lost_race(self):
+        #A stale row that still shows free slots after another request took the last one
+        stale = Class.objects.get(id=self.cls.id)
+        Class.objects.filter(id=self.cls.id).update(slots_available=0)
+
+        outcome, booking = reserve_slot(stale, "Client", "late@example.com")
+        self.assertEqual(outcome, RACE_LOST)
+        self.assertIsNone(booking)
+        self.assertFalse(Booking.objects.filter(client_email="late@example.com").exists())
+
+
+    def test_reserve_slot_rejects_duplicate_without_taking_a_slot(self):
+        reserve_slot(self.cls, "Client", "twice@example.com")
+        outcome, booking = reserve_slot(self.cls, "Client", "twice@example.com")
+
+        self.assertEqual(outcome, DUPLICATE)
+        self.cls.refresh_from_db()
+        self.assertEqual(self.cls.slots_available, self.SLOTS - 1)
+
+
+    def test_reserve_slot_rejects_client_created_under_another_name(self):
+        Client.objects.create(email="taken@example.com", name="Someone Else")
+        outcome, booking = reserve_slot(self.cls, "Client", "taken@example.com")
+
+        self.assertEqual(outcome, EMAIL_TAKEN)
+        self.assertIsNone(booking)
+        self.cls.refresh_from_db()
+        self.assertEqual(self.cls.slots_available, self.SLOTS)
+
+
+    def test_client_created_after_eligibility_check_keeps_email(self):
+        #Another request creates the client between the eligibility check and the reservation
+        def eligibility_then_client(*args):
+            result = get_eligibility(*args)
+            Client.objects.create(email="taken@example.com", name="Someone Else")
+            return result
+
+        with mock.patch('halo.views.get_eligibility', side_effect=eligibility_then_client):
+            response = APIClient().post(reverse('book_class'), {
+                "class_id": self.cls.id, "client_name": "Client", "client_email": "taken@example.com"
+            })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], "This email is already in use. Try with a different one.")
+        self.assertFalse(Booking.objects.filter(client_email="taken@example.com").exists())
+        self.cls.refresh_from_db()
+        self.assertEqual(self.cls.slots_available, self.SLOTS)
+
+
+    def test_concurrent_bookings_never_oversell(self):
+        with ThreadPoolExecutor(max_workers=self.THREADS) as pool:
+            codes = list(pool.map(self._book, range(self.REQUESTS)))
+
+        self.cls.refresh_from_db()
+        booked = Booking.objects.filter(class_booked=self.cls).count()
+        created = codes.count(status.HTTP_201_CREATED)
+
+        self.assertEqual(created, self.SLOTS)
+        self.assertEqual(booked, self.SLOTS)
+        self.assertEqual(self.cls.slots_available, 0)
+        self.assertTrue(all(code in (201, 400, 409) for code in codes), codes)
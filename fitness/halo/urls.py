@@ -1,8 +1,19 @@
+from django.conf import settings
 from django.urls import path
-from .views import class_list, book_class, get_bookings
+from .views import class_list, book_class, book_class_batch, get_bookings
+from .views import class_list_async, get_bookings_async, export_bookings, class_availability, slot_events
+
+#HALO_ASYNC_VIEWS serves the read endpoints with the async views, the async/ paths always do
+read_views = (class_list_async, get_bookings_async) if getattr(settings, 'HALO_ASYNC_VIEWS', False) else (class_list, get_bookings)
 
 urlpatterns = [
-    path('classes/', class_list, name='class_list'),
+    path('classes/', read_views[0], name='class_list'),
+    path('availability/', class_availability, name='class_availability'),
+    path('events/slots/', slot_events, name='slot_events'),
     path('book/', book_class, name='book_class'),
-    path('bookings/', get_bookings, name='get_bookings'),
-]
\ No newline at end of file
+    path('book/batch/', book_class_batch, name='book_class_batch'),
+    path('bookings/', read_views[1], name='get_bookings'),
+    path('async/classes/', class_list_async, name='class_list_async'),
+    path('async/bookings/', get_bookings_async, name='get_bookings_async'),
+    path('export/bookings/', export_bookings, name='export_bookings'),
+]
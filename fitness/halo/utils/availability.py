@@ -0,0 +1,49 @@
+from django.db.models import Max, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from halo.models import Class
+
+
+#Highest slots version any class has, 0 before the first write
+def current_slots_version():
+    return Class.objects.aggregate(version=Max('slots_version'))['version'] or 0
+
+
+def next_slots_version():
+
+    '''
+    Expression for the slots version of an UPDATE: one past the highest so
+    far, read from class_slots_version_idx. Every statement gets its own
+    version, and SQLite runs one writer at a time, so versions are handed
+    out, and committed, in order.
+    '''
+    latest = Class.objects.order_by('-slots_version').values('slots_version')[:1]
+    return Coalesce(Subquery(latest), 0) + 1
+
+
+def availability(since=None, now=None):
+
+    '''
+    Returns {version, full, classes} where classes are [id, slots_available]
+    pairs of the upcoming classes: all of them, or with `since` only those
+    whose slots changed after that version. `full` says which, a `since`
+    ahead of every version (e.g. after the database was reset) gets the
+    full list too.
+
+    The version is read before the classes and raised to the highest one
+    among them, so nothing committed up to the version returned can be
+    missing from the pairs.
+    '''
+    now = now or timezone.now()
+    version = current_slots_version()
+    full = since is None or since > version
+
+    classes = Class.objects.filter(datetime__gte=now)
+    if full:
+        classes = classes.order_by('datetime', 'id')
+    else:
+        classes = classes.filter(slots_version__gt=since).order_by('slots_version')
+    rows = list(classes.values_list('id', 'slots_available', 'slots_version'))
+
+    version = max([version] + [row[2] for row in rows])
+    return {'version': version, 'full': full, 'classes': [[class_id, slots] for class_id, slots, _ in rows]}
@@ -0,0 +1,213 @@
+from collections import Counter
+from django.db import transaction, IntegrityError
+from django.db.models import F
+from rest_framework import status
+from halo.models import Class, Booking, Client
+from halo.serializers import BookingSerializer
+from halo.utils.request_metrics import serializer_timer
+from halo.utils.validators import is_valid_name, is_valid_email, normalize_email, parse_class_id
+from halo.utils.time_bounds import get_daily_bounds, get_weekly_bounds
+from halo.utils.booking_limits import check_daily_limit, check_weekly_limit
+from halo.utils.eligibility import get_batch_eligibility
+from halo.utils.reservations import reserve_slot, RESERVED, DUPLICATE, EMAIL_TAKEN
+from halo.utils.schedule_cache import bump_schedule_version
+from halo.utils.booking_counters import increment_counters_for, create_counters, lock_clients
+from halo.utils.recurrence import find_occurrences, materialize_occurrence
+from halo.utils.availability import next_slots_version
+from halo.utils.slot_events import notify_slot_change
+import logging
+
+logger = logging.getLogger('halo')
+
+REQUIRED_FIELDS = ['class_id', 'client_name', 'client_email']
+
+
+def _error(index, code, message):
+    return {"index": index, "status": code, "error": message}
+
+
+def _success(index, booking):
+    with serializer_timer():
+        data = BookingSerializer(booking).data
+    return {"index": index, "status": status.HTTP_201_CREATED, "message": "Booking successful", "booking": data}
+
+
+def book_batch(items, client_tz):
+
+    '''
+    Validates and books a list of {class_id, client_name, client_email} items
+    with the same rules and error messages as POST /book, applied in order as
+    if each item were a separate request. Returns one result per item.
+    '''
+    results = [None] * len(items)
+
+    #Field validation, no queries needed
+    candidates = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[i] = _error(i, status.HTTP_400_BAD_REQUEST, "Each booking must be an object.")
+            continue
+
+        missing = [f for f in REQUIRED_FIELDS if not item.get(f)]
+        if missing:
+            results[i] = _error(i, status.HTTP_400_BAD_REQUEST, f"Missing fields: {','.join(missing)}.")
+            continue
+
+        name = str(item['client_name']).strip()
+        email = str(item['client_email']).strip()
+        if not is_valid_name(name):
+            results[i] = _error(i, status.HTTP_400_BAD_REQUEST, "Name must contain only letters and spaces.")
+            continue
+        if not is_valid_email(email):
+            results[i] = _error(i, status.HTTP_400_BAD_REQUEST, "Invalid email format.")
+            continue
+
+        candidates.append((i, item['class_id'], name, normalize_email(email)))
+
+    if not candidates:
+        return results
+
+    #Class ids, or the keys of the template occurrences never booked, which have no bookings and get their row from _insert
+    occurrences = find_occurrences(class_id for _, class_id, _, _ in candidates if parse_class_id(class_id) is None)
+    refs = {key: cls.pk or key for key, cls in occurrences.items()}
+    candidates = [
+        (i, parse_class_id(class_id) or refs.get(str(class_id)), name, email)
+        for i, class_id, name, email in candidates
+    ]
+
+    #Everything the rules need for the whole batch, in three queries
+    class_ids = {class_ref for _, class_ref, _, _ in candidates if isinstance(class_ref, int)}
+    state = get_batch_eligibility(
+        {email for _, _, _, email in candidates}, class_ids,
+        get_daily_bounds(client_tz), get_weekly_bounds(client_tz)
+    )
+    classes = Class.objects.in_bulk(class_ids)
+    classes.update((key, cls) for key, cls in occurrences.items() if cls.pk is None)
+    slots_left = {class_ref: cls.slots_available for class_ref, cls in classes.items()}
+
+    #Business rules, counting the bookings this batch has already accepted
+    accepted = []
+    for i, class_ref, name, email in candidates:
+        client = state[email]
+
+        if client['names'] - {name}:
+            results[i] = _error(i, status.HTTP_400_BAD_REQUEST, "This email is already in use. Try with a different one.")
+            continue
+
+        cls = classes.get(class_ref)
+        if cls is None:
+            results[i] = _error(i, status.HTTP_404_NOT_FOUND, "Class not found.")
+            continue
+
+        if slots_left[class_ref] <= 0:
+            results[i] = _error(i, status.HTTP_400_BAD_REQUEST, "No slots available.")
+            continue
+
+        limit_response = (
+            check_daily_limit(email, client_tz, client['daily_count'])
+            or check_weekly_limit(email, client_tz, client['weekly_count'])
+        )
+        if limit_response:
+            results[i] = _error(i, limit_response.status_code, limit_response.data['error'])
+            continue
+
+        if class_ref in client['classes']:
+            results[i] = _error(i, status.HTTP_400_BAD_REQUEST, "You have already booked this class.")
+            continue
+
+        client['names'].add(name)
+        client['daily_count'] += 1
+        client['weekly_count'] += 1
+        client['classes'].add(class_ref)
+        slots_left[class_ref] -= 1
+        accepted.append((i, cls, name, email))
+
+    _insert(accepted, state, results)
+    return results
+
+
+def _insert(accepted, state, results):
+
+    '''
+    Takes the slots of each class with one conditional UPDATE, creates the
+    clients booking for the first time and inserts all bookings with one
+    bulk_create each, then counts them into the clients' booking counters,
+    all in a single transaction.
+
+    Items of a class whose slots ran out since they were read, or every item
+    if the insert collides with a concurrent booking, are reserved one at a
+    time instead so the batch still books as many as it can.
+
+    Template occurrences never booked before get their Class row in the same
+    transaction, so a row only stays if its bookings do.
+    '''
+    one_by_one = []
+
+    try:
+        with transaction.atomic():
+            rows, items = {}, []
+            for i, cls, name, email in accepted:
+                if cls.pk is None:
+                    occurrence = (cls.template_id, cls.datetime)
+                    if occurrence not in rows:
+                        rows[occurrence] = materialize_occurrence(cls)
+                    cls = rows[occurrence]
+                items.append((i, cls, name, email))
+
+            short = set()
+            for class_id, count in Counter(cls.id for _, cls, _, _ in items).items():
+                updated = Class.objects.filter(id=class_id, slots_available__gte=count).update(
+                    slots_available=F('slots_available') - count, slots_version=next_slots_version()
+                )
+                if not updated:
+                    short.add(class_id)
+
+            bulk = [item for item in items if item[1].id not in short]
+            one_by_one = [item for item in items if item[1].id in short]
+
+            #First bookings of an email create its client, named as in the first such item
+            new_clients = {}
+            for _, _, name, email in bulk:
+                if state[email]['client'] is None and email not in new_clients:
+                    new_clients[email] = Client(email=email, name=name)
+            Client.objects.bulk_create(new_clients.values())
+            clients = {email: state[email]['client'] or new_clients[email] for _, _, _, email in bulk}
+
+            #Existing clients whose counters this batch creates, see create_counters
+            lock_clients([client.id for email, client in clients.items() if email not in new_clients and state[email]['new_windows']])
+
+            bookings = Booking.objects.bulk_create([
+                Booking(class_booked=cls, client=clients[email], client_name=name, client_email=email)
+                for _, cls, name, email in bulk
+            ])
+            transaction.on_commit(bump_schedule_version)   #Neither update() nor bulk_create() send signals
+            transaction.on_commit(notify_slot_change)
+
+            #New clients have no counters yet, create_counters counts their bookings
+            if len(new_clients) < len(clients):
+                increment_counters_for(bookings)
+            booked = Counter(email for _, _, _, email in bulk)
+            create_counters(
+                (client, bounds, booked[email] if email in new_clients else None)
+                for email, client in clients.items() for bounds in state[email]['new_windows']
+            )
+
+        for email, client in clients.items():
+            state[email].update(client=client, new_windows=[])
+    except IntegrityError:
+        logger.warning("Batch insert collided with a concurrent booking, reserving one at a time.")
+        bulk, bookings, one_by_one = [], [], accepted
+
+    for (i, _, _, _), booking in zip(bulk, bookings):
+        results[i] = _success(i, booking)
+
+    for i, cls, name, email in one_by_one:
+        outcome, booking = reserve_slot(cls, name, email, state[email]['client'], state[email]['new_windows'])
+        if outcome == RESERVED:
+            results[i] = _success(i, booking)
+        elif outcome == DUPLICATE:
+            results[i] = _error(i, status.HTTP_400_BAD_REQUEST, "You have already booked this class.")
+        elif outcome == EMAIL_TAKEN:
+            results[i] = _error(i, status.HTTP_400_BAD_REQUEST, "This email is already in use. Try with a different one.")
+        else:
+            results[i] = _error(i, status.HTTP_409_CONFLICT, "No slots available.")
@@ -0,0 +1,80 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from halo.models import Booking, BookingCounter, Client
+
+
+#Subquery counting a client's bookings inside a window, `client` and the bounds may be OuterRefs
+def bookings_in_window(client, start, end, **filters):
+    bookings = Booking.objects.filter(client=client, booked_at__gte=start, booked_at__lt=end, **filters)
+    return Coalesce(Subquery(bookings.order_by().values('client').annotate(n=Count('id')).values('n')), 0)
+
+
+#Subquery reading a client's counter of one window, NULL when it does not exist yet
+def window_counter(start, end):
+    return Subquery(BookingCounter.objects.filter(client=OuterRef('pk'), start=start, end=end).values('count')[:1])
+
+
+#Adds `delta` to every counter of the client whose window contains booked_at, in any timezone
+def increment_counters(client_id, booked_at, delta=1):
+    counters = BookingCounter.objects.filter(client_id=client_id, start__lte=booked_at, end__gt=booked_at)
+    if delta < 0:
+        counters = counters.filter(count__gte=-delta)
+    counters.update(count=F('count') + delta)
+
+
+#Counts a batch of new bookings into the existing counters of their clients, in one UPDATE
+def increment_counters_for(bookings):
+    client_ids = {b.client_id for b in bookings}
+    new = bookings_in_window(OuterRef('client'), OuterRef('start'), OuterRef('end'), id__in=[b.id for b in bookings])
+    BookingCounter.objects.filter(client_id__in=client_ids).update(count=F('count') + new)
+
+
+def create_counters(windows):
+
+    '''
+    Creates counters for (client, (start, end), count) tuples in one insert.
+    A count of None is counted from the client's bookings, callers pass the
+    count when they know it (a new client's first bookings). Counters
+    created concurrently are left as they are.
+
+    Run in the transaction that inserted the bookings, after the insert and
+    with the clients locked (lock_clients) unless they were just created, so a
+    concurrent booking is either counted here or increments the new counter.
+    '''
+    BookingCounter.objects.bulk_create([
+        BookingCounter(
+            client=client, start=start, end=end,
+            count=count if count is not None else Booking.objects.filter(client=client, booked_at__gte=start, booked_at__lt=end).count(),
+        )
+        for client, (start, end), count in windows
+    ], ignore_conflicts=True)
+
+
+#Serializes bookings of clients that still have counters to create, a plain SELECT on backends without row locks
+def lock_clients(client_ids):
+    list(Client.objects.select_for_update().filter(id__in=client_ids).values_list('id'))
+
+
+#Live counters whose count differs from the bookings in their window, with the actual count as `actual`
+def stale_counters(now=None):
+    counted = bookings_in_window(OuterRef('client'), OuterRef('start'), OuterRef('end'))
+    return BookingCounter.objects.filter(end__gt=now or timezone.now()).annotate(actual=counted).exclude(count=F('actual'))
+
+
+def rebuild_counters(now=None):
+
+    '''
+    Deletes the counters of windows that have ended, which no limit check
+    reads again, and recounts every other counter from the bookings in one
+    UPDATE. Counters are created lazily by bookings, so none are added here.
+    Needed after writes that skip the model signals and don't count
+    themselves, like the seed command's raw inserts or SQL run by hand.
+
+    Returns (deleted, recounted).
+    '''
+    now = now or timezone.now()
+    deleted, _ = BookingCounter.objects.filter(end__lte=now).delete()
+    counted = bookings_in_window(OuterRef('client'), OuterRef('start'), OuterRef('end'))
+    recounted = BookingCounter.objects.update(count=counted)
+    return deleted, recounted
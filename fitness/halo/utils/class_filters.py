@@ -0,0 +1,97 @@
+from datetime import datetime, time, timedelta
+from django.db.models.functions import Lower
+from django.utils.dateparse import parse_date, parse_datetime
+
+#Query params of GET /classes narrowing the classes listed
+FILTER_PARAMS = ('name', 'instructor', 'from', 'to', 'min_slots')
+
+
+#A local date (its midnight) or datetime in `client_tz`, as an aware datetime
+def _parse_local(value, name, client_tz):
+    try:
+        #Dates first, parse_datetime() takes them too but as a plain midnight
+        day = parse_date(value)
+        moment = parse_datetime(value) if day is None else None
+    except ValueError:
+        moment = day = None
+    if moment is None and day is None:
+        raise ValueError(f"{name} must be an ISO date or datetime.")
+    if moment is None:
+        moment = datetime.combine(day, time.min)
+    if moment.tzinfo is None:
+        moment = client_tz.normalize(client_tz.localize(moment))
+    return moment, day is not None
+
+
+def parse_class_filters(params, client_tz):
+
+    '''
+    Reads the GET /classes filters from the query params: `name` and
+    `instructor` match whole names case-insensitively, `from` and `to` local dates
+    or datetimes in the client's timezone (`to` a date takes in that whole
+    day) and `min_slots` the fewest slots left. Returns a dict with None for
+    the filters not given, raises ValueError for values that don't parse.
+    '''
+    filters = {}
+    for field in ('name', 'instructor'):
+        value = (params.get(field) or '').strip()
+        filters[field] = value.lower() or None
+
+    start = end = None
+    if params.get('from'):
+        start, _ = _parse_local(params['from'], 'from', client_tz)
+    if params.get('to'):
+        end, whole_day = _parse_local(params['to'], 'to', client_tz)
+        if whole_day:
+            end = client_tz.normalize(client_tz.localize(datetime.combine(end.date() + timedelta(days=1), time.min)))
+    if start and end and start >= end:
+        raise ValueError("from must be before to.")
+    filters['start'], filters['end'] = start, end
+
+    min_slots = params.get('min_slots')
+    if min_slots:
+        try:
+            min_slots = int(min_slots)
+        except ValueError:
+            min_slots = -1
+        if min_slots < 0:
+            raise ValueError("min_slots must be a non-negative integer.")
+    filters['min_slots'] = min_slots or None
+    return filters
+
+
+def _matching(queryset, field, value):
+    #Equality on the lowercased field, which the expression indexes on Class serve
+    alias = f'{field}_lower'
+    return queryset.alias(**{alias: Lower(field)}).filter(**{alias: value})
+
+
+def filter_classes(queryset, filters):
+
+    '''
+    Applies parse_class_filters output to a Class queryset. Each filter is
+    written the way its index needs: name and instructor as LOWER() = value
+    (class_name_idx, class_instructor_idx, which also hand the rows over in
+    datetime order), and min_slots together with slots_available > 0, the
+    condition of the partial class_open_idx.
+    '''
+    for field in ('name', 'instructor'):
+        if filters[field]:
+            queryset = _matching(queryset, field, filters[field])
+    if filters['start']:
+        queryset = queryset.filter(datetime__gte=filters['start'])
+    if filters['end']:
+        queryset = queryset.filter(datetime__lt=filters['end'])
+    if filters['min_slots']:
+        queryset = queryset.filter(slots_available__gt=0, slots_available__gte=filters['min_slots'])
+    return queryset
+
+
+#filter_classes for ClassTemplate querysets, by name, instructor and capacity
+def filter_templates(queryset, filters):
+    for field in ('name', 'instructor'):
+        if filters[field]:
+            queryset = _matching(queryset, field, filters[field])
+    if filters['min_slots']:
+        queryset = queryset.filter(slots__gte=filters['min_slots'])
+    return queryset
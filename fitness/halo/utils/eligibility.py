@@ -0,0 +1,101 @@
+from django.db.models import Exists, F, OuterRef
+from django.db.models.functions import Coalesce
+from halo.models import Booking, Client
+from halo.utils.booking_counters import bookings_in_window, window_counter
+
+
+#Clients with their day and week counts, bookings are only counted for windows without a counter
+def _clients_with_counts(emails, today_bounds, week_bounds):
+    return Client.objects.filter(email__in=emails).annotate(
+        day_counter=window_counter(*today_bounds),
+        week_counter=window_counter(*week_bounds),
+    ).annotate(
+        daily_count=Coalesce(F('day_counter'), bookings_in_window(OuterRef('pk'), *today_bounds)),
+        weekly_count=Coalesce(F('week_counter'), bookings_in_window(OuterRef('pk'), *week_bounds)),
+    )
+
+
+#Windows whose counters the booking has to create
+def _new_windows(client, today_bounds, week_bounds):
+    return [
+        bounds for bounds, counter in ((today_bounds, client.day_counter), (week_bounds, client.week_counter))
+        if counter is None
+    ]
+
+
+#Collects everything book_class needs to know about a client in one query
+def get_eligibility(email, name, class_id, today_bounds, week_bounds):
+
+    '''
+    Looks the client up by their unique normalized email together with
+    their day and week booking counters, and returns:
+
+    - client: the Client, or None for an email that never booked
+    - email_taken: the email belongs to a client with a different name
+    - daily_count / weekly_count: bookings inside the given UTC bounds
+    - duplicate: the client already booked the class with `class_id`
+    - new_windows: the (start, end) bounds without a counter yet, counted
+      from the bookings this time and created by the booking (reserve_slot)
+
+    The caller decides the outcome, so the precedence of the error messages
+    stays in the view.
+    '''
+    clients = _clients_with_counts([email], today_bounds, week_bounds)
+    if class_id is not None:
+        clients = clients.annotate(same_class=Exists(Booking.objects.filter(client=OuterRef('pk'), class_booked_id=class_id)))
+
+    client = clients.first()
+    if client is None:
+        return {
+            'client': None, 'email_taken': False, 'daily_count': 0, 'weekly_count': 0, 'duplicate': False,
+            'new_windows': [today_bounds, week_bounds],
+        }
+
+    return {
+        'client': client,
+        'email_taken': client.name != name,
+        'daily_count': client.daily_count,
+        'weekly_count': client.weekly_count,
+        'duplicate': getattr(client, 'same_class', False),
+        'new_windows': _new_windows(client, today_bounds, week_bounds),
+    }
+
+
+#Per-email eligibility for a batch of bookings
+def get_batch_eligibility(emails, class_ids, today_bounds, week_bounds):
+
+    '''
+    Batch version of get_eligibility, in two queries whatever the batch size.
+    Returns a dict of normalized email -> state with:
+
+    - client: the Client, or None for an email that never booked
+    - names: names the email was already used under
+    - daily_count / weekly_count: bookings inside the given UTC bounds
+    - classes: ids among `class_ids` the email already booked
+    - new_windows: as in get_eligibility
+
+    The state is meant to be updated as the batch accepts bookings, so the
+    limits are also counted within the batch itself.
+    '''
+    state = {
+        email: {
+            'client': None, 'names': set(), 'daily_count': 0, 'weekly_count': 0, 'classes': set(),
+            'new_windows': [today_bounds, week_bounds],
+        }
+        for email in emails
+    }
+
+    by_id = {}
+    for client in _clients_with_counts(state, today_bounds, week_bounds):
+        by_id[client.id] = state[client.email]
+        by_id[client.id].update(
+            client=client, names={client.name}, daily_count=client.daily_count, weekly_count=client.weekly_count,
+            new_windows=_new_windows(client, today_bounds, week_bounds),
+        )
+
+    if by_id and class_ids:
+        booked = Booking.objects.filter(client_id__in=by_id, class_booked_id__in=class_ids)
+        for client_id, class_id in booked.values_list('client_id', 'class_booked_id'):
+            by_id[client_id]['classes'].add(class_id)
+
+    return state
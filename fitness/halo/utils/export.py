@@ -0,0 +1,116 @@
+import csv
+import json
+from datetime import datetime, time, timezone as dt_timezone
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from halo.models import Booking
+from halo.utils.validators import parse_class_id
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+CONTENT_TYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+#Column names of the export, and the Booking lookups they are read from
+EXPORT_COLUMNS = (
+    ('booking_id', 'id'),
+    ('booked_at', 'booked_at'),
+    ('client_id', 'client_id'),
+    ('client_name', 'client_name'),
+    ('client_email', 'client_email'),
+    ('class_id', 'class_booked_id'),
+    ('class_name', 'class_booked__name'),
+    ('class_datetime', 'class_booked__datetime'),
+    ('instructor', 'class_booked__instructor'),
+)
+
+
+#An ISO date (midnight UTC) or datetime (UTC when naive), None when empty
+def parse_bound(value, name):
+    if not value:
+        return None
+    try:
+        moment = parse_datetime(value)
+        day = parse_date(value) if moment is None else None
+    except ValueError:
+        #Well formed but not a real date, like 2025-02-30
+        moment = day = None
+    if moment is None and day is None:
+        raise ValueError(f"{name} must be an ISO date or datetime.")
+    if moment is None:
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, dt_timezone.utc)
+    return moment
+
+
+def parse_export_filters(params):
+
+    '''
+    Reads the export filters from a mapping (query params or command
+    options): `start` and `end` bound booked_at (start inclusive, end
+    exclusive), `class_id` picks one class. Raises ValueError for values
+    that don't parse.
+    '''
+    start, end = parse_bound(params.get('start'), 'start'), parse_bound(params.get('end'), 'end')
+
+    class_id = params.get('class_id')
+    if class_id not in (None, ''):
+        class_id = parse_class_id(class_id)
+        if class_id is None:
+            raise ValueError("class_id must be a positive integer.")
+    else:
+        class_id = None
+
+    if start and end and start >= end:
+        raise ValueError("start must be before end.")
+    return {'start': start, 'end': end, 'class_id': class_id}
+
+
+def export_rows(start=None, end=None, class_id=None, chunk_size=None):
+
+    '''
+    Yields the bookings matching the filters as tuples in EXPORT_COLUMNS
+    order, oldest first. The class columns come from the same query (a
+    join), and rows are fetched chunk_size at a time without model
+    instances or the queryset cache, so memory stays flat however many
+    bookings there are.
+    '''
+    bookings = Booking.objects.all()
+    if start is not None:
+        bookings = bookings.filter(booked_at__gte=start)
+    if end is not None:
+        bookings = bookings.filter(booked_at__lt=end)
+    if class_id is not None:
+        bookings = bookings.filter(class_booked_id=class_id)
+
+    chunk_size = chunk_size or getattr(settings, 'HALO_EXPORT_CHUNK_SIZE', 2000)
+    rows = bookings.order_by('id').values_list(*(lookup for _, lookup in EXPORT_COLUMNS))
+    return rows.iterator(chunk_size=chunk_size)
+
+
+def _isoformat(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class _Line:
+    #File-like object csv.writer writes a single row into, returned as a string
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow([_isoformat(value) for value in row])
+
+
+def ndjson_lines(rows):
+    names = [name for name, _ in EXPORT_COLUMNS]
+    for row in rows:
+        yield json.dumps(dict(zip(names, map(_isoformat, row)))) + '\n'
+
+
+def export_lines(fmt, rows):
+    #Lines of the export in `fmt`, one of EXPORT_FORMATS
+    return csv_lines(rows) if fmt == 'csv' else ndjson_lines(rows)
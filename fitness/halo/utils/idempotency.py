@@ -0,0 +1,114 @@
+import hashlib
+import json
+import logging
+import time
+from functools import wraps
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+logger = logging.getLogger('halo')
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+#Marker stored under a key while the first request holding it runs
+IN_FLIGHT = 'in_flight'
+
+
+def get_store():
+    return caches[getattr(settings, 'HALO_IDEMPOTENCY_CACHE', 'default')]
+
+
+#Hash of what the request asks for, so a key reused with another payload is a different entry
+def request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256('|'.join([request.method, request.get_full_path(), body]).encode()).hexdigest()
+
+
+def store_key(key, fingerprint):
+    return 'halo:idempotency:' + hashlib.sha256(f'{key}|{fingerprint}'.encode()).hexdigest()
+
+
+def replay(entry):
+    return Response(entry['data'], status=entry['status'], headers={REPLAYED_HEADER: 'true'})
+
+
+#Waits for the request holding `cache_key`, returns its entry, None if it stored none or IN_FLIGHT on timeout
+def wait_for_result(store, cache_key):
+    deadline = time.monotonic() + getattr(settings, 'HALO_IDEMPOTENCY_WAIT', 10)
+    interval = getattr(settings, 'HALO_IDEMPOTENCY_POLL_INTERVAL', 0.05)
+    while time.monotonic() < deadline:
+        entry = store.get(cache_key)
+        if entry != IN_FLIGHT:
+            return entry
+        time.sleep(interval)
+    return IN_FLIGHT
+
+
+def idempotent(view):
+
+    '''
+    Makes a DRF view replayable with an Idempotency-Key header. The first
+    request with a given key and request fingerprint (method, path and body)
+    runs the view and its response is stored for HALO_IDEMPOTENCY_TTL
+    seconds. Retries get that response back with an Idempotent-Replayed
+    header, without running the view or any query.
+
+    A retry arriving while the first request still runs waits for its
+    response instead of running the view too. The in-flight marker expires
+    after HALO_IDEMPOTENCY_LOCK_TIMEOUT so a crashed worker can't hold a key
+    forever, and if the first request ends without a response to store
+    (a server error or an exception) the next waiter runs the view itself.
+
+    Responses are kept in the HALO_IDEMPOTENCY_CACHE cache, which evicts
+    entries past its TTL or size limit. It has to be shared by all worker
+    processes (e.g. Redis or Memcached) for retries hitting another worker
+    to be replayed and coalesced. Requests without the header are unaffected.
+
+    Put it below @api_view so it gets the parsed request.
+    '''
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return view(request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            logger.warning("Rejected an Idempotency-Key of %d characters.", len(key))
+            return Response(
+                {"error": f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        store = get_store()
+        cache_key = store_key(key, request_fingerprint(request))
+        lock_timeout = getattr(settings, 'HALO_IDEMPOTENCY_LOCK_TIMEOUT', 30)
+
+        while not store.add(cache_key, IN_FLIGHT, lock_timeout):
+            entry = wait_for_result(store, cache_key)
+            if entry == IN_FLIGHT:
+                logger.warning("Request with Idempotency-Key %s is still in progress.", key)
+                return Response(
+                    {"error": "A request with this Idempotency-Key is still in progress."},
+                    status=status.HTTP_409_CONFLICT
+                )
+            if entry is not None:
+                logger.info("Replaying the response of Idempotency-Key %s.", key)
+                return replay(entry)
+            #The first request stored nothing, try to take the key over
+
+        stored = False
+        try:
+            response = view(request, *args, **kwargs)
+            if response.status_code < 500:
+                entry = {'status': response.status_code, 'data': response.data}
+                store.set(cache_key, entry, getattr(settings, 'HALO_IDEMPOTENCY_TTL', 24 * 60 * 60))
+                stored = True
+            return response
+        finally:
+            if not stored:
+                store.delete(cache_key)
+
+    return wrapper
@@ -0,0 +1,136 @@
+import base64
+import json
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.utils.urls import replace_query_param
+
+
+#Page size from the page_size query param, capped at HALO_MAX_PAGE_SIZE
+def get_page_size(request):
+    value = request.GET.get('page_size')
+    if not value:
+        return getattr(settings, 'HALO_PAGE_SIZE', 50)
+
+    size = int(value)   #Raises ValueError for non-numeric sizes
+    if size <= 0:
+        raise ValueError(f"Invalid page size: {value}")
+    return min(size, getattr(settings, 'HALO_MAX_PAGE_SIZE', 200))
+
+
+#Opaque cursor: direction and key values of the row it points at, base64 encoded
+def encode_cursor(direction, values):
+    payload = json.dumps([direction, [str(v) for v in values]], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, key):
+
+    '''
+    Returns (direction, values) for a cursor made by encode_cursor, with the
+    values converted back to the types of the key fields.
+    Raises ValueError for anything that is not such a cursor.
+    '''
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, raw_values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if direction not in ('next', 'prev') or len(raw_values) != len(key):
+            raise ValueError
+        values = [model._meta.get_field(name).to_python(v) for name, v in zip(key, raw_values)]
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+    if any(v is None for v in values):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return direction, values
+
+
+#Rows strictly after (or before) the given key values in the page ordering
+def _beyond(key, values, descending, forward):
+    lookup = 'lt' if descending == forward else 'gt'
+    condition = Q()
+    for i, name in enumerate(key):
+        equal = {key[j]: values[j] for j in range(i)}
+        condition |= Q(**equal, **{f'{name}__{lookup}': values[i]})
+    return condition
+
+
+def _order(key, descending):
+    return [f'-{name}' if descending else name for name in key]
+
+
+#Page size, direction and cursor key values of the request, (size, None, None) for the first page
+def page_request(request, model, key):
+    size = get_page_size(request)
+    cursor = request.GET.get('cursor')
+    if not cursor:
+        return size, None, None
+    direction, values = decode_cursor(cursor, model, key)
+    return size, direction, values
+
+
+#Rows beyond the cursor in the order they are read in, size + 1 so cut_page can tell if there are more
+def keyset_query(queryset, key, size, direction, values, descending=False):
+    if direction is None:
+        return queryset.order_by(*_order(key, descending))[:size + 1]
+    forward = direction == 'next'
+    ordering = _order(key, descending if forward else not descending)
+    return queryset.filter(_beyond(key, values, descending, forward)).order_by(*ordering)[:size + 1]
+
+
+#Sliced queryset for the requested page and the state needed to cut it
+def _page_query(queryset, request, key, descending):
+    size, direction, values = page_request(request, queryset.model, key)
+    return keyset_query(queryset, key, size, direction, values, descending), size, direction
+
+
+#Trims the extra row and works out the cursors of the neighbouring pages
+def cut_page(rows, size, direction, key):
+    has_more = len(rows) > size
+    rows = rows[:size]
+    if direction is None:
+        has_next, has_prev = has_more, False
+    elif direction == 'next':
+        has_next, has_prev = has_more, True
+    else:
+        rows.reverse()
+        has_next, has_prev = True, has_more
+
+    def cursor_for(row, direction):
+        #Rows are model instances, or dicts for .values() querysets
+        values = [row[name] for name in key] if isinstance(row, dict) else [getattr(row, name) for name in key]
+        return encode_cursor(direction, values)
+
+    next_cursor = cursor_for(rows[-1], 'next') if rows and has_next else None
+    prev_cursor = cursor_for(rows[0], 'prev') if rows and has_prev else None
+    return rows, next_cursor, prev_cursor
+
+
+def paginate_keyset(queryset, request, key, descending=False):
+
+    '''
+    Returns one page of `queryset` ordered by the `key` fields, plus the
+    opaque cursors of the neighbouring pages (None when there is none).
+
+    Pages are found with a WHERE on the key values of the cursor row rather
+    than an OFFSET, so every page costs the same however deep the client goes.
+    The last key field must be unique (e.g. the primary key).
+    '''
+    query, size, direction = _page_query(queryset, request, key, descending)
+    return cut_page(list(query), size, direction, key)
+
+
+#paginate_keyset for async views, the page is read with async iteration
+async def apaginate_keyset(queryset, request, key, descending=False):
+    query, size, direction = _page_query(queryset, request, key, descending)
+    return cut_page([row async for row in query], size, direction, key)
+
+
+#RFC 8288 Link header pointing at the neighbouring pages
+def build_link_header(request, next_cursor, prev_cursor):
+    url = request.build_absolute_uri()
+    links = []
+    if next_cursor:
+        links.append(f'<{replace_query_param(url, "cursor", next_cursor)}>; rel="next"')
+    if prev_cursor:
+        links.append(f'<{replace_query_param(url, "cursor", prev_cursor)}>; rel="prev"')
+    return ', '.join(links)
@@ -0,0 +1,170 @@
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from rest_framework import status
+from halo.utils.validators import normalize_email
+
+logger = logging.getLogger('halo')
+
+#Budgets used for scopes missing from HALO_RATE_LIMITS: (requests, per seconds)
+DEFAULT_BUDGET = (60, 60)
+
+
+#Tokens left after refilling a bucket from `tokens` at `stamp` until `now`
+def refill(tokens, stamp, now, capacity, rate):
+    return min(capacity, tokens + (now - stamp) * rate)
+
+
+class LocalBucketStore:
+
+    '''
+    Token buckets in a dict of this process, least recently used buckets
+    dropped past `max_keys` (a dropped bucket comes back full).
+    Each worker process counts on its own.
+    '''
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+
+    def take(self, key, capacity, rate):
+        #Takes a token, returns 0 or the seconds until the bucket has one again
+        now = time.monotonic()
+        with self.lock:
+            tokens, stamp = self.buckets.pop(key, (capacity, now))
+            tokens = refill(tokens, stamp, now, capacity, rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            self.buckets[key] = (tokens - 1 if not wait else tokens, now)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return wait
+
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+
+class CacheBucketStore:
+
+    '''
+    Token buckets in a Django cache, shared by every process using it.
+    The read and write of a bucket aren't atomic, so concurrent requests
+    can slip a few past the budget. Buckets expire once they'd be full again.
+    '''
+
+    def __init__(self, cache):
+        self.cache = cache
+
+
+    def take(self, key, capacity, rate):
+        now = time.time()
+        tokens, stamp = self.cache.get(key, (capacity, now))
+        tokens = refill(tokens, stamp, now, capacity, rate)
+        wait = 0 if tokens >= 1 else (1 - tokens) / rate
+        self.cache.set(key, (tokens - 1 if not wait else tokens, now), math.ceil(capacity / rate) + 1)
+        return wait
+
+
+    def clear(self):
+        self.cache.clear()
+
+
+
+_local_store = LocalBucketStore()
+
+
+def get_bucket_store():
+    alias = getattr(settings, 'HALO_RATE_LIMIT_CACHE', None)
+    return CacheBucketStore(caches[alias]) if alias else _local_store
+
+
+def client_ip(request):
+    header = getattr(settings, 'HALO_RATE_LIMIT_IP_HEADER', None)
+    if header and request.META.get(header):
+        #e.g. X-Forwarded-For set by a trusted proxy, the first entry is the client
+        return request.META[header].split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def check_rate_limit(request, scope, get_email=None):
+
+    '''
+    Takes a token from the scope's bucket of the client IP and, when
+    `get_email` finds one in the request, of the client email. Returns None
+    if both had one, otherwise the seconds to wait before retrying.
+    '''
+    if not getattr(settings, 'HALO_RATE_LIMIT_ENABLED', True):
+        return None
+
+    requests, per = getattr(settings, 'HALO_RATE_LIMITS', {}).get(scope, DEFAULT_BUDGET)
+    rate = requests / per
+    store = get_bucket_store()
+
+    keys = [f'halo:rate:{scope}:ip:{client_ip(request)}']
+    email = get_email(request) if get_email else None
+    if isinstance(email, str) and email.strip():
+        keys.append(f'halo:rate:{scope}:email:{normalize_email(email)}')
+
+    wait = max(store.take(key, requests, rate) for key in keys)
+    if wait:
+        logger.warning("Rate limited %s on %s (%s), retry in %.1fs.", client_ip(request), scope, email, wait)
+        return wait
+    return None
+
+
+#Plain JsonResponse so both DRF and async views can return it
+def too_many_requests(wait):
+    retry_after = max(math.ceil(wait), 1)
+    response = JsonResponse(
+        {"error": f"Too many requests. Try again in {retry_after} seconds."},
+        status=status.HTTP_429_TOO_MANY_REQUESTS
+    )
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limited(scope, get_email=None):
+
+    '''
+    Rejects requests over the HALO_RATE_LIMITS budget of `scope` with a 429
+    and a Retry-After header, before the view runs any query. Budgets are
+    (requests, per seconds) token buckets per client IP and, with
+    `get_email`, per client email, so neither a script rotating emails nor
+    one spread over several addresses gets past it.
+
+    Put it right below @api_view (sync views) or the method decorator
+    (async views) so rejected requests stop there.
+    '''
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if getattr(settings, 'HALO_RATE_LIMIT_CACHE', None):
+                    wait = await sync_to_async(check_rate_limit)(request, scope, get_email)
+                else:
+                    wait = check_rate_limit(request, scope, get_email)
+                if wait:
+                    return too_many_requests(wait)
+                return await view(request, *args, **kwargs)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            wait = check_rate_limit(request, scope, get_email)
+            if wait:
+                return too_many_requests(wait)
+            return view(request, *args, **kwargs)
+        return wrapper
+
+    return decorator
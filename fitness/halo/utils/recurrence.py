@@ -0,0 +1,229 @@
+import re
+from datetime import datetime, timedelta
+import pytz
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from halo.models import Class, ClassTemplate
+from halo.utils.pagination import page_request, keyset_query, cut_page
+from halo.utils.timezone import resolve_timezone
+from halo.utils.class_filters import filter_templates
+
+#Sort key of GET /classes, template occurrences use -template_id as their id in it
+SCHEDULE_KEY = ('datetime', 'id')
+
+#Id of an occurrence without a Class row yet: t<template id>-<UTC start>, e.g. t3-20250106T0130
+OCCURRENCE_KEY = re.compile(r'^t(\d+)-(\d{8}T\d{4})$')
+OCCURRENCE_TIME_FORMAT = '%Y%m%dT%H%M'
+
+
+def occurrence_key(template_id, moment):
+    return f"t{template_id}-{moment.astimezone(pytz.UTC).strftime(OCCURRENCE_TIME_FORMAT)}"
+
+
+#(template id, UTC start) of an occurrence key, None for anything else
+def parse_occurrence_key(value):
+    match = OCCURRENCE_KEY.match(value) if isinstance(value, str) else None
+    if match is None:
+        return None
+    try:
+        moment = datetime.strptime(match.group(2), OCCURRENCE_TIME_FORMAT)
+    except ValueError:
+        return None
+    return int(match.group(1)), pytz.UTC.localize(moment)
+
+
+def expand(template, start, end):
+
+    '''
+    Yields the UTC start times of the template's occurrences between `start`
+    and `end` (both included), in order. Occurrences keep their local start
+    time across DST changes, so their UTC time moves with the offset.
+    Seconds of the start time are dropped, occurrence keys only go down to
+    the minute.
+    '''
+    tz = resolve_timezone(template.timezone) or pytz.UTC
+    #A day of slack on both sides, local dates can differ from the UTC ones
+    first = max(start.astimezone(tz).date() - timedelta(days=1), template.starts_on)
+    last = end.astimezone(tz).date() + timedelta(days=1)
+    if template.ends_on is not None:
+        last = min(last, template.ends_on)
+
+    start_time = template.start_time.replace(second=0, microsecond=0)
+    day = first + timedelta(days=(template.weekday - first.weekday()) % 7)
+    while day <= last:
+        moment = tz.normalize(tz.localize(datetime.combine(day, start_time))).astimezone(pytz.UTC)
+        if start <= moment <= end:
+            yield moment
+        day += timedelta(days=7)
+
+
+#Templates with dates between `start` and `end`, give or take the day of slack expand() takes
+def active_templates(start, end, filters=None):
+    templates = ClassTemplate.objects.filter(
+        Q(ends_on__isnull=True) | Q(ends_on__gte=start.date() - timedelta(days=1)),
+        starts_on__lte=end.date() + timedelta(days=1),
+    )
+    return filter_templates(templates, filters) if filters else templates
+
+
+#Same fields as a Class.objects.values(*CLASS_FIELDS) row, the id being the occurrence key
+def occurrence_row(template, moment):
+    return {
+        'id': occurrence_key(template.id, moment),
+        'datetime': moment,
+        'name': template.name,
+        'instructor': template.instructor,
+        'slots_available': template.slots,
+    }
+
+
+#Latest start of the occurrences listed and bookable from `now`
+def occurrence_horizon(now):
+    return now + timedelta(days=getattr(settings, 'HALO_OCCURRENCE_HORIZON_DAYS', 28))
+
+
+def _value(row, name):
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+
+def _window(rows, size, direction, values, now, filters):
+
+    '''
+    (start, end) of the occurrences that can make it onto the page: upcoming,
+    within HALO_OCCURRENCE_HORIZON_DAYS and the from/to filters, beyond the
+    cursor, and not past the extra row when the classes read already fill
+    the page.
+    '''
+    start, end = now, occurrence_horizon(now)
+    if filters and filters['start']:
+        start = max(start, filters['start'])
+    if filters and filters['end']:
+        end = min(end, filters['end'] - timedelta(microseconds=1))
+    if direction == 'next':
+        start = max(start, values[0])
+    elif direction == 'prev':
+        end = min(end, values[0])
+
+    if len(rows) > size:
+        bound = _value(rows[-1], 'datetime')
+        if direction == 'prev':
+            start = max(start, bound)
+        else:
+            end = min(end, bound)
+    return start, end
+
+
+def _occurrences(templates, start, end):
+    return [(template, moment) for template in templates for moment in expand(template, start, end)]
+
+
+#Query of the (template, datetime) pairs among `occurrences` that already have a Class row
+def _materialized(occurrences):
+    start = min(moment for _, moment in occurrences)
+    end = max(moment for _, moment in occurrences)
+    return Class.objects.filter(
+        template_id__in={template.id for template, _ in occurrences}, datetime__range=(start, end)
+    ).values_list('template_id', 'datetime')
+
+
+def _merge(rows, occurrences, materialized, size, direction, values):
+    #Entries sorted on the page key, with the row they stand for
+    entries = [{'datetime': _value(row, 'datetime'), 'id': _value(row, 'id'), 'row': row} for row in rows]
+    forward = direction != 'prev'
+    for template, moment in occurrences:
+        if (template.id, moment) in materialized:
+            continue
+        entry_key = (moment, -template.id)
+        if values is None or (entry_key > tuple(values) if forward else entry_key < tuple(values)):
+            entries.append({'datetime': moment, 'id': -template.id, 'row': occurrence_row(template, moment)})
+
+    entries.sort(key=lambda entry: (entry['datetime'], entry['id']), reverse=not forward)
+    page, next_cursor, prev_cursor = cut_page(entries[:size + 1], size, direction, SCHEDULE_KEY)
+    return [entry['row'] for entry in page], next_cursor, prev_cursor
+
+
+def paginate_schedule(queryset, request, filters=None, now=None):
+
+    '''
+    paginate_keyset over the upcoming classes in `queryset` merged with the
+    occurrences of the class templates that have no Class row yet, which
+    come as .values()-style dicts whose id is their occurrence key.
+    Nothing is written: occurrences are expanded for the page being read
+    only, and get a row once booked (see find_occurrences).
+
+    Occurrences sort on (datetime, -template id), so the cursors stay the
+    same (datetime, id) pairs. They are listed up to
+    HALO_OCCURRENCE_HORIZON_DAYS ahead, narrowed by the parse_class_filters
+    `filters` the queryset was filtered with.
+    '''
+    now = now or timezone.now()
+    size, direction, values = page_request(request, Class, SCHEDULE_KEY)
+    rows = list(keyset_query(queryset, SCHEDULE_KEY, size, direction, values))
+
+    start, end = _window(rows, size, direction, values, now, filters)
+    occurrences = _occurrences(active_templates(start, end, filters), start, end) if start <= end else []
+    materialized = set(_materialized(occurrences)) if occurrences else set()
+    return _merge(rows, occurrences, materialized, size, direction, values)
+
+
+#paginate_schedule for async views, with the queries on the async ORM
+async def apaginate_schedule(queryset, request, filters=None, now=None):
+    now = now or timezone.now()
+    size, direction, values = page_request(request, Class, SCHEDULE_KEY)
+    rows = [row async for row in keyset_query(queryset, SCHEDULE_KEY, size, direction, values)]
+
+    start, end = _window(rows, size, direction, values, now, filters)
+    occurrences = _occurrences([t async for t in active_templates(start, end, filters)], start, end) if start <= end else []
+    materialized = {pair async for pair in _materialized(occurrences)} if occurrences else set()
+    return _merge(rows, occurrences, materialized, size, direction, values)
+
+
+def find_occurrences(keys, now=None):
+
+    '''
+    Returns {occurrence key: Class} for the keys naming an occurrence of an
+    existing template, upcoming and within HALO_OCCURRENCE_HORIZON_DAYS as
+    listed by GET /classes. Keys that don't are left out.
+
+    Nothing is written: an occurrence booked before comes as its row, one
+    that never was as an unsaved Class with no bookings, whose row the
+    booking creates (see materialize_occurrence).
+    '''
+    now = now or timezone.now()
+    horizon = occurrence_horizon(now)
+    occurrences = {key: parse_occurrence_key(key) for key in {key for key in keys if isinstance(key, str)}}
+    occurrences = {key: occurrence for key, occurrence in occurrences.items() if occurrence and now <= occurrence[1] <= horizon}
+    if not occurrences:
+        return {}
+
+    templates = ClassTemplate.objects.in_bulk({template_id for template_id, _ in occurrences.values()})
+    occurrences = {
+        key: (templates[template_id], moment) for key, (template_id, moment) in occurrences.items()
+        if template_id in templates and moment in expand(templates[template_id], moment, moment)
+    }
+    if not occurrences:
+        return {}
+
+    rows = {(cls.template_id, cls.datetime): cls for cls in Class.objects.filter(
+        template_id__in={template.id for template, _ in occurrences.values()},
+        datetime__in={moment for _, moment in occurrences.values()},
+    )}
+    return {
+        key: rows.get((template.id, moment)) or Class(
+            template=template, datetime=moment, name=template.name, instructor=template.instructor, slots_available=template.slots,
+        )
+        for key, (template, moment) in occurrences.items()
+    }
+
+
+#Class row of an occurrence from find_occurrences, created by its first booking.
+#Concurrent first bookings share one row through unique_template_occurrence
+def materialize_occurrence(cls):
+    if cls.pk is not None:
+        return cls
+    row, _ = Class.objects.get_or_create(
+        template=cls.template, datetime=cls.datetime,
+        defaults={'name': cls.name, 'instructor': cls.instructor, 'slots_available': cls.slots_available},
+    )
+    return row
@@ -0,0 +1,95 @@
+import time
+from contextvars import ContextVar
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+#Metrics of the request being handled in this context, None outside the timing middleware
+_current = ContextVar('halo_request_metrics', default=None)
+
+
+class RequestMetrics:
+
+    '''
+    Query count, DB time and serializer time of one request, times in seconds.
+    `sql` keeps (statement, seconds) for every query so slow requests can be
+    logged with their SQL.
+    '''
+    __slots__ = ('queries', 'db_time', 'serializer_time', 'sql')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.sql = []
+
+
+def start_request():
+    #Starts collecting for the current context, returns (metrics, token for end_request)
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+#Execute wrapper timing every query run while a request is being measured
+def record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        metrics.queries += 1
+        metrics.db_time += duration
+        metrics.sql.append((sql, duration))
+
+
+def _add_wrapper(connection, **kwargs):
+    #Outermost, so the LIFO pop of an execute_wrapper() block open across a reconnect still removes its own wrapper
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+def install_query_recorder():
+
+    '''
+    Adds record_query to this thread's open connections and to every
+    connection opened from now on, in any thread. The async ORM runs queries
+    on a worker thread, the context variable follows them there.
+    '''
+    for connection in connections.all(initialized_only=True):
+        _add_wrapper(connection)
+    connection_created.connect(_add_wrapper, dispatch_uid='halo_record_query')
+
+
+class _SerializerTimer:
+    __slots__ = ('metrics', 'started')
+
+    def __enter__(self):
+        self.metrics = _current.get()
+        if self.metrics is not None:
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.metrics is not None:
+            self.metrics.serializer_time += time.perf_counter() - self.started
+        return False
+
+
+def serializer_timer():
+
+    '''
+    Adds the time spent in the block to the request's serializer time:
+
+        with serializer_timer():
+            data = serializer.data
+
+    Costs one context variable lookup when no request is being measured.
+    '''
+    return _SerializerTimer()
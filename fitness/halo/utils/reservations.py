@@ -0,0 +1,86 @@
+from django.db import transaction, IntegrityError
+from django.db.models import F
+from halo.models import Class, Booking, Client
+from halo.utils.schedule_cache import bump_schedule_version
+from halo.utils.booking_counters import create_counters, lock_clients
+from halo.utils.availability import next_slots_version
+from halo.utils.slot_events import notify_slot_change
+from halo.utils.recurrence import materialize_occurrence
+
+#Outcomes of a slot reservation attempt
+RESERVED = 'reserved'
+SOLD_OUT = 'sold_out'
+RACE_LOST = 'race_lost'
+DUPLICATE = 'duplicate'
+EMAIL_TAKEN = 'email_taken'
+
+
+#Creates the client of a first booking, or returns the one a concurrent request just created,
+#None if that one is under another name
+def get_or_create_client(email, name):
+    try:
+        with transaction.atomic():
+            return Client.objects.create(email=email, name=name), True
+    except IntegrityError:
+        client = Client.objects.get(email=email)
+        return (client if client.name == name else None), False
+
+
+#Reserves one slot of a class and creates the booking
+def reserve_slot(cls, name, email, client=None, new_windows=()):
+
+    '''
+    Decrements slots_available with a single conditional UPDATE and inserts
+    the booking in the same transaction, so a class can never be oversold.
+
+    `cls` is the row the caller already loaded, or the unsaved Class of a
+    template occurrence never booked before (see find_occurrences), whose
+    row is created in the same transaction. If it showed no free slots the
+    class is sold out. If it showed free slots but the UPDATE matched no rows,
+    another request took the last slot in between and this one lost the race.
+    A concurrent booking of the same class by the same email trips the unique
+    constraint and rolls the decrement back as DUPLICATE.
+
+    `client` is the Client owning `email`, or None if the caller found none,
+    in which case it is created in the same transaction. If a concurrent
+    request created it under another name first, the decrement is rolled
+    back as EMAIL_TAKEN. Saving the booking updates the client's booking
+    counters, and the counters of `new_windows` ((start, end) bounds the
+    caller found none for) are created.
+
+    Returns a tuple of (outcome, booking), booking being None unless RESERVED.
+    '''
+    if cls.slots_available <= 0:
+        return SOLD_OUT, None
+
+    try:
+        with transaction.atomic():
+            cls = materialize_occurrence(cls)
+            updated = Class.objects.filter(id=cls.id, slots_available__gt=0).update(
+                slots_available=F('slots_available') - 1, slots_version=next_slots_version()
+            )
+            if not updated:
+                return RACE_LOST, None
+            transaction.on_commit(bump_schedule_version)   #update() skips the model signals
+            transaction.on_commit(notify_slot_change)
+
+            created = False
+            if client is None:
+                client, created = get_or_create_client(email, name)
+                if client is None:
+                    transaction.set_rollback(True)
+                    return EMAIL_TAKEN, None
+            if new_windows and not created:
+                lock_clients([client.id])
+
+            booking = Booking.objects.create(
+                class_booked=cls,
+                client=client,
+                client_name=name,
+                client_email=email
+            )
+            create_counters((client, bounds, 1 if created else None) for bounds in new_windows)
+    except IntegrityError:
+        return DUPLICATE, None
+
+    return RESERVED, booking
@@ -0,0 +1,115 @@
+import hashlib
+import json
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from halo.utils.class_filters import FILTER_PARAMS
+
+SCHEDULE_VERSION_KEY = 'halo:schedule_version'
+
+
+#Current schedule version, bumped on every write that can change GET /classes
+def get_schedule_version():
+    version = cache.get(SCHEDULE_VERSION_KEY)
+    if version is None:
+        cache.add(SCHEDULE_VERSION_KEY, 1, timeout=None)
+        version = cache.get(SCHEDULE_VERSION_KEY, 1)
+    return version
+
+
+async def aget_schedule_version():
+    version = await cache.aget(SCHEDULE_VERSION_KEY)
+    if version is None:
+        await cache.aadd(SCHEDULE_VERSION_KEY, 1, timeout=None)
+        version = await cache.aget(SCHEDULE_VERSION_KEY, 1)
+    return version
+
+
+def bump_schedule_version():
+
+    '''
+    Invalidates every cached GET /classes page by moving to a new version.
+    Model signals call this after commit; code that writes with update() or
+    bulk_create() must call it itself since those skip the signals.
+    '''
+    try:
+        cache.incr(SCHEDULE_VERSION_KEY)
+    except ValueError:
+        #Key missing or evicted, start a fresh version that no cached page uses
+        if not cache.add(SCHEDULE_VERSION_KEY, int(timezone.now().timestamp() * 1000), timeout=None):
+            cache.incr(SCHEDULE_VERSION_KEY)
+
+
+def _page_key(version, request, client_tz):
+    parts = [
+        str(version),
+        str(client_tz),
+        request.GET.get('page_size', ''),
+        request.GET.get('cursor', ''),
+        *(request.GET.get(param, '') for param in FILTER_PARAMS),
+    ]
+    return 'halo:classes:' + hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+
+#Cache key of one GET /classes response variant
+def page_cache_key(request, client_tz):
+    return _page_key(get_schedule_version(), request, client_tz)
+
+
+async def apage_cache_key(request, client_tz):
+    return _page_key(await aget_schedule_version(), request, client_tz)
+
+
+#The cached entry, or None if missing or its first class has started since
+def _fresh(entry):
+    if entry is None:
+        return None
+    if entry['valid_until'] is not None and entry['valid_until'] <= timezone.now():
+        return None
+    return entry
+
+
+def get_cached_page(key):
+    return _fresh(cache.get(key))
+
+
+async def aget_cached_page(key):
+    return _fresh(await cache.aget(key))
+
+
+#(entry, seconds to cache it for) of a rendered page, see store_page
+def _page_entry(data, next_cursor, prev_cursor, valid_until):
+    body = json.dumps([data, next_cursor, prev_cursor], sort_keys=True, default=str)
+    entry = {
+        'data': data,
+        'next': next_cursor,
+        'prev': prev_cursor,
+        'etag': '"%s"' % hashlib.sha256(body.encode()).hexdigest()[:32],
+        'valid_until': valid_until,
+    }
+
+    timeout = getattr(settings, 'HALO_SCHEDULE_CACHE_TIMEOUT', 300)
+    if valid_until is not None:
+        timeout = min(timeout, max((valid_until - timezone.now()).total_seconds(), 0))
+    return entry, timeout
+
+
+def store_page(key, data, next_cursor=None, prev_cursor=None, valid_until=None):
+
+    '''
+    Caches a rendered page with a strong ETag over its content.
+    `valid_until` is the datetime of the earliest class on the page, the
+    moment it drops out of the upcoming list without any write happening.
+    '''
+    entry, timeout = _page_entry(data, next_cursor, prev_cursor, valid_until)
+    if timeout > 0:
+        cache.set(key, entry, timeout)
+    return entry
+
+
+#store_page for async views, on the cache's async API
+async def astore_page(key, data, next_cursor=None, prev_cursor=None, valid_until=None):
+    entry, timeout = _page_entry(data, next_cursor, prev_cursor, valid_until)
+    if timeout > 0:
+        await cache.aset(key, entry, timeout)
+    return entry
@@ -0,0 +1,299 @@
+import asyncio
+import contextvars
+import json
+import logging
+from collections import deque
+from contextlib import aclosing
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http.request import split_domain_port, validate_host
+from halo.utils.availability import availability
+
+logger = logging.getLogger('halo')
+
+#Broker of each event loop serving streams, notified from any thread
+_brokers = {}
+
+
+class Subscriber:
+
+    '''
+    Batches waiting to be sent on one stream. A stream that falls more than
+    HALO_SSE_MAX_PENDING batches behind drops them and catches up from the
+    database instead, so a slow client can't hold memory.
+    '''
+
+    def __init__(self):
+        self.batches = deque()
+        self.lagging = False
+        self.ready = asyncio.Event()
+
+
+    def push(self, batch):
+        if len(self.batches) >= getattr(settings, 'HALO_SSE_MAX_PENDING', 100):
+            self.batches.clear()
+            self.lagging = True
+        else:
+            self.batches.append(batch)
+        self.ready.set()
+
+
+
+class SlotBroker:
+
+    '''
+    Fans slot changes out to the streams of one event loop. A single pump
+    task reads the changes since the last version it saw with one query
+    (see utils.availability) and hands the batch to every subscriber, so
+    the database sees one query per change however many streams are open.
+
+    The pump wakes when a booking of this process commits (notify_slot_change)
+    and every HALO_SSE_POLL_INTERVAL seconds to pick up writes from other
+    processes. It stops, and the broker goes, with the last subscriber.
+
+    Streams starting together (say every kiosk reconnecting after a deploy)
+    share one read too, per starting version, see read().
+    '''
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.subscribers = set()
+        self.wake = asyncio.Event()
+        self.version = None     #Set by the first stream's starting version
+        self.pump = None
+        self.pushed = 0         #Batches handed out so far
+        self.reading = {}       #Reads in flight by their since, with the value of pushed when each began
+
+
+    def subscribe(self):
+        subscriber = Subscriber()
+        self.subscribers.add(subscriber)
+        if self.pump is None:
+            #A context of its own, not the request's that happened to start it
+            self.pump = self.loop.create_task(self.run(), context=contextvars.Context())
+        return subscriber
+
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+        if not self.subscribers:
+            #The next stream of this loop starts a new broker
+            self.pump.cancel()
+            if _brokers.get(self.loop) is self:
+                del _brokers[self.loop]
+
+
+    def seen(self, version):
+        #A stream starts at `version`, the pump must not be past it or the changes in between would be lost
+        if self.version is None or version < self.version:
+            self.version = version
+
+
+    def read(self, since=None):
+
+        '''
+        Awaitable of the batch a stream starts, or catches up, from: the
+        changes since `since`, the full snapshot without one. A read of the
+        same `since` in flight is shared as long as no batch went out since
+        it began, as a stream joining it then could miss that batch's changes.
+        '''
+        reading = self.reading.get(since)
+        if reading is None or reading[1] != self.pushed:
+            task = self.loop.create_task(read_batch(since), context=contextvars.Context())
+            reading = self.reading[since] = (task, self.pushed)
+            task.add_done_callback(lambda task: self._read(since, task))
+        #Shielded, a stream going away must not cancel the read for the others
+        return asyncio.shield(reading[0])
+
+
+    def _read(self, since, task):
+        #Forgets a finished read, unless a newer one of the same since replaced it
+        if self.reading.get(since, (None,))[0] is task:
+            del self.reading[since]
+
+
+    async def run(self):
+        interval = getattr(settings, 'HALO_SSE_POLL_INTERVAL', 5)
+        while True:
+            try:
+                await asyncio.wait_for(self.wake.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wake.clear()
+            if self.version is None:
+                continue
+
+            try:
+                batch = await read_batch(self.version)
+            except Exception:
+                logger.exception("Reading slot changes for the event streams failed.")
+                continue
+            if batch['version'] <= self.version and not batch['full']:
+                continue
+            self.version = batch['version']
+            self.pushed += 1
+            for subscriber in self.subscribers:
+                subscriber.push(batch)
+
+
+def _read_batch(since):
+    batch = availability(since)
+    batch['event'] = format_event(batch).encode()
+    return batch
+
+
+async def read_batch(since):
+    #availability() with its event bytes, built once however many streams send it. On the shared
+    #executor: thread-sensitive calls would hold a thread, and its connection, per open stream
+    return await sync_to_async(_read_batch, thread_sensitive=False)(since)
+
+
+def get_broker():
+    loop = asyncio.get_running_loop()
+    broker = _brokers.get(loop)
+    if broker is None:
+        broker = _brokers[loop] = SlotBroker(loop)
+    return broker
+
+
+def notify_slot_change():
+
+    '''
+    Wakes the brokers of this process after a write changing slots has
+    committed, from any thread. Costs nothing while no stream is open.
+    '''
+    for loop, broker in list(_brokers.items()):
+        try:
+            loop.call_soon_threadsafe(broker.wake.set)
+        except RuntimeError:
+            #The loop was closed without its pump finishing
+            _brokers.pop(loop, None)
+
+
+#An SSE event, the slots version as its id for Last-Event-ID
+def format_event(batch):
+    event = 'snapshot' if batch['full'] else 'slots'
+    data = json.dumps(batch['classes'], separators=(',', ':'))
+    return f"id: {batch['version']}\nevent: {event}\ndata: {data}\n\n"
+
+
+async def slot_event_stream(since=None):
+
+    '''
+    Yields the SSE stream, as bytes, of slot changes of upcoming classes: first the
+    classes changed since `since` (every upcoming class, as a `snapshot`
+    event, without one), then a `slots` event per batch of changes. Each
+    data is a list of [id, slots_available] pairs, as in GET /availability.
+
+    Event ids are slots versions, so a client reconnecting with
+    Last-Event-ID gets whatever it missed from the database, whichever
+    worker it lands on. Comment lines every HALO_SSE_HEARTBEAT seconds keep
+    idle connections open through proxies.
+    '''
+    broker = get_broker()
+    subscriber = broker.subscribe()     #Before reading the start, so no change falls in between
+    heartbeat = getattr(settings, 'HALO_SSE_HEARTBEAT', 15)
+    try:
+        yield f"retry: {getattr(settings, 'HALO_SSE_RETRY_MS', 3000)}\n\n".encode()
+
+        batch = await broker.read(since)
+        version = batch['version']
+        broker.seen(version)
+        if batch['full'] or batch['classes'] or since != version:
+            yield batch['event']
+
+        while True:
+            #A timer rather than wait_for(), which would start a task per stream on every change
+            timer = broker.loop.call_later(heartbeat, subscriber.ready.set)
+            await subscriber.ready.wait()
+            timer.cancel()
+            subscriber.ready.clear()
+            if not subscriber.batches and not subscriber.lagging:
+                yield b": keepalive\n\n"
+                continue
+
+            if subscriber.lagging:
+                subscriber.lagging = False
+                subscriber.batches.clear()
+                batches = [await broker.read(version)]
+            else:
+                batches = list(subscriber.batches)
+                subscriber.batches.clear()
+
+            for batch in batches:
+                if batch['version'] > version or batch['full']:
+                    version = batch['version']
+                    yield batch['event']
+    finally:
+        broker.unsubscribe(subscriber)
+
+
+#Whether the request's Host is in ALLOWED_HOSTS, as Django would check it
+def _allowed_host(scope, headers):
+    host = headers.get(b'host', b'').decode('latin-1')
+    if not host and scope.get('server'):
+        host = '%s:%s' % tuple(scope['server'])
+    allowed = settings.ALLOWED_HOSTS
+    if settings.DEBUG and not allowed:
+        allowed = ['.localhost', '127.0.0.1', '[::1]']
+    domain, _ = split_domain_port(host)
+    return bool(domain) and validate_host(domain, allowed)
+
+
+async def _respond(send, status, error, headers=()):
+    await send({'type': 'http.response.start', 'status': status, 'headers': [(b'content-type', b'application/json'), *headers]})
+    await send({'type': 'http.response.body', 'body': json.dumps({'error': error}).encode()})
+
+
+async def slot_events_app(scope, receive, send):
+
+    '''
+    ASGI app of GET /events/slots, routed to by fitness.asgi ahead of
+    Django: its request handling holds a thread for each request in flight,
+    and a stream is in flight for as long as it's open. Here an idle stream
+    is a task waiting on its subscriber. Resumes from Last-Event-ID, or
+    ?since= for clients that can't set headers.
+    '''
+    headers = dict(scope['headers'])
+    if not _allowed_host(scope, headers):
+        logger.warning("Event stream requested for a host not in ALLOWED_HOSTS.")
+        return await _respond(send, 400, "Invalid host.")
+    if scope['method'] != 'GET':
+        return await _respond(send, 405, "Method not allowed.", [(b'allow', b'GET')])
+
+    since = headers.get(b'last-event-id', b'').decode('latin-1') or parse_qs(scope['query_string'].decode('latin-1')).get('since', [None])[0]
+    if since is not None:
+        try:
+            since = int(since)
+            if since < 0:
+                raise ValueError
+        except ValueError:
+            logger.warning("Invalid event stream version: %s.", since)
+            return await _respond(send, 400, "Last-Event-ID must be the id of a previous event.")
+
+    async def stream():
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),     #Proxies like nginx would hold events back otherwise
+        ]})
+        async with aclosing(slot_event_stream(since)) as events:
+            async for event in events:
+                await send({'type': 'http.response.body', 'body': event, 'more_body': True})
+
+    async def disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    #Streams until the client goes away, or the stream fails
+    sending, listening = asyncio.ensure_future(stream()), asyncio.ensure_future(disconnect())
+    try:
+        await asyncio.wait((sending, listening), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        sending.cancel()
+        listening.cancel()
+        #Lets the stream unsubscribe before the server hears the response is over
+        sent, _ = await asyncio.gather(sending, listening, return_exceptions=True)
+    if isinstance(sent, Exception):
+        logger.error("Event stream failed.", exc_info=sent)
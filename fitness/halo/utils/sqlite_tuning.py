@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+#PRAGMAs of the production database profile, run on every new SQLite connection
+PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',          #Readers no longer wait for a writer, nor the writer for readers
+    'synchronous': 'NORMAL',        #fsync at checkpoints only, safe against corruption in WAL mode
+    'busy_timeout': 5000,           #Milliseconds a writer waits for the lock before "database is locked"
+    'mmap_size': 268435456,         #Read up to 256 MB of the file through memory mapping
+    'cache_size': -65536,           #64 MB page cache per connection (negative is KiB)
+    'temp_store': 'MEMORY',
+}
+
+
+def apply_pragmas(sender, connection, **kwargs):
+
+    '''
+    connection_created receiver setting HALO_SQLITE_PRAGMAS on each new
+    SQLite connection. Runs on the raw sqlite3 connection so the PRAGMAs
+    don't go through query logging or the request timing wrapper.
+    '''
+    pragmas = getattr(settings, 'HALO_SQLITE_PRAGMAS', None)
+    if connection.vendor != 'sqlite' or not pragmas:
+        return
+    for name, value in pragmas.items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+def install_pragmas():
+    connection_created.connect(apply_pragmas, dispatch_uid='halo_sqlite_pragmas')
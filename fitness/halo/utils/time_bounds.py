@@ -1,34 +1,94 @@
 import pytz
+import threading
+from datetime import datetime, time, timedelta
 from django.utils import timezone
 
-#Daily booking bound
-def get_daily_bounds(client_tz):
+#Timezones whose current day and week bounds are kept
+BOUNDS_CACHE_SIZE = 512
+
+#Client timezone -> (local date, day start, day end, week start, week end), all bounds in UTC
+_bounds_cache = {}
+_bounds_lock = threading.Lock()
+
+
+def local_midnight(client_tz, day):
 
     '''
-    Returns UTC start and end datetime for the current local day 
-    based on the provided client timezone.
+    Returns the first instant of the local date `day` in UTC.
+
+    Where a DST change skips midnight the day starts when the clocks jump
+    forward, and where midnight happens twice it starts at the first one.
+    '''
+    naive = datetime.combine(day, time.min)
+    if not hasattr(client_tz, 'localize'):
+        #zoneinfo style tzinfo, fold=0 already resolves both cases this way
+        return naive.replace(tzinfo=client_tz).astimezone(pytz.UTC)
+
+    start = client_tz.localize(naive, is_dst=True)
+    if start.astimezone(client_tz).date() != day:
+        #Midnight does not exist, the DST reading falls in the previous day
+        start = client_tz.localize(naive, is_dst=False)
+    return start.astimezone(pytz.UTC)
+
+
+def _compute_bounds(client_tz, now_utc):
+    today = now_utc.astimezone(client_tz).date()
+    monday = today - timedelta(days=today.weekday())
+    return (
+        today,
+        local_midnight(client_tz, today),
+        local_midnight(client_tz, today + timedelta(days=1)),
+        local_midnight(client_tz, monday),
+        local_midnight(client_tz, monday + timedelta(days=7)),
+    )
+
+
+def get_bounds(client_tz):
+
+    '''
+    Returns the cached (local date, day start, day end, week start, week end)
+    for the current local day in `client_tz`.
+
+    An entry stays valid while now falls inside its day, so between local
+    midnights a lookup is one dict get and two comparisons. The first call
+    after midnight recomputes and replaces it.
     '''
     now_utc = timezone.now()
-    now_local = now_utc.astimezone(client_tz)
+    entry = _bounds_cache.get(client_tz)
+    if entry is not None and entry[1] <= now_utc < entry[2]:
+        return entry
 
-    start_local = now_local.replace(hour=0, minute=0, second=0, microsecond=0)
-    end_local = start_local + timezone.timedelta(days=1)
+    entry = _compute_bounds(client_tz, now_utc)
+    with _bounds_lock:
+        if client_tz not in _bounds_cache and len(_bounds_cache) >= BOUNDS_CACHE_SIZE:
+            _bounds_cache.pop(next(iter(_bounds_cache)))   #Oldest timezone first
+        _bounds_cache[client_tz] = entry
+    return entry
 
-    return start_local.astimezone(pytz.UTC), end_local.astimezone(pytz.UTC)
 
+def clear_bounds_cache():
+    with _bounds_lock:
+        _bounds_cache.clear()
 
 
-#Weekly booking bound
-def get_weekly_bounds(client_tz):
+#Daily booking bound
+def get_daily_bounds(client_tz):
 
     '''
-    Returns UTC start and end datetime for the current local week 
+    Returns UTC start and end datetime for the current local day
     based on the provided client timezone.
     '''
-    now_utc = timezone.now()
-    now_local = now_utc.astimezone(client_tz)
+    _, day_start, day_end, _, _ = get_bounds(client_tz)
+    return day_start, day_end
 
-    start_local = now_local.replace(hour=0, minute=0, second=0, microsecond=0) - timezone.timedelta(days=now_local.weekday())
-    end_local = start_local + timezone.timedelta(days=7)
 
-    return start_local.astimezone(pytz.UTC), end_local.astimezone(pytz.UTC)
+
+#Weekly booking bound
+def get_weekly_bounds(client_tz):
+
+    '''
+    Returns UTC start and end datetime for the current local week
+    based on the provided client timezone.
+    '''
+    _, _, _, week_start, week_end = get_bounds(client_tz)
+    return week_start, week_end
@@ -1,21 +1,64 @@
 import pytz
 from datetime import datetime
+from functools import lru_cache
+
+#Distinct tz names kept resolved, valid or not
+TIMEZONE_CACHE_SIZE = 512
+
+#Format of class times, in and out of the API
+LOCAL_DATETIME_FORMAT = "%Y-%m-%d %I:%M %p"
 
 def convert_ist_to_utc(ist_datetime_str):
 
     #Takes datetime in IST and returns it in UTC datetime.
-    naive_dt = datetime.strptime(ist_datetime_str, "%Y-%m-%d %I:%M %p")
+    naive_dt = datetime.strptime(ist_datetime_str, LOCAL_DATETIME_FORMAT)
     ist = pytz.timezone('Asia/Kolkata')
     ist_dt = ist.localize(naive_dt)
     return ist_dt.astimezone(pytz.UTC)
 
 
+def convert_local_to_utc_many(values, tz=pytz.timezone('Asia/Kolkata')):
+
+    '''
+    Batch version of convert_ist_to_utc for any timezone, also accepting ISO
+    8601 ("2025-01-06T07:30"). Returns a dict of each distinct string to its
+    UTC datetime, or to the ValueError it raised. Timetables repeat the same
+    times across studios and days, so each distinct string is parsed and
+    localized only once.
+    '''
+    converted = {}
+    for value in set(values):
+        try:
+            try:
+                naive_dt = datetime.strptime(value, LOCAL_DATETIME_FORMAT)
+            except ValueError:
+                naive_dt = datetime.fromisoformat(value)
+            if naive_dt.tzinfo is not None:
+                converted[value] = naive_dt.astimezone(pytz.UTC)
+            else:
+                converted[value] = tz.normalize(tz.localize(naive_dt)).astimezone(pytz.UTC)
+        except (TypeError, ValueError):
+            converted[value] = ValueError(f"Invalid datetime '{value}', expected YYYY-MM-DD HH:MM AM/PM or ISO 8601.")
+    return converted
+
+
+@lru_cache(maxsize=TIMEZONE_CACHE_SIZE)
+def resolve_timezone(tzname):
+
+    '''
+    Returns the pytz timezone for `tzname`, or None if there is no such zone.
+    Results are memoized in a bounded LRU cache, unknown names included, so a
+    client repeating a bad tz does not hit the zoneinfo files every request.
+    '''
+    try:
+        return pytz.timezone(tzname)
+    except pytz.UnknownTimeZoneError:
+        return None
+
+
 def get_client_timezone(request):
     #Extracts client's timezone from query param, returns pytz timezone
     #Falls back to UTC if invalid or missing
 
     tzname = request.GET.get('tz')
-    try:
-        return pytz.timezone(tzname) if tzname else pytz.UTC
-    except Exception:
-        return pytz.UTC
\ No newline at end of file
+    return (resolve_timezone(tzname) if tzname else None) or pytz.UTC
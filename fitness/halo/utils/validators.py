@@ -1,5 +1,4 @@
 import re
-from halo.models import Booking
 
 #Name validation
 def is_valid_name(name):
@@ -11,9 +10,15 @@ def is_valid_email(email):
     return bool(re.match(r"[^@]+@[^@]+\.[^@]+", email))
 
 
-#Checks if the email is already taken by a user
-def is_email_taken(email: str, name: str) -> bool:
+#Emails identify clients case-insensitively, A@x.com and a@x.com are the same client
+def normalize_email(email):
+    return email.strip().lower()
 
-    existing = Booking.objects.filter(client_email=email).first()
-    if existing and existing.client_name != name:
-        return True
\ No newline at end of file
+
+#Class id validation, returns the id as an int or None if it is not a valid id
+def parse_class_id(class_id):
+    try:
+        class_pk = int(class_id)
+    except (TypeError, ValueError):
+        return None
+    return class_pk if class_pk > 0 else None
@@ -1,38 +1,152 @@
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
+from rest_framework.renderers import JSONRenderer
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
 from django.utils import timezone
+from django.utils.http import parse_etags
 from .models import Class, Booking
 from .serializers import ClassSerializer, BookingSerializer, BookingSummarySerializer
+from .serializers import CLASS_FIELDS, BOOKING_SUMMARY_FIELDS, serialize_classes, serialize_booking_summaries
 import logging
 from rest_framework import status
 from .utils.timezone import get_client_timezone
-from .utils.validators import is_valid_name ,is_valid_email, is_email_taken
+from .utils.validators import is_valid_name ,is_valid_email, normalize_email, parse_class_id
 from .utils.time_bounds import get_daily_bounds, get_weekly_bounds
-from .utils.booking_limits import check_daily_limit, check_weekly_limit, has_duplicate_booking
+from .utils.booking_limits import check_daily_limit, check_weekly_limit
+from .utils.eligibility import get_eligibility
+from .utils.pagination import paginate_keyset, apaginate_keyset, build_link_header
+from .utils.recurrence import paginate_schedule, apaginate_schedule, find_occurrences
+from .utils.class_filters import parse_class_filters, filter_classes
+from .utils.availability import availability
+from .utils.schedule_cache import page_cache_key, get_cached_page, store_page, apage_cache_key, aget_cached_page, astore_page
+from .utils.batch_booking import book_batch
+from .utils.reservations import reserve_slot, RACE_LOST, DUPLICATE, EMAIL_TAKEN
+from .utils.request_metrics import serializer_timer
+from .utils.idempotency import idempotent
+from .utils.rate_limit import rate_limited
+from .utils.export import EXPORT_FORMATS, CONTENT_TYPES, parse_export_filters, export_rows, export_lines
 
 
 
 logger = logging.getLogger('halo')
 
+
+#Client emails the rate limiter buckets requests by, next to the IP
+def posted_email(request):
+    return request.data.get('client_email') if isinstance(request.data, dict) else None
+
+
+def queried_email(request):
+    return request.GET.get('email')
+
+
+#Response arguments for a page, with the neighbouring page cursors in a Link header
+def page_response(request, data, next_cursor, prev_cursor):
+    link = build_link_header(request, next_cursor, prev_cursor)
+    return {'data': data, 'headers': {'Link': link} if link else None}
+
+
+#The async views skip DRF, this renders their bodies the same way DRF's JSON renderer does
+def json_response(data=None, status=200, headers=None):
+    content = b'' if data is None else JSONRenderer().render(data)
+    return HttpResponse(content, status=status, content_type='application/json', headers=headers)
+
+
+def invalid_page(endpoint, error):
+    logger.warning("Pagination failed for %s: %s.", endpoint, error)
+    return {'data': {"error": "Invalid cursor or page size."}, 'status': status.HTTP_400_BAD_REQUEST}
+
+
+#Upcoming classes matching the filters, as .values() rows on the fast serializer path
+def upcoming_classes(fast, filters):
+    #`from` and now as one lower bound, SQLite only seeks the datetime index on one of them
+    now = timezone.now()
+    classes = filter_classes(Class.objects.all(), dict(filters, start=max(now, filters['start'] or now)))
+    return classes.values(*CLASS_FIELDS) if fast else classes
+
+
+#Filters of a GET /classes request, returns (filters, error response arguments)
+def class_filters(request, client_tz):
+    try:
+        return parse_class_filters(request.GET, client_tz), None
+    except ValueError as e:
+        logger.warning("Invalid class filters: %s", e)
+        return None, {'data': {"error": str(e)}, 'status': status.HTTP_400_BAD_REQUEST}
+
+
+#store_page arguments of a class page: its data, cursors and when it goes stale
+def class_page_entry(request, client_tz, fast, page, next_cursor, prev_cursor):
+    if not page and not request.GET.get('cursor'):
+        logger.info("No upcoming classes found.")
+        return ({"error": "No upcoming classes available."},)
+    with serializer_timer():
+        data = serialize_class_page(page, client_tz, fast)
+    valid_until = None
+    if page:
+        valid_until = page[0]['datetime'] if isinstance(page[0], dict) else page[0].datetime
+    return data, next_cursor, prev_cursor, valid_until
+
+
+#Serializes a page of classes into the page cache and returns the cache entry
+def store_class_page(request, cache_key, client_tz, fast, page, next_cursor, prev_cursor):
+    return store_page(cache_key, *class_page_entry(request, client_tz, fast, page, next_cursor, prev_cursor))
+
+
+#Template occurrences come as dicts on both paths, the fast serializer gives them the ClassSerializer shape
+def serialize_class_page(page, client_tz, fast):
+    if fast:
+        return serialize_classes(page, client_tz)
+    classes = iter(ClassSerializer([row for row in page if not isinstance(row, dict)], many=True, context={'client_tz': client_tz}).data)
+    occurrences = iter(serialize_classes([row for row in page if isinstance(row, dict)], client_tz))
+    return [next(occurrences) if isinstance(row, dict) else next(classes) for row in page]
+
+
+#Response arguments for a cached class page, a 304 when the client already has it
+def class_page_response(request, entry):
+    if entry['etag'] in parse_etags(request.headers.get('If-None-Match', '')):
+        return {'status': status.HTTP_304_NOT_MODIFIED, 'headers': {'ETag': entry['etag']}}
+
+    response = page_response(request, entry['data'], entry['next'], entry['prev'])
+    response['headers'] = {**(response['headers'] or {}), 'ETag': entry['etag']}
+    return response
+
+
 # Create your views here.
 @api_view(['GET'])
 def class_list(request):
     #Get client timezone
     client_tz = get_client_timezone(request)
 
-    #Filter upcoming classes
-    now = timezone.now()
-    classes = Class.objects.filter(datetime__gte=now)
+    #Name, instructor, from/to and min_slots filters
+    filters, error = class_filters(request, client_tz)
+    if error:
+        return Response(**error)
 
-    if not classes.exists():
-        logger.info("No upcoming classes found.")
-        return Response({"error": "No upcoming classes available."}, status=status.HTTP_200_OK)
-    
-    serializer = ClassSerializer(classes, many=True, context={'client_tz': client_tz})
-    return Response(serializer.data)
+    #Serve the page from cache while the schedule version is unchanged
+    cache_key = page_cache_key(request, client_tz)
+    entry = get_cached_page(cache_key)
+
+    if entry is None:
+        fast = getattr(settings, 'HALO_FAST_SERIALIZERS', True)
+
+        #One page of upcoming classes and template occurrences, keyed on (datetime, id)
+        try:
+            page, next_cursor, prev_cursor = paginate_schedule(upcoming_classes(fast, filters), request, filters)
+        except ValueError as e:
+            return Response(**invalid_page('GET /classes', e))
+
+        entry = store_class_page(request, cache_key, client_tz, fast, page, next_cursor, prev_cursor)
+
+    #Polling clients that already have this page get a 304
+    return Response(**class_page_response(request, entry))
 
 
 @api_view(['POST'])
+@rate_limited('book', posted_email)
+@idempotent
 def book_class(request):
 
     #validates required fields in the request data
@@ -42,7 +156,7 @@ def book_class(request):
     missing = [f for f in required_fields if not data.get(f)]
 
     if missing:
-        logger.warning(f'Missing fields: {missing}.')
+        logger.warning('Missing fields: %s.', missing)
         return Response(
             {"error": f"Missing fields: {',' .join(missing)}."},
             status=status.HTTP_400_BAD_REQUEST
@@ -55,102 +169,283 @@ def book_class(request):
 
     #Name validation
     if not is_valid_name(name):
-        logger.warning(f"Name validation failed for client_name: '{name}'. Name must contain only letters and spaces.")
+        logger.warning("Name validation failed for client_name: '%s'. Name must contain only letters and spaces.", name)
         return Response({"error": "Name must contain only letters and spaces."}, status=status.HTTP_400_BAD_REQUEST)
 
 
     #Email validation
     if not is_valid_email(email):
-        logger.warning(f"Email validation failed for client_email: '{email}'. Invalid email format.")
+        logger.warning("Email validation failed for client_email: '%s'. Invalid email format.", email)
         return Response({"error": "Invalid email format."}, status=status.HTTP_400_BAD_REQUEST)
+
+    email = normalize_email(email)
     
 
+    #Daily and weekly booking bounds
+    #Get client's timezone
+    client_tz = get_client_timezone(request)
+
+    today_bounds = get_daily_bounds(client_tz)
+    week_bounds = get_weekly_bounds(client_tz)
+
+    #An occurrence of a class template only gets its Class row with its first booking, until then it has no bookings to check
+    class_pk = parse_class_id(class_id)
+    occurrence = None
+    if class_pk is None:
+        occurrence = find_occurrences([class_id]).get(str(class_id))
+        class_pk = occurrence.pk if occurrence is not None else None
+
+    #Email ownership, booking counts and duplicate status in a single query
+    eligibility = get_eligibility(email, name, class_pk, today_bounds, week_bounds)
+
+
     #Checks if the email is already taken by a user
-    if is_email_taken(email, name):
-        logger.warning(f"{email} is already in use . Attempted reuse by {name}.")
+    if eligibility['email_taken']:
+        logger.warning("%s is already in use . Attempted reuse by %s.", email, name)
         return Response({"error": "This email is already in use. Try with a different one."}, status=status.HTTP_400_BAD_REQUEST)
     
     
     #Checks if a class exists
     try:
-        cls = Class.objects.get(id=class_id)
+        if occurrence is not None:
+            cls = occurrence
+        elif class_pk is None:
+            raise Class.DoesNotExist
+        else:
+            cls = Class.objects.get(id=class_pk)
     except Class.DoesNotExist:
-        logger.error(f"Invalid class_id: {class_id}.")
+        logger.error("Invalid class_id: %s.", class_id)
         return Response({"error": "Class not found."}, status=status.HTTP_404_NOT_FOUND)
     
     
     #Checks if any slot left
     if cls.slots_available <= 0:
-        logger.warning(f"Attempt to overbook class {cls.id}.")
+        logger.warning("Attempt to overbook class %s.", class_id)
         return Response({"error": "No slots available."}, status=status.HTTP_400_BAD_REQUEST)
     
 
-    #Daily and weekly booking bounds
-    #Get client's timezone
-    client_tz = get_client_timezone(request)
-
-    today_start_utc, today_end_utc = get_daily_bounds(client_tz)
-    week_start_utc, week_end_utc = get_weekly_bounds(client_tz)
-
     #Check daily booking limit
-    daily_limit_response = check_daily_limit(email, client_tz, today_start_utc, today_end_utc)
+    daily_limit_response = check_daily_limit(email, client_tz, eligibility['daily_count'])
     if daily_limit_response:
         return daily_limit_response
     
     #Check weekly booking limit
-    weekly_limit_response = check_weekly_limit(email, client_tz, week_start_utc, week_end_utc)
+    weekly_limit_response = check_weekly_limit(email, client_tz, eligibility['weekly_count'])
     if weekly_limit_response:
         return weekly_limit_response
 
 
     #Checks duplicate booking of a class by an email
-    if has_duplicate_booking(email, cls):
-        logger.info(f"Duplicate booking attempt by {email}.")
+    if eligibility['duplicate']:
+        logger.info("Duplicate booking attempt by %s.", email)
         return Response({"error": "You have already booked this class."}, status=status.HTTP_400_BAD_REQUEST)
     
 
-    #Reduces available slots upon successful booking
-    booking = Booking.objects.create(
-        class_booked=cls,
-        client_name=name,
-        client_email=email
+    #Reserves a slot and creates the booking in one transaction
+    outcome, booking = reserve_slot(cls, name, email, eligibility['client'], eligibility['new_windows'])
+
+    #Slots ran out after the class was read
+    if outcome == RACE_LOST:
+        logger.warning("Lost the race for the last slot of class %s.", class_id)
+        return Response({"error": "No slots available."}, status=status.HTTP_409_CONFLICT)
+
+    #A concurrent request booked the same class with this email first
+    if outcome == DUPLICATE:
+        logger.info("Duplicate booking attempt by %s.", email)
+        return Response({"error": "You have already booked this class."}, status=status.HTTP_400_BAD_REQUEST)
+
+    #A concurrent request created the client of this email under another name
+    if outcome == EMAIL_TAKEN:
+        logger.warning("%s is already in use . Attempted reuse by %s.", email, name)
+        return Response({"error": "This email is already in use. Try with a different one."}, status=status.HTTP_400_BAD_REQUEST)
+
+
+    logger.info("Booking created for %s in %s.", email, booking.class_booked_id)
+    with serializer_timer():
+        data = BookingSerializer(booking).data
+    return Response({"message": "Booking successful", "booking": data}, status=status.HTTP_201_CREATED)
+
+
+@api_view(['POST'])
+@rate_limited('book_batch')
+@idempotent
+def book_class_batch(request):
+
+    #Accepts {"bookings": [...]} or a bare list of booking requests
+    data = request.data
+    items = data.get('bookings') if isinstance(data, dict) else data
+
+    if not isinstance(items, list) or not items:
+        logger.warning("Batch booking request without a list of bookings.")
+        return Response({"error": "bookings must be a non-empty list."}, status=status.HTTP_400_BAD_REQUEST)
+
+    max_size = getattr(settings, 'HALO_MAX_BATCH_SIZE', 100)
+    if len(items) > max_size:
+        logger.warning("Batch booking request with %d items rejected.", len(items))
+        return Response({"error": f"A batch can hold at most {max_size} bookings."}, status=status.HTTP_400_BAD_REQUEST)
+
+
+    client_tz = get_client_timezone(request)
+    results = book_batch(items, client_tz)
+
+    created = sum(1 for r in results if r['status'] == status.HTTP_201_CREATED)
+    logger.info("Batch booking: %d of %d bookings created.", created, len(items))
+    return Response(
+        {"created": created, "failed": len(items) - created, "results": results},
+        status=status.HTTP_207_MULTI_STATUS
     )
-    cls.slots_available -= 1
-    cls.save()
 
 
-    logger.info(f"Booking created for {email} in {cls.id}.")
-    serializer = BookingSerializer(booking)
-    return Response({"message": "Booking successful", "booking": serializer.data}, status=status.HTTP_201_CREATED)
+@api_view(['GET'])
+@rate_limited('availability')
+def class_availability(request):
+
+    #[id, slots_available] pairs of the upcoming classes, ?since=<version> for only those changed after it
+    since = request.GET.get('since')
+    if since is not None:
+        try:
+            since = int(since)
+            if since < 0:
+                raise ValueError
+        except ValueError:
+            logger.warning("Invalid availability version: %s.", since)
+            return Response({"error": "since must be a version from a previous response."}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(availability(since))
 
 
 @api_view(['GET'])
-def get_bookings(request):
-    email = request.query_params.get('email')
+def slot_events(request):
+
+    #GET /events/slots is streamed by fitness.asgi before requests get here, this only answers other servers
+    logger.warning("Event stream requested from a server other than fitness.asgi.")
+    return Response({"error": "Event streams need the ASGI server (fitness.asgi)."}, status=status.HTTP_501_NOT_IMPLEMENTED)
+
+
+#Checks the email query param of GET /bookings, returns (email, error response arguments)
+def bookings_email(request):
+    email = request.GET.get('email')
 
     if not email:
         logger.warning("Missing email query parameter in GET /bookings request.")
-        return Response({"error": "Email is required as a query parameter"}, status=status.HTTP_400_BAD_REQUEST)
-    
+        return None, {'data': {"error": "Email is required as a query parameter"}, 'status': status.HTTP_400_BAD_REQUEST}
+
 
     email = email.strip()
 
     #Email validation
     if not is_valid_email(email):
-        logger.warning(f"Email validation failed for {email}. Invalid email format.")
-        return Response({"error": "Invalid email format."}, status=status.HTTP_400_BAD_REQUEST)
-    
+        logger.warning("Email validation failed for %s. Invalid email format.", email)
+        return None, {'data': {"error": "Invalid email format."}, 'status': status.HTTP_400_BAD_REQUEST}
 
-    logger.info(f"Fetching bookings for {email}.")
+    email = normalize_email(email)
 
-    bookings = Booking.objects.filter(client_email=email).order_by('-booked_at') #sorts the bookings in descending order
+    logger.info("Fetching bookings for %s.", email)
+    return email, None
 
-    if not bookings.exists():
-        logger.info(f"No bookings found for {email}.")
-        return Response({"error": "No bookings found for this email."}, status=status.HTTP_404_NOT_FOUND)
-    
 
-    logger.info(f"{bookings.count()} bookings found for {email}")
+def client_bookings(email, fast):
+    bookings = Booking.objects.filter(client__email=email).select_related('class_booked')
+    return bookings.values(*BOOKING_SUMMARY_FIELDS) if fast else bookings
+
+
+#Response arguments for a page of bookings, sorted in descending order of (booked_at, id)
+def bookings_page_response(request, email, fast, page, next_cursor, prev_cursor):
+    if not page and not request.GET.get('cursor'):
+        logger.info("No bookings found for %s.", email)
+        return {'data': {"error": "No bookings found for this email."}, 'status': status.HTTP_404_NOT_FOUND}
+
+
+    logger.info("%d bookings returned for %s", len(page), email)
     client_tz = get_client_timezone(request)
-    serializer = BookingSummarySerializer(bookings, many=True, context={'client_tz': client_tz})
-    return Response(serializer.data)
+    with serializer_timer():
+        if fast:
+            data = serialize_booking_summaries(page, client_tz)
+        else:
+            data = BookingSummarySerializer(page, many=True, context={'client_tz': client_tz}).data
+    return page_response(request, data, next_cursor, prev_cursor)
+
+
+@api_view(['GET'])
+@rate_limited('bookings', queried_email)
+def get_bookings(request):
+    email, error = bookings_email(request)
+    if error:
+        return Response(**error)
+
+    fast = getattr(settings, 'HALO_FAST_SERIALIZERS', True)
+    try:
+        page, next_cursor, prev_cursor = paginate_keyset(client_bookings(email, fast), request, ('booked_at', 'id'), descending=True)
+    except ValueError as e:
+        return Response(**invalid_page('GET /bookings', e))
+
+    return Response(**bookings_page_response(request, email, fast, page, next_cursor, prev_cursor))
+
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_bookings(request):
+
+    #Streams the booking ledger with class info for staff, ?output=csv (default) or ndjson
+    #(not ?format=, which DRF keeps for picking a renderer)
+    fmt = request.GET.get('output', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return Response({"error": f"output must be one of: {', '.join(EXPORT_FORMATS)}."}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        filters = parse_export_filters(request.GET)
+    except ValueError as e:
+        logger.warning("Invalid booking export filters: %s", e)
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    logger.info(
+        "Booking export as %s by %s (start=%s, end=%s, class_id=%s).",
+        fmt, request.user, filters['start'], filters['end'], filters['class_id']
+    )
+    response = StreamingHttpResponse(export_lines(fmt, export_rows(**filters)), content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="bookings.{fmt}"'
+    return response
+
+
+
+#Async versions of the read endpoints, for ASGI deployments.
+#Same responses as the DRF views, but the page query runs on the async ORM
+#instead of tying up a worker thread for the whole request.
+
+@require_GET
+async def class_list_async(request):
+    client_tz = get_client_timezone(request)
+    filters, error = class_filters(request, client_tz)
+    if error:
+        return json_response(**error)
+
+    cache_key = await apage_cache_key(request, client_tz)
+    entry = await aget_cached_page(cache_key)
+
+    if entry is None:
+        fast = getattr(settings, 'HALO_FAST_SERIALIZERS', True)
+        try:
+            page, next_cursor, prev_cursor = await apaginate_schedule(upcoming_classes(fast, filters), request, filters)
+        except ValueError as e:
+            return json_response(**invalid_page('GET /classes', e))
+
+        entry = await astore_page(cache_key, *class_page_entry(request, client_tz, fast, page, next_cursor, prev_cursor))
+
+    return json_response(**class_page_response(request, entry))
+
+
+@require_GET
+@rate_limited('bookings', queried_email)
+async def get_bookings_async(request):
+    email, error = bookings_email(request)
+    if error:
+        return json_response(**error)
+
+    fast = getattr(settings, 'HALO_FAST_SERIALIZERS', True)
+    try:
+        page, next_cursor, prev_cursor = await apaginate_keyset(client_bookings(email, fast), request, ('booked_at', 'id'), descending=True)
+    except ValueError as e:
+        return json_response(**invalid_page('GET /bookings', e))
+
+    return json_response(**bookings_page_response(request, email, fast, page, next_cursor, prev_cursor))